@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models.room import Room, Message
+from .models.room import Room, Message, ArchivedMessage
 
 
 @admin.register(Room)
@@ -10,6 +10,15 @@ class RoomAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at', 'updated_at', 'member_count']
     filter_horizontal = ['members']
+    list_select_related = ['creator']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_member_count()
+    
+    def member_count(self, obj):
+        return obj.member_count
+    member_count.short_description = 'Members'
+    member_count.admin_order_field = 'annotated_member_count'
 
 
 @admin.register(Message)
@@ -18,6 +27,29 @@ class MessageAdmin(admin.ModelAdmin):
     list_filter = ['message_type', 'timestamp', 'room']
     search_fields = ['content', 'user__username']
     readonly_fields = ['timestamp']
+    list_select_related = ['user', 'room']
+    
+    def content_preview(self, obj):
+        if obj.message_type == 'image':
+            return '[Image]'
+        return obj.content[:50] if obj.content else ''
+    content_preview.short_description = 'Content'
+
+
+@admin.register(ArchivedMessage)
+class ArchivedMessageAdmin(admin.ModelAdmin):
+    """Read-only: rows are moved here by manage.py archive_messages"""
+    list_display = ['user', 'room', 'message_type', 'content_preview', 'timestamp', 'archived_at']
+    list_filter = ['message_type', 'room']
+    search_fields = ['content', 'user__username']
+    list_select_related = ['user', 'room']
+    date_hierarchy = 'timestamp'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
     
     def content_preview(self, obj):
         if obj.message_type == 'image':
@@ -1,28 +1,143 @@
-import json
+import asyncio
+import copy
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from app_room.models.room import Message, Room
+from app_room.services import (
+    MESSAGE_ROW_FIELDS,
+    SendQueue,
+    chat_message_frame,
+    coalescer,
+    ephemeral_gate,
+    ephemeral_relay,
+    get_codec,
+    get_message_writer,
+    get_presence,
+    get_rate_limiter,
+    get_recent_messages,
+    identity_cache,
+    message_row_frame,
+    rate_limited_frame
+)
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db.models import Q
+
+
+# resume could not replay (unknown id or too far behind): reload history
+RESUME_GAP_FRAME = '{"type":"resync","reason":"resume_gap"}'
+
+PONG_FRAME = '{"type":"pong"}'
+
+# text frame without a username, or with a message that is not a string
+INVALID_MESSAGE_FRAME = '{"type":"error","code":"invalid_message"}'
+
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """
     WebSocket Consumer For management chat
     support text and image type messages
+    
+    The room is resolved once in connect() and kept on the consumer
+    (room_id, room_is_public, is_member). room_changed events from the
+    Room signals refresh it when the room is updated or deleted.
+    
+    Broadcast frames are encoded once by the sender (event['frame']) and
+    only forwarded by chat_message, whatever the size of the group.
+    
+    Rooms with a coalesce window batch busy periods (services.coalescing);
+    clients that connect with ?batch=1 get a batch as one
+    {"type": "batch", "messages": [...]} frame, others frame by frame.
+    
+    Frames go through a bounded per-connection SendQueue, so a slow client
+    can't stall the consumer (services.send_queue).
+    
+    Reconnecting clients pass ?last_message_id=<id>: the messages after it
+    are replayed (recent messages store, else the database) before live
+    delivery, followed by {"type": "resumed", "replayed": n}.
+    
+    With presence enabled (services.presence) named connections
+    (authenticated user, else ?username=) are tracked per room; every
+    socket gets one presence snapshot, then debounced join/leave deltas.
+    
+    typing / read frames are ephemeral (services.ephemeral): no database,
+    deduped and rate limited per user, relayed per room in windows
+    and queued behind chat messages. ping is answered with pong.
+    
+    Frames are rate limited per IP, messages per user, IP and room
+    (services.rate_limit); an over-limit frame is dropped and answered
+    with one {"type": "error", "code": "rate_limited"} frame.
     """
     
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs'].get('room_name', 'public_chat')
         self.room_group_name = f'chat_{self.room_name}'
+        self.in_group = False
+        
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.batch_frames = query.get('batch', [''])[0].lower() in ('1', 'true')
+        last_message_id = query.get('last_message_id', [''])[0]
+        self.username = self.connection_username(query)
+        self.presence = get_presence()
+        self.rate_limiter = get_rate_limiter()
+        self.rate_limited_until = 0
+        self.client_ip = (self.scope.get('client') or [None])[0]
+        
+        # public chat has no Room row
+        self.room_id = None
+        self.room_is_public = True
+        self.is_member = False
+        self.coalesce_window_ms = settings.CHAT_PUBLIC_COALESCE_WINDOW_MS
+        
+        if self.room_name != 'public_chat':
+            room = await self.load_room(self.room_name)
+            if room is None or not self.may_join(room):
+                # reject before accept() - no socket for unknown slugs
+                await self.close()
+                return
+            self.set_room(room)
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        self.in_group = True
 
         await self.accept()
+        
+        self.send_queue = SendQueue(
+            send=lambda frame: self.send(text_data=frame),
+            close=lambda code: self.close(code=code),
+            max_frames=settings.CHAT_SEND_QUEUE_MAX,
+            policy=settings.CHAT_SEND_QUEUE_POLICY,
+            batch_frames=self.batch_frames
+        )
+        self.send_queue.start()
+        
+        if self.presence is not None:
+            if self.username:
+                await self.presence.join(
+                    self.channel_layer, self.room_group_name, self.channel_name, self.username
+                )
+            self.send_queue.put(
+                await self.presence.snapshot(self.room_group_name, settings.CHAT_PRESENCE_LIST_MAX),
+                batch=False
+            )
+        
+        if last_message_id.isdigit():
+            # group_add came first: nothing is missed between replay and live
+            # frames (a message may arrive twice, clients dedupe by id)
+            await self.resume(int(last_message_id))
 
     async def disconnect(self, close_code):
+        if not self.in_group:
+            return
+        self.send_queue.stop()
+        if self.presence is not None:
+            await self.presence.leave(self.room_group_name, self.channel_name)
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -30,77 +145,267 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         """Recieve message from client"""
-        data = json.loads(text_data)
+        if not await self.allow('ws_frame', ip=self.client_ip):
+            return
+        
+        data = get_codec().loads(text_data)
         message_type = data.get('message_type', 'text')
         username = data.get('username')
         
+        if message_type in ('text', 'image') and not await self.allow(
+            'message', user=self.username or username, ip=self.client_ip, room=self.room_name
+        ):
+            return
+        
+        if message_type in ('typing', 'read', 'ping'):
+            await self.receive_ephemeral(message_type, data)
+            return
+        
         if message_type == 'text':
             # text messages
             message = data.get('message', '')
-            message_id = await self.save_text_message(username, message, self.room_name)
+            if not self.valid_username(username) or not isinstance(message, str):
+                # would fail to save (and hold back a write-behind batch)
+                self.send_queue.put(INVALID_MESSAGE_FRAME, batch=False)
+                return
             
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message_id': message_id,
-                    'message': message,
-                    'username': username,
-                    'message_type': 'text'
-                }
-            )
+            if settings.CHAT_WRITE_BEHIND:
+                # journal now, persist later in a batch (id is provisional)
+                provisional_id, timestamp = get_message_writer().enqueue(
+                    username, message, self.room_id
+                )
+                frame = chat_message_frame(
+                    username=username,
+                    message=message,
+                    message_id=None,
+                    provisional_id=provisional_id,
+                    timestamp=timestamp
+                )
+            else:
+                message_id = await self.save_text_message(username, message, self.room_id)
+                frame = chat_message_frame(
+                    username=username,
+                    message=message,
+                    message_id=message_id
+                )
+            
+            await self.broadcast(frame)
+            
+            if ephemeral_gate.current(self.room_group_name, username, 'typing'):
+                # the message ends the typing indicator
+                await self.receive_ephemeral('typing', {'typing': False, 'username': username})
         
         elif message_type == 'image':
             # image messages - just notif (uploaded with HTTP)
-            image_url = data.get('image_url')
-            message_id = data.get('message_id')
-            
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message_id': message_id,
-                    'message': '',
-                    'username': username,
-                    'message_type': 'image',
-                    'image_url': image_url
-                }
+            await self.broadcast(chat_message_frame(
+                username=username,
+                message_type='image',
+                message_id=data.get('message_id'),
+                image_url=data.get('image_url')
+            ))
+
+    async def allow(self, scope, **keys):
+        """Take a rate limit token, tell the client (once per wait) when there is none"""
+        if self.rate_limiter is None:
+            return True
+        allowed, retry_after = await self.rate_limiter.acheck(scope, **keys)
+        if not allowed:
+            now = asyncio.get_running_loop().time()
+            if now >= self.rate_limited_until:
+                self.rate_limited_until = now + retry_after
+                self.send_queue.put(rate_limited_frame(scope, retry_after), batch=False)
+        return allowed
+
+    async def receive_ephemeral(self, message_type, data):
+        """typing / read / ping - relayed or answered, never saved"""
+        if message_type == 'ping':
+            self.send_queue.put(PONG_FRAME, batch=False)
+            return
+        
+        username = self.username or data.get('username')
+        if not username:
+            return
+        if message_type == 'typing':
+            value = bool(data.get('typing', True))
+        else:
+            value = data.get('message_id')
+            if not isinstance(value, int) or isinstance(value, bool):
+                return
+        
+        if ephemeral_gate.allow(self.room_group_name, username, message_type, value):
+            await ephemeral_relay.send(
+                self.channel_layer, self.room_group_name, message_type, username, value,
+                settings.CHAT_EPHEMERAL_WINDOW_MS
             )
 
+    async def resume(self, last_message_id):
+        """Replay the messages saved after last_message_id"""
+        rows = await self.load_missed_messages(last_message_id)
+        if rows is None:
+            self.send_queue.put(RESUME_GAP_FRAME, batch=False)
+            return
+        
+        origin = self.origin()
+        for row in rows:
+            self.send_queue.put(message_row_frame(row, origin))
+        self.send_queue.put(f'{{"type":"resumed","replayed":{len(rows)}}}', batch=False)
+
+    def origin(self):
+        """http(s)://host of the socket, for absolute image URLs"""
+        host = dict(self.scope.get('headers', [])).get(b'host', b'').decode()
+        if not host:
+            return ''
+        scheme = 'https' if self.scope.get('scheme') == 'wss' else 'http'
+        return f'{scheme}://{host}'
+
+    async def broadcast(self, frame):
+        """group_send an encoded frame (coalesced if the room has a window)"""
+        await coalescer.send(
+            self.channel_layer, self.room_group_name, frame, self.coalesce_window_ms
+        )
+
     async def chat_message(self, event):
-        """Send message to client"""
-        message_type = event.get('message_type', 'text')
-        response_data = {
-            'message_id': event.get('message_id'),
-            'username': event['username'],
-            'message_type': message_type,
-            'timestamp': event.get('timestamp', '')
-        }
+        """Send message to client (frame already encoded by the sender)"""
+        frame = event.get('frame')
+        if frame is None:
+            # event without a pre-encoded frame (e.g. from an older worker)
+            frame = chat_message_frame(
+                username=event['username'],
+                message_type=event.get('message_type', 'text'),
+                message=event.get('message', ''),
+                message_id=event.get('message_id'),
+                provisional_id=event.get('provisional_id'),
+                image_url=event.get('image_url'),
+                timestamp=event.get('timestamp', '')
+            )
+        self.send_queue.put(frame)
+
+    async def chat_batch(self, event):
+        """Send coalesced messages - the queue sends one frame to batch clients"""
+        for frame in event['frames']:
+            self.send_queue.put(frame)
+
+    async def ephemeral_events(self, event):
+        """Typing / read cursor events, sent after queued chat messages"""
+        self.send_queue.put_ephemeral(event['frame'])
+
+    async def presence_update(self, event):
+        """Join/leave delta of the room (never inside a batch frame)"""
+        self.send_queue.put(event['frame'], batch=False)
+
+    async def room_changed(self, event):
+        """Room was updated or deleted - refresh the resolved room"""
+        if event.get('deleted'):
+            await self.close()
+            return
         
-        if message_type == 'text':
-            response_data['message'] = event['message']
-        elif message_type == 'image':
-            response_data['image_url'] = event.get('image_url')
-            response_data['message'] = ''
+        # from the database: this worker's identity cache may not have seen the change yet
+        room = await self.load_room(event['slug'], cached=False)
+        if room is None or not self.may_join(room):
+            await self.close()
+            return
+        
+        if room.slug != self.room_name:
+            # renamed - follow the room to its new group
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            if self.presence is not None:
+                await self.presence.leave(self.room_group_name, self.channel_name)
+            self.room_name = room.slug
+            self.room_group_name = f'chat_{self.room_name}'
+            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            if self.presence is not None and self.username:
+                await self.presence.join(
+                    self.channel_layer, self.room_group_name, self.channel_name, self.username
+                )
+        self.set_room(room)
+
+    def set_room(self, room):
+        self.room_id = room.id
+        self.room_is_public = room.is_public
+        self.is_member = room.is_member
+        self.coalesce_window_ms = room.coalesce_window_ms
+
+    def connection_username(self, query):
+        """Name shown in presence: the logged-in user, else ?username="""
+        user = self.scope.get('user')
+        if user and user.is_authenticated:
+            return user.username
+        return query.get('username', [''])[0].strip()[:150]
+
+    @staticmethod
+    def valid_username(username):
+        return isinstance(username, str) and bool(username.strip()) and len(username) <= USERNAME_MAX_LENGTH
+
+    def may_join(self, room):
+        """Private rooms can be limited to members (CHAT_PRIVATE_ROOMS_MEMBERS_ONLY)"""
+        if room.is_public or not settings.CHAT_PRIVATE_ROOMS_MEMBERS_ONLY:
+            return True
+        return room.is_member
+
+    @database_sync_to_async
+    def load_room(self, slug, cached=True):
+        """Resolve room and membership (on connect and on room_changed)"""
+        if cached:
+            room = identity_cache.get_room(slug)
+        else:
+            room = Room.objects.filter(slug=slug).first()
+        if room is None:
+            return None
         
-        await self.send(text_data=json.dumps(response_data))
+        user = self.scope.get('user')
+        is_member = bool(
+            user and user.is_authenticated
+            and room.members.filter(pk=user.pk).exists()
+        )
+        # a per-connection copy, the cached instance is shared
+        room = copy.copy(room)
+        room.is_member = is_member
+        return room
 
     @database_sync_to_async
-    def save_text_message(self, username, message, room_name):
-        """Save text message to database"""
-        user, created = User.objects.get_or_create(username=username)
+    def load_missed_messages(self, last_message_id):
+        """
+        Messages after last_message_id, oldest first
         
-        # Find room (if not public_chat)
-        room = None
-        if room_name and room_name != 'public_chat':
-            try:
-                room = Room.objects.get(slug=room_name)
-            except Room.DoesNotExist:
-                pass
+        None when the id is not in this room or more than
+        CHAT_RESUME_MAX_MESSAGES were missed (the client reloads history).
+        """
+        limit = min(settings.CHAT_RESUME_MAX_MESSAGES, settings.CHAT_SEND_QUEUE_MAX - 1)
+        
+        store = get_recent_messages()
+        cached = store.get(self.room_id) if store is not None else None
+        if cached is not None:
+            rows = cached[1]
+            for index, row in enumerate(rows):
+                if row['id'] == last_message_id:
+                    missed = rows[:index][::-1]
+                    return missed if len(missed) <= limit else None
+            if len(rows) < store.size:
+                # the store holds the whole room, the id isn't in it
+                return None
+        
+        anchor = (
+            Message.objects.filter(pk=last_message_id, room_id=self.room_id)
+            .values_list('timestamp', flat=True).first()
+        )
+        if anchor is None:
+            return None
+        rows = list(
+            Message.objects.filter(room_id=self.room_id)
+            .filter(Q(timestamp__gt=anchor) | Q(timestamp=anchor, id__gt=last_message_id))
+            .order_by('timestamp', 'id')
+            .values(*MESSAGE_ROW_FIELDS)[:limit + 1]
+        )
+        return rows if len(rows) <= limit else None
+
+    @database_sync_to_async
+    def save_text_message(self, username, message, room_id):
+        """Save text message to database"""
+        user = identity_cache.get_user(username)
         
         msg_obj = Message.objects.create(
             user=user,
-            room=room,
+            room_id=room_id,
             content=message,
             message_type='text'
         )
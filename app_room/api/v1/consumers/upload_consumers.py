@@ -0,0 +1,237 @@
+"""
+Streaming image upload under ASGI
+
+Django's ASGI handler reads the whole request body before a view runs, and
+the sync ImageUploadView then holds a threadpool slot for the parse, the
+save and the group_send. With CHAT_ASYNC_UPLOADS, chat.asgi routes
+POST /api/room/v1/upload-image/ to ImageUploadConsumer instead:
+- the body is written chunk by chunk to a spooled temporary file: in
+  memory on the event loop up to FILE_UPLOAD_MAX_MEMORY_SIZE, past it (the
+  file is on disk) each write runs in a thread; no thread is held while a
+  slow client sends it
+- Content-Length over the cap is rejected before anything is read, a body
+  that grows over it while streaming as soon as it does (413); the IP
+  bucket of the upload rate limit is taken before reading too (429), the
+  user and room buckets once the form is parsed
+- only the multipart parse and the save (ORM + storage) run in a thread,
+  the rate limit checks and the room notification are awaited
+
+The Django middleware does not run for this path, so the consumer applies
+what the view gets from it: SecurityMiddleware (HTTPS redirect, headers)
+and XFrameOptionsMiddleware on every response, the session user and, for
+a logged-in user, the CSRF check of DRF's SessionAuthentication (403).
+
+Requests and responses are the same as ImageUploadView (which still serves
+WSGI deployments).
+"""
+import math
+from importlib import import_module
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib import auth
+from django.core.exceptions import SuspiciousOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from django.http.multipartparser import MultiPartParserError
+from django.utils.module_loading import import_string
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import PermissionDenied, Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.throttling import BaseThrottle
+
+from app_room.api.v1.serializers import ImageUploadSerializer, upload_size_error
+from app_room.services import get_image_processor, get_rate_limiter, image_message_event, metrics
+
+# multipart boundaries and part headers, the username / room_slug fields
+FORM_OVERHEAD = 64 * 1024
+
+# middleware of settings.MIDDLEWARE applied to the consumer's responses
+RESPONSE_MIDDLEWARE = (
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+)
+
+
+def response_middleware():
+    return [
+        import_string(path)(lambda request: None)
+        for path in RESPONSE_MIDDLEWARE if path in settings.MIDDLEWARE
+    ]
+
+
+class ImageUploadConsumer(AsyncHttpConsumer):
+    """
+    POST /api/room/v1/upload-image/ (multipart/form-data)
+        - image: file
+        - username: string
+        - room_slug: string (optional)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.body_file = None
+        self.received = 0
+        self.request = None
+        self.middleware = response_middleware()
+
+    @property
+    def max_body_size(self):
+        return settings.CHAT_UPLOAD_MAX_SIZE + FORM_OVERHEAD
+
+    async def http_request(self, message):
+        if self.body_file is None and not await self.start():
+            await self.disconnect()
+            raise StopConsumer()
+
+        chunk = message.get('body', b'')
+        self.received += len(chunk)
+        if self.received > self.max_body_size:
+            await self.reject_too_large()
+            await self.disconnect()
+            raise StopConsumer()
+        if self.received > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            # this write rolls the spooled file over to disk, or it is there already
+            await sync_to_async(self.body_file.write, thread_sensitive=False)(chunk)
+        else:
+            self.body_file.write(chunk)
+
+        if not message.get('more_body'):
+            try:
+                await self.handle_upload()
+            finally:
+                await self.disconnect()
+            raise StopConsumer()
+
+    async def disconnect(self):
+        if self.body_file is not None:
+            self.body_file.close()
+        if self.request is not None:
+            # uploaded temporary files (the saved one may have been moved away)
+            self.request.close()
+
+    async def start(self):
+        """Check the request line, headers and IP rate limit, open the body file"""
+        headers = dict(self.scope['headers'])
+        # headers only, the body is read into self.body_file
+        self.request = ASGIRequest(self.scope, BytesIO())
+        for middleware in self.middleware:
+            redirect = getattr(middleware, 'process_request', lambda request: None)(self.request)
+            if redirect is not None:
+                await self.send_http_response(redirect)
+                return False
+
+        if self.scope['method'] != 'POST':
+            await self.send_json(
+                405, {'detail': f'Method "{self.scope["method"]}" not allowed.'}, [(b'allow', b'POST')]
+            )
+            return False
+
+        content_type = headers.get(b'content-type', b'').decode('latin1')
+        if not content_type.startswith('multipart/form-data'):
+            await self.send_json(415, {'detail': f'Unsupported media type "{content_type}" in request.'})
+            return False
+
+        try:
+            content_length = int(headers.get(b'content-length', 0))
+        except ValueError:
+            content_length = 0
+        if content_length > self.max_body_size:
+            await self.reject_too_large()
+            return False
+
+        if await self.rate_limited(ip=BaseThrottle().get_ident(self.request)):
+            return False
+
+        self.body_file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        return True
+
+    async def reject_too_large(self):
+        metrics.incr('uploads.too_large')
+        await self.send_json(413, {'image': [upload_size_error(settings.CHAT_UPLOAD_MAX_SIZE)]})
+
+    async def handle_upload(self):
+        self.body_file.seek(0)
+        request = self.request = ASGIRequest(self.scope, self.body_file)
+        # chunked bodies have no Content-Length, the parser needs one
+        request.META['CONTENT_LENGTH'] = str(self.received)
+
+        try:
+            data = await database_sync_to_async(self.parse, thread_sensitive=False)(request)
+        except (MultiPartParserError, SuspiciousOperation) as e:
+            await self.send_json(400, {'detail': f'Multipart form parse error - {e}'})
+            return
+        except PermissionDenied as e:
+            await self.send_json(403, {'detail': e.detail})
+            return
+
+        if await self.rate_limited(user=data.get('username'), room=data.get('room_slug') or 'public_chat'):
+            return
+
+        message, body = await database_sync_to_async(self.save)(request, data)
+        if message is None:
+            await self.send_json(400, body)
+            return
+
+        origin = request.build_absolute_uri('/')[:-1]
+        if settings.CHAT_IMAGE_PROCESSING and not message.image_thumb:
+            # variants are made in the background, the room is notified after
+            get_image_processor().submit(message.id, origin)
+        else:
+            await get_channel_layer().group_send(*image_message_event(message, origin))
+        metrics.incr('uploads.streamed')
+        await self.send_json(201, body)
+
+    async def rate_limited(self, **keys):
+        """Take upload tokens for keys, answer 429 if there are none"""
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return False
+        allowed, wait = await limiter.acheck('upload', **keys)
+        if not allowed:
+            await self.send_json(
+                429, {'detail': Throttled(wait).detail}, [(b'retry-after', b'%d' % math.ceil(wait))]
+            )
+        return not allowed
+
+    def parse(self, request):
+        """Form fields and files of the spooled body (runs in a thread)"""
+        # DisallowedHost before anything is saved
+        request.get_host()
+        data = {**request.POST.dict(), **request.FILES.dict()}
+        # SessionMiddleware, AuthenticationMiddleware, SessionAuthentication
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        request.user = auth.get_user(request)
+        if request.user.is_active:
+            SessionAuthentication().enforce_csrf(request)
+        return data
+
+    def save(self, request, data):
+        """(message, response data), (None, errors) if invalid (runs in a thread)"""
+        serializer = ImageUploadSerializer(data=data, context={'request': request})
+        if not serializer.is_valid():
+            return None, serializer.errors
+        message = serializer.save()
+        return message, serializer.data
+
+    async def send_json(self, status, data, headers=()):
+        response = HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+        for name, value in headers:
+            response[name.decode('latin1')] = value.decode('latin1')
+        await self.send_http_response(response)
+
+    async def send_http_response(self, response):
+        for middleware in reversed(self.middleware):
+            response = middleware.process_response(self.request, response)
+        await self.send_response(
+            response.status_code,
+            response.content,
+            headers=[(name.lower().encode('latin1'), value.encode('latin1')) for name, value in response.items()]
+        )
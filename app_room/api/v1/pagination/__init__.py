@@ -0,0 +1,11 @@
+from .message_pagination import (
+    MessageKeysetPagination,
+    encode_cursor,
+    decode_cursor
+)
+
+__all__ = [
+    'MessageKeysetPagination',
+    'encode_cursor',
+    'decode_cursor'
+]
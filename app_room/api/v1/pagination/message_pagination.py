@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination for message history
+
+Why keyset instead of OFFSET?
+- OFFSET makes the database walk and discard every earlier row
+- keyset on (timestamp, id) seeks straight to the page boundary
+- every page costs the same, no matter how far back the user scrolls
+
+Query Parameters:
+    - before: cursor or message id, returns older messages
+    - after: cursor or message id, returns newer messages
+
+With an archive queryset (ArchivedMessage, manage.py archive_messages) a
+page that runs out of hot messages continues in the archive: archived
+messages are all older than the hot ones, so (timestamp, id) order is
+hot rows, then archived rows.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from app_room.models.room import ArchivedMessage, Message
+
+
+def encode_cursor(timestamp, pk):
+    """Build an opaque cursor from a message (timestamp, id) position"""
+    raw = f'{timestamp.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(value):
+    """
+    Return (timestamp, id) for a cursor or a plain message id
+    
+    Returns None if the value is not a valid position.
+    """
+    if value.isdigit():
+        timestamp = Message.objects.filter(pk=value).values_list('timestamp', flat=True).first()
+        if timestamp is None:
+            timestamp = ArchivedMessage.objects.filter(pk=value).values_list('timestamp', flat=True).first()
+        if timestamp is None:
+            return None
+        return timestamp, int(value)
+    
+    try:
+        raw = base64.urlsafe_b64decode(value.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    
+    if timestamp is None:
+        return None
+    return timestamp, pk
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination on (timestamp, id)
+    
+    - results are always newest first
+    - next: cursor for older messages (null when there are none)
+    - previous: cursor for newer messages (null on the newest page)
+    - works with model instances and with .values() rows
+    - archive: the same query over ArchivedMessage, read only when the
+      hot table has no more rows for the page
+    """
+    page_size = 50
+    before_query_param = 'before'
+    after_query_param = 'after'
+    offset_query_param = 'offset'
+    invalid_cursor_message = 'نشانگر صفحه‌بندی نامعتبر است'
+    invalid_offset_message = 'آفست باید عدد صحیح نامنفی باشد'
+
+    def paginate_queryset(self, queryset, request, view=None, archive=None):
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        querysets = [queryset] if archive is None else [queryset, archive]
+        
+        if after:
+            timestamp, pk = self._get_position(after, self.after_query_param)
+            querysets = [
+                qs.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)).order_by('timestamp', 'id')
+                for qs in reversed(querysets)
+            ]
+        else:
+            if before:
+                timestamp, pk = self._get_position(before, self.before_query_param)
+                querysets = [
+                    qs.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+                    for qs in querysets
+                ]
+            querysets = [qs.order_by('-timestamp', '-id') for qs in querysets]
+        
+        # fetch one extra row to know if there is another page
+        results = []
+        for qs in querysets:
+            results.extend(qs[:self.page_size + 1 - len(results)])
+            if len(results) > self.page_size:
+                break
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        
+        if after:
+            results.reverse()
+            has_older, has_newer = True, has_more
+        else:
+            has_older, has_newer = has_more, bool(before)
+        
+        self.next_cursor = self._cursor_for(results[-1]) if results and has_older else None
+        self.previous_cursor = self._cursor_for(results[0]) if results and has_newer else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_cursor,
+            'previous': self.previous_cursor,
+            'results': data,
+        })
+
+    @staticmethod
+    def _cursor_for(row):
+        if isinstance(row, dict):
+            return encode_cursor(row['timestamp'], row['id'])
+        return encode_cursor(row.timestamp, row.pk)
+
+    def get_offset(self, request):
+        """Legacy ?offset= of old clients, 400 unless a non-negative integer"""
+        value = request.query_params.get(self.offset_query_param, '0')
+        if not value.isdigit():
+            raise ValidationError({self.offset_query_param: self.invalid_offset_message})
+        return int(value)
+
+    def _get_position(self, value, param):
+        position = decode_cursor(value)
+        if position is None:
+            # a bad query parameter, not a missing resource
+            raise ValidationError({param: self.invalid_cursor_message})
+        return position
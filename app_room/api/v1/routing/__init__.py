@@ -1 +1,2 @@
 from .websocket import websocket_urlpatterns
+from .http import http_urlpatterns
@@ -0,0 +1,8 @@
+from django.urls import path
+from app_room.api.v1.consumers.upload_consumers import ImageUploadConsumer
+
+
+# served before the Django app under ASGI (CHAT_ASYNC_UPLOADS)
+http_urlpatterns = [
+    path('api/room/v1/upload-image/', ImageUploadConsumer.as_asgi()),
+]
@@ -3,7 +3,13 @@ from .message_serializers import (
     ImageUploadSerializer,
     UserSerializer,
     RoomSerializer,
-    RoomCreateSerializer
+    RoomCreateSerializer,
+    upload_size_error
+)
+from .compact_serializers import (
+    COMPACT_MESSAGE_FIELDS,
+    serialize_compact_messages,
+    serialize_message_rows
 )
 
 __all__ = [
@@ -11,5 +17,9 @@ __all__ = [
     'ImageUploadSerializer',
     'UserSerializer',
     'RoomSerializer',
-    'RoomCreateSerializer'
+    'RoomCreateSerializer',
+    'upload_size_error',
+    'COMPACT_MESSAGE_FIELDS',
+    'serialize_compact_messages',
+    'serialize_message_rows'
 ]
@@ -0,0 +1,76 @@
+"""
+Compact (non-DRF) serialization for message history pages
+
+Why not MessageSerializer?
+- it nests the same RoomSerializer in every message of a room page
+- it runs the DRF field machinery and build_absolute_uri per message
+
+Compact page layout:
+- room: room metadata once (null for public chat)
+- users: {user_id: username} side table, each user once
+- messages: flat rows that reference users by user_id; image rows add
+  thumbnail_url, medium_url, image_width and image_height
+"""
+from app_room.services.frames import media_url
+from app_room.services.recent_messages import MESSAGE_ROW_FIELDS
+
+
+# columns read from Message.objects.values(...), same rows as the recent messages store
+COMPACT_MESSAGE_FIELDS = MESSAGE_ROW_FIELDS
+
+
+def format_timestamp(value):
+    """ISO 8601 like DRF's DateTimeField ('Z' for UTC)"""
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def serialize_compact_messages(rows, request=None):
+    """Return (users, messages) for Message .values(*COMPACT_MESSAGE_FIELDS) rows"""
+    # absolute URL prefix is built once per page, not per image
+    origin = request.build_absolute_uri('/')[:-1] if request else ''
+    
+    users = {}
+    messages = []
+    for row in rows:
+        users[row['user_id']] = row['user__username']
+        
+        message = {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'content': row['content'],
+            'image_url': media_url(row['image'], origin),
+            'message_type': row['message_type'],
+            'timestamp': format_timestamp(row['timestamp']),
+        }
+        if row['message_type'] == 'image':
+            message['thumbnail_url'] = media_url(row.get('image_thumb'), origin)
+            message['medium_url'] = media_url(row.get('image_medium'), origin)
+            message['image_width'] = row.get('image_width')
+            message['image_height'] = row.get('image_height')
+        messages.append(message)
+    
+    return users, messages
+
+
+def serialize_message_rows(rows, room=None, request=None):
+    """MessageSerializer-shaped dicts for the same rows (room: RoomSerializer data)"""
+    users, messages = serialize_compact_messages(rows, request)
+    return [
+        {
+            'id': message['id'],
+            'room': room,
+            'user': {'id': message['user_id'], 'username': users[message['user_id']]},
+            'content': message['content'],
+            'image_url': message['image_url'],
+            'thumbnail_url': message.get('thumbnail_url'),
+            'medium_url': message.get('medium_url'),
+            'image_width': message.get('image_width'),
+            'image_height': message.get('image_height'),
+            'message_type': message['message_type'],
+            'timestamp': message['timestamp'],
+        }
+        for message in messages
+    ]
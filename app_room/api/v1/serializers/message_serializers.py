@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from app_room.models.room import Message, Room
+from app_room.services import identity_cache, store_image
+from django.conf import settings
 from django.contrib.auth.models import User
 
 
@@ -44,20 +46,38 @@ class MessageSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     room = RoomSerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    medium_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
-        fields = ['id', 'room', 'user', 'content', 'image_url', 'message_type', 'timestamp']
-        read_only_fields = ['id', 'room', 'user', 'content', 'image_url', 'message_type', 'timestamp']
+        fields = ['id', 'room', 'user', 'content', 'image_url', 'thumbnail_url', 'medium_url',
+                  'image_width', 'image_height', 'message_type', 'timestamp']
+        read_only_fields = fields
     
-    def get_image_url(self, obj):
-        """Recive Image URL"""
-        if obj.image:
+    def file_url(self, file):
+        if file:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+                return request.build_absolute_uri(file.url)
+            return file.url
         return None
+    
+    def get_image_url(self, obj):
+        """Recive Image URL"""
+        return self.file_url(obj.image)
+    
+    def get_thumbnail_url(self, obj):
+        """WebP thumbnail (null until the image is processed)"""
+        return self.file_url(obj.image_thumb)
+    
+    def get_medium_url(self, obj):
+        return self.file_url(obj.image_medium)
+
+
+def upload_size_error(max_size):
+    """Error message for an image over the size cap"""
+    return f"حجم فایل نباید بیشتر از {max_size // (1024*1024)} مگابایت باشد."
 
 
 class ImageUploadSerializer(serializers.ModelSerializer):
@@ -77,6 +97,8 @@ class ImageUploadSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['id', 'username', 'room_slug', 'image', 'image_url', 'timestamp']
         read_only_fields = ['id', 'timestamp']
+        # optional on the model (text messages), not here
+        extra_kwargs = {'image': {'required': True, 'allow_null': False}}
     
     def get_image_url(self, obj):
         """Recive Image URL"""
@@ -89,12 +111,9 @@ class ImageUploadSerializer(serializers.ModelSerializer):
     
     def validate_image(self, value):
         """Validate Image"""
-        # Check file size (max 5MB)
-        max_size = 5 * 1024 * 1024  # 5MB
-        if value.size > max_size:
-            raise serializers.ValidationError(
-                f"حجم فایل نباید بیشتر از {max_size // (1024*1024)} مگابایت باشد."
-            )
+        # Check file size (max CHAT_UPLOAD_MAX_SIZE, 5MB)
+        if value.size > settings.CHAT_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(upload_size_error(settings.CHAT_UPLOAD_MAX_SIZE))
         
         # Check file format
         allowed_formats = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
@@ -109,18 +128,21 @@ class ImageUploadSerializer(serializers.ModelSerializer):
         """Create Image Message"""
         username = validated_data.pop('username')
         room_slug = validated_data.pop('room_slug', None)
-        user, created = User.objects.get_or_create(username=username)
+        user = identity_cache.get_user(username)
         
         room = None
         if room_slug:
-            try:
-                room = Room.objects.get(slug=room_slug)
-            except Room.DoesNotExist:
-                pass
+            room = identity_cache.get_room(room_slug)
+        
+        if settings.CHAT_IMAGE_DEDUPE:
+            # stored once per content digest (services.blobs)
+            fields = store_image(validated_data['image'])
+        else:
+            fields = {'image': validated_data['image']}
         
         return Message.objects.create(
             user=user,
             room=room,
-            image=validated_data['image'],
-            message_type='image'
+            message_type='image',
+            **fields
         )
@@ -0,0 +1,15 @@
+from .rate_limit_throttles import (
+    RateLimitThrottle,
+    UploadRateThrottle,
+    RoomCreateRateThrottle,
+    RoomJoinRateThrottle,
+    SearchRateThrottle
+)
+
+__all__ = [
+    'RateLimitThrottle',
+    'UploadRateThrottle',
+    'RoomCreateRateThrottle',
+    'RoomJoinRateThrottle',
+    'SearchRateThrottle'
+]
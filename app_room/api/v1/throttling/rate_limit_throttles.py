@@ -0,0 +1,81 @@
+"""
+DRF throttles backed by services.rate_limit (token buckets)
+
+Over-limit requests get 429 Too Many Requests with Retry-After.
+"""
+from rest_framework.throttling import BaseThrottle
+
+from app_room.services import get_rate_limiter
+
+
+class RateLimitThrottle(BaseThrottle):
+    """
+    Takes a token from the buckets of `scope` (user, ip, room)
+
+    allow_request() runs before the view and never reads request.data, so
+    an over-limit request is rejected before its body is parsed: the IP
+    bucket, a logged in user and a room from the URL. Buckets keyed by body
+    fields (a guest's username, room_slug) are taken by allow_body() once
+    the view parses the body (views.mixins.BodyThrottleMixin).
+    """
+    scope = None
+    
+    def get_username(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.username
+        return None
+    
+    def get_room(self, request, view):
+        return None
+    
+    def get_body_keys(self, request, view):
+        """Bucket keys from the parsed body"""
+        if request.user and request.user.is_authenticated:
+            return {}
+        return {'user': request.data.get('username')}
+    
+    def take(self, **keys):
+        self.retry_after = None
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return True
+        
+        allowed, self.retry_after = limiter.check(self.scope, **keys)
+        return allowed
+    
+    def allow_request(self, request, view):
+        return self.take(
+            user=self.get_username(request),
+            ip=self.get_ident(request),
+            room=self.get_room(request, view)
+        )
+    
+    def allow_body(self, request, view):
+        return self.take(**self.get_body_keys(request, view))
+    
+    def wait(self):
+        return self.retry_after
+
+
+class UploadRateThrottle(RateLimitThrottle):
+    scope = 'upload'
+    
+    def get_body_keys(self, request, view):
+        keys = super().get_body_keys(request, view)
+        keys['room'] = request.data.get('room_slug') or 'public_chat'
+        return keys
+
+
+class RoomCreateRateThrottle(RateLimitThrottle):
+    scope = 'room_create'
+
+
+class RoomJoinRateThrottle(RateLimitThrottle):
+    scope = 'room_join'
+    
+    def get_room(self, request, view):
+        return view.kwargs.get('slug')
+
+
+class SearchRateThrottle(RateLimitThrottle):
+    scope = 'search'
@@ -11,4 +11,7 @@ urlpatterns = [
     # API routes (messages, rooms management)
     path("", include("app_room.api.v1.urls.messages")),
     path("", include("app_room.api.v1.urls.room_management")),
+    path("", include("app_room.api.v1.urls.metrics")),
+    path("", include("app_room.api.v1.urls.presence")),
+    path("", include("app_room.api.v1.urls.search")),
 ]
@@ -0,0 +1,10 @@
+"""
+URL routes for operational endpoints
+"""
+from django.urls import path
+from app_room.api.v1.views import MetricsView
+
+
+urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
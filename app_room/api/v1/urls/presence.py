@@ -0,0 +1,11 @@
+"""
+URL routes for presence (connected users)
+"""
+from django.urls import path
+from app_room.api.v1.views import PresenceView
+
+
+urlpatterns = [
+    path('presence/', PresenceView.as_view(), name='presence'),
+    path('presence/<slug:slug>/', PresenceView.as_view(), name='presence_room'),
+]
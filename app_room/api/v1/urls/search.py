@@ -0,0 +1,10 @@
+"""
+URL routes for message search
+"""
+from django.urls import path
+from app_room.api.v1.views import SearchView
+
+
+urlpatterns = [
+    path('search/', SearchView.as_view(), name='search'),
+]
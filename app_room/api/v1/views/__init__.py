@@ -5,6 +5,9 @@ Structure:
 - room_views: views for room management
 - message_views: views for message management
 - room_management_views: views for room management
+- metrics_views: views for in-process metrics
+- presence_views: views for online users
+- search_views: views for message search
 """
 
 # Template Views (HTML Pages)
@@ -28,6 +31,15 @@ from .room_management_views import (
     RoomLeaveView
 )
 
+# API Views - Metrics
+from .metrics_views import MetricsView
+
+# API Views - Presence
+from .presence_views import PresenceView
+
+# API Views - Search
+from .search_views import SearchView
+
 
 __all__ = [
     # Template Views
@@ -44,4 +56,13 @@ __all__ = [
     'RoomCreateView',
     'RoomJoinView',
     'RoomLeaveView',
+    
+    # API Views - Metrics
+    'MetricsView',
+    
+    # API Views - Presence
+    'PresenceView',
+    
+    # API Views - Search
+    'SearchView',
 ]
@@ -3,43 +3,178 @@ from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import Http404
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
-from app_room.models.room import Message, Room
+from app_room.models.room import ArchivedMessage, Message, Room
 from app_room.api.v1.serializers import (
     MessageSerializer, 
-    ImageUploadSerializer
+    ImageUploadSerializer,
+    RoomSerializer,
+    COMPACT_MESSAGE_FIELDS,
+    serialize_compact_messages,
+    serialize_message_rows
 )
+from app_room.api.v1.pagination import MessageKeysetPagination, encode_cursor
+from app_room.api.v1.throttling import UploadRateThrottle
+from app_room.services import get_image_processor, get_recent_messages, identity_cache, notify_image_message
+from app_room.services.versions import room_scope
+from .mixins import BodyThrottleMixin, ConditionalGetMixin
 
 
-class MessageHistoryView(APIView):
+class MessageHistoryView(ConditionalGetMixin, APIView):
     """
-    Get Message List - Only for initial load
+    Get Message List - keyset (cursor) pagination
     
-    - limit is constant: 50 last messages
+    - page size is constant: 50 messages, newest first
     - can be filtered by room_slug
+    - before/after take a cursor (or a message id) from a previous page
+    - offset is still accepted for old clients (returns a plain list)
+    - compact=1 returns room once, a users side table and flat message rows
+    - the first page comes from the recent messages store when it is
+      enabled (CHAT_RECENT_MESSAGES_URL), no database query when the room
+      is loaded there
+    - ETag / Last-Modified from the room version, 304 when unchanged
+    - pages past the oldest hot message continue in ArchivedMessage
+      (manage.py archive_messages), same cursors
     
     GET /api/room/v1/messages/
-    GET /api/room/v1/messages/?room_slug=general
+    GET /api/room/v1/messages/general/
+    GET /api/room/v1/messages/general/?before=<cursor>
+    GET /api/room/v1/messages/general/?after=<cursor>
+    GET /api/room/v1/messages/general/?compact=1
     """
     permission_classes = [AllowAny]
+    pagination_class = MessageKeysetPagination
     
-    def get(self, request, slug=None):
-        offset = int(request.query_params.get('offset', 0))
+    def get_version_scopes(self, request, slug=None):
+        if not slug or slug == 'public_chat':
+            return [room_scope(None)]
+        room = identity_cache.get_room(slug)
+        if room is None:
+            raise Http404
+        return [room_scope(room.id)]
+
+    def build_response(self, request, slug=None):
+        compact = request.query_params.get('compact') in ('1', 'true')
+        
+        store = get_recent_messages()
+        if store is not None and self.is_first_page(request) and store.size > self.pagination_class.page_size:
+            return self.get_recent(request, slug, store, compact)
+        
+        room = None
+        if slug and slug != 'public_chat':
+            # every message shares this room instance (nested RoomSerializer)
+            room = get_object_or_404(
+                Room.objects.select_related('creator').with_member_count(), slug=slug
+            )
+            messages = room.messages.select_related('user')
+            archive = room.archived_messages.select_related('user')
+        else:
+            messages = Message.objects.filter(room__isnull=True).select_related('user')
+            archive = ArchivedMessage.objects.filter(room__isnull=True).select_related('user')
+        
+        paginator = self.pagination_class()
+        
+        if 'offset' in request.query_params:
+            # legacy offset mode (deprecated - cost grows with the offset)
+            offset = paginator.get_offset(request)
+            messages = messages.order_by('-timestamp', '-id')[offset:offset+50]
+            serializer = MessageSerializer(messages, many=True, context={'request': request})
+            return Response(serializer.data)
+        
+        if compact:
+            return self.get_compact(request, room, messages, archive, paginator)
+        
+        page = paginator.paginate_queryset(messages, request, view=self, archive=archive)
+        serializer = MessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_compact(self, request, room, messages, archive, paginator):
+        """Compact page: plain rows from .values(), no per-message serializers"""
+        rows = paginator.paginate_queryset(
+            messages.values(*COMPACT_MESSAGE_FIELDS), request, view=self,
+            archive=archive.values(*COMPACT_MESSAGE_FIELDS)
+        )
+        users, message_rows = serialize_compact_messages(rows, request)
         
+        return Response({
+            'next': paginator.next_cursor,
+            'previous': paginator.previous_cursor,
+            'room': RoomSerializer(room, context={'request': request}).data if room else None,
+            'users': users,
+            'messages': message_rows,
+        })
+
+
+    def is_first_page(self, request):
+        params = request.query_params
+        return not any(name in params for name in ('before', 'after', 'offset'))
+
+    def get_recent(self, request, slug, store, compact):
+        """First page from the recent messages store (loaded from the database on a miss)"""
+        room_id = None
         if slug and slug != 'public_chat':
-            room = get_object_or_404(Room, slug=slug)
-            messages = room.messages.select_related('user').order_by('-timestamp')[offset:offset+50]
+            room = identity_cache.get_room(slug)
+            if room is None:
+                raise Http404
+            room_id = room.id
+        
+        cached = store.get(room_id)
+        if cached is not None:
+            room_data, rows = cached
         else:
-            messages = Message.objects.filter(room__isnull=True).select_related('user').order_by('-timestamp')[offset:offset+50]
+            # version first: a message saved during the read drops this seed
+            version = store.version(room_id)
+            room_data, rows = self.load_recent(request, room_id, store.size)
+            store.seed(room_id, version, room_data, rows)
+        
+        page_size = self.pagination_class.page_size
+        page = rows[:page_size]
+        next_cursor = None
+        if len(rows) > page_size:
+            next_cursor = encode_cursor(page[-1]['timestamp'], page[-1]['id'])
         
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
-        return Response(serializer.data)
+        if compact:
+            users, message_rows = serialize_compact_messages(page, request)
+            return Response({
+                'next': next_cursor,
+                'previous': None,
+                'room': room_data,
+                'users': users,
+                'messages': message_rows,
+            })
+        return Response({
+            'next': next_cursor,
+            'previous': None,
+            'results': serialize_message_rows(page, room_data, request),
+        })
+
+    def load_recent(self, request, room_id, size):
+        """(room data, newest rows) from the database"""
+        room_data = None
+        if room_id is not None:
+            room = Room.objects.select_related('creator').with_member_count().filter(pk=room_id).first()
+            if room is None:
+                raise Http404
+            room_data = RoomSerializer(room, context={'request': request}).data
+        
+        rows = []
+        for model in (Message, ArchivedMessage):
+            # archived rows only for rooms with fewer than `size` hot messages
+            rows.extend(
+                model.objects.filter(room_id=room_id)
+                .order_by('-timestamp', '-id')
+                .values(*COMPACT_MESSAGE_FIELDS)[:size - len(rows)]
+            )
+            if len(rows) >= size:
+                break
+        return room_data, rows
 
 
-class ImageUploadView(APIView):
+class ImageUploadView(BodyThrottleMixin, APIView):
     """
     Upload Image HTTP
     
@@ -47,39 +182,36 @@ class ImageUploadView(APIView):
     - WebSocket is not suitable for sending large files
     - HTTP with multipart/form-data is the best way to upload files
     - After upload, the data is sent to all users through WebSocket
+      (after the thumbnails are made - services.images)
     
     POST /api/room/v1/upload-image/
     Body (multipart/form-data):
         - image: file
         - username: string
         - room_slug: string (optional)
+    (rate limited per user, IP and room - 429 when over the limit)
+    
+    Under ASGI with CHAT_ASYNC_UPLOADS the path is served by the streaming
+    ImageUploadConsumer (consumers.upload_consumers) instead.
     """
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [AllowAny]
+    throttle_classes = [UploadRateThrottle]
     
     def post(self, request):
+        self.check_body_throttles(request)
         serializer = ImageUploadSerializer(data=request.data, context={'request': request})
         
         if serializer.is_valid():
             message = serializer.save()
+            origin = request.build_absolute_uri('/')[:-1]
             
-            # define group name based on room
-            room_name = message.room.slug if message.room else 'public_chat'
-            
-            # send notification to WebSocket
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'chat_{room_name}',
-                {
-                    'type': 'chat_message',
-                    'message_id': message.id,
-                    'username': message.user.username,
-                    'message': '',
-                    'image_url': request.build_absolute_uri(message.image.url),
-                    'message_type': 'image',
-                    'timestamp': message.timestamp.isoformat()
-                }
-            )
+            if settings.CHAT_IMAGE_PROCESSING and not message.image_thumb:
+                # variants are made in the background, the room is notified after
+                transaction.on_commit(lambda: get_image_processor().submit(message.id, origin))
+            else:
+                # send notification to WebSocket
+                notify_image_message(message, origin)
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
@@ -0,0 +1,25 @@
+"""
+API Views for in-process metrics
+
+🔗 Routes:
+- GET /api/room/v1/metrics/ - Counters and gauges of the worker that serves the request
+"""
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+
+from app_room.services import metrics
+
+
+class MetricsView(APIView):
+    """
+    Metrics snapshot (admin only)
+    
+    Each worker process keeps its own counters.
+    
+    GET /api/room/v1/metrics/
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(metrics.snapshot())
@@ -0,0 +1,85 @@
+"""
+View mixins
+
+ConditionalGetMixin - ETag / Last-Modified from version counters
+BodyThrottleMixin - rate limit buckets keyed by the request body
+
+Why?
+- room_list.html and the chat page reload the same rooms and messages
+- with the validators in one cache read, a repeat load is a 304 with no
+  queries and no serialization
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from app_room.services.versions import ALL, versions
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET for read-only API views
+
+    Subclasses return the version scopes their response depends on from
+    get_version_scopes(); views with their own GET handler implement
+    build_response() instead of get(). The ETag covers those versions and
+    everything else that changes the body: path, query string, Accept and
+    host (absolute image URLs).
+    """
+    cache_control = {'no_cache': True}
+
+    def get_version_scopes(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def build_response(self, request, *args, **kwargs):
+        """The full (200) response - the generic view's get() by default"""
+        return super().get(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        scopes = [ALL, *self.get_version_scopes(request, *args, **kwargs)]
+        current = versions.get(*scopes)
+        if current is None:
+            # no validators without the cache, just build the response
+            return self.build_response(request, *args, **kwargs)
+
+        version_list, last_modified = current
+        key = '|'.join([
+            *map(str, version_list),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            request.get_host(),
+        ])
+        etag = '"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+        last_modified = int(last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.build_response(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.cache_control)
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class BodyThrottleMixin:
+    """
+    Second throttle pass, once the view parses the body
+
+    DRF runs the throttles before the handler, where RateLimitThrottle only
+    takes the buckets it can key without request.data (the IP). Handlers
+    call check_body_throttles() before using the body; throttles with
+    allow_body() take the rest there, 429 like check_throttles().
+    """
+
+    def check_body_throttles(self, request):
+        durations = []
+        for throttle in self.get_throttles():
+            allow_body = getattr(throttle, 'allow_body', None)
+            if allow_body is not None and not allow_body(request, self):
+                durations.append(throttle.wait())
+        if durations:
+            durations = [duration for duration in durations if duration is not None]
+            self.throttled(request, max(durations, default=None))
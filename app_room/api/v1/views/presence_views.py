@@ -0,0 +1,41 @@
+"""
+API Views for presence (connected users)
+
+🔗 Routes:
+- GET /api/room/v1/presence/ - Users online in public chat
+- GET /api/room/v1/presence/{slug}/ - Users online in a room
+"""
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from django.http import Http404
+
+from app_room.services import get_presence, identity_cache
+
+
+class PresenceView(APIView):
+    """
+    Online count of a room (one Redis HLEN, no database query for cached rooms)
+    
+    GET /api/room/v1/presence/
+    GET /api/room/v1/presence/{slug}/
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request, slug=None):
+        presence = get_presence()
+        if presence is None:
+            return Response(
+                {'error': 'حضور کاربران فعال نیست'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if slug is not None and identity_cache.get_room(slug) is None:
+            raise Http404
+        
+        # rooms are tracked by their WebSocket group
+        group = f'chat_{slug or "public_chat"}'
+        response = Response({'room': slug, 'online': presence.online(group)})
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -13,39 +13,54 @@ from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 from app_room.models.room import Room
 from app_room.api.v1.serializers import RoomSerializer, RoomCreateSerializer
+from app_room.api.v1.throttling import RoomCreateRateThrottle, RoomJoinRateThrottle
+from app_room.services import identity_cache
+from app_room.services.versions import ROOMS, room_scope
+from .mixins import BodyThrottleMixin, ConditionalGetMixin
 
 
-class RoomListView(ListAPIView):
+class RoomListView(ConditionalGetMixin, ListAPIView):
     """
     List of public rooms
     
     GET /api/room/v1/rooms/
+    (ETag / Last-Modified from the rooms version, 304 when unchanged)
     """
     serializer_class = RoomSerializer
     permission_classes = [AllowAny]
     
+    def get_version_scopes(self, request, *args, **kwargs):
+        return [ROOMS]
+    
     def get_queryset(self):
         # only public rooms
-        return Room.objects.filter(is_public=True).select_related('creator')
+        return Room.objects.filter(is_public=True).select_related('creator').with_member_count()
 
 
-class RoomDetailView(RetrieveAPIView):
+class RoomDetailView(ConditionalGetMixin, RetrieveAPIView):
     """
     Room details
     
     GET /api/room/v1/rooms/{slug}/
+    (ETag / Last-Modified from the room version, 304 when unchanged)
     """
     serializer_class = RoomSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
-    queryset = Room.objects.all()
+    queryset = Room.objects.select_related('creator').with_member_count()
+    
+    def get_version_scopes(self, request, slug=None):
+        room = identity_cache.get_room(slug)
+        if room is None:
+            raise Http404
+        return [room_scope(room.id)]
 
 
-class RoomCreateView(APIView):
+class RoomCreateView(BodyThrottleMixin, APIView):
     """
     Create new room
     
@@ -54,10 +69,13 @@ class RoomCreateView(APIView):
         - name: string (required)
         - description: string (optional)
         - is_public: boolean (default: true)
+    (rate limited per user and IP - 429 when over the limit)
     """
     permission_classes = [AllowAny]
+    throttle_classes = [RoomCreateRateThrottle]
     
     def post(self, request):
+        self.check_body_throttles(request)
         # if user is not authenticated, create a temporary user
         if not request.user.is_authenticated:
             from django.contrib.auth.models import User
@@ -80,18 +98,23 @@ class RoomCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class RoomJoinView(APIView):
+class RoomJoinView(BodyThrottleMixin, APIView):
     """
     Join room
     
     POST /api/room/v1/rooms/{slug}/join/
     Body:
         - username: string (required)
+    (rate limited per user, IP and room - 429 when over the limit)
     """
     permission_classes = [AllowAny]
+    throttle_classes = [RoomJoinRateThrottle]
     
     def post(self, request, slug):
-        room = get_object_or_404(Room, slug=slug)
+        room = identity_cache.get_room(slug)
+        if room is None:
+            raise Http404
+        self.check_body_throttles(request)
         username = request.data.get('username')
         
         if not username:
@@ -100,12 +123,13 @@ class RoomJoinView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from django.contrib.auth.models import User
-        user, created = User.objects.get_or_create(username=username)
+        user = identity_cache.get_user(username)
         
         # add user to room
         room.members.add(user)
         
+        # fresh member count and creator in one query
+        room = Room.objects.select_related('creator').with_member_count().get(pk=room.pk)
         return Response(
             RoomSerializer(room, context={'request': request}).data,
             status=status.HTTP_200_OK
@@ -123,7 +147,9 @@ class RoomLeaveView(APIView):
     permission_classes = [AllowAny]
     
     def post(self, request, slug):
-        room = get_object_or_404(Room, slug=slug)
+        room = identity_cache.get_room(slug)
+        if room is None:
+            raise Http404
         username = request.data.get('username')
         
         if not username:
@@ -132,16 +158,15 @@ class RoomLeaveView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from django.contrib.auth.models import User
-        try:
-            user = User.objects.get(username=username)
-            room.members.remove(user)
-            return Response(
-                {'message': 'با موفقیت از اتاق خارج شدید'},
-                status=status.HTTP_200_OK
-            )
-        except User.DoesNotExist:
+        user = identity_cache.get_user(username, create=False)
+        if user is None:
             return Response(
                 {'error': 'کاربر یافت نشد'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        room.members.remove(user)
+        return Response(
+            {'message': 'با موفقیت از اتاق خارج شدید'},
+            status=status.HTTP_200_OK
+        )
@@ -0,0 +1,139 @@
+"""
+API Views for message search
+
+🔗 Routes:
+- GET /api/room/v1/search/?q=... - Search messages (services.search)
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app_room.models.room import ArchivedMessage, Message, Room
+from app_room.api.v1.pagination import MessageKeysetPagination
+from app_room.api.v1.serializers import COMPACT_MESSAGE_FIELDS, serialize_compact_messages
+from app_room.api.v1.throttling import SearchRateThrottle
+from app_room.services.search import highlight, parse_terms, search_messages
+
+
+class SearchView(APIView):
+    """
+    Search message content - keyset (cursor) pagination, newest first
+
+    - q: search text (words, "a phrase", -excluded with PostgreSQL)
+    - room: room slug (public_chat for public chat), default: every room
+      the user can see (public chat, public rooms, rooms they joined)
+    - user: sender username
+    - since / until: ISO date or datetime (a date until includes that day)
+    - before / after: cursors from a previous page, limit: page size (max 50)
+    - each message has `room` (slug, null for public chat) and `highlight`
+      (HTML-escaped snippet with the matches in <mark>)
+    - archived messages are searched too, after the hot ones (older)
+
+    GET /api/room/v1/search/?q=hello
+    GET /api/room/v1/search/?q=hello&room=general&user=admin&since=2025-11-01
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = [SearchRateThrottle]
+    pagination_class = MessageKeysetPagination
+
+    def get(self, request):
+        params = request.query_params
+        query = params.get('q', '').strip()
+        if len(query) < settings.CHAT_SEARCH_MIN_LENGTH:
+            raise ValidationError({'q': f'متن جستجو باید حداقل {settings.CHAT_SEARCH_MIN_LENGTH} کاراکتر باشد'})
+
+        condition = self.get_scope(request, params.get('room'))
+        if params.get('user'):
+            condition &= Q(user__username=params['user'])
+        since = self.parse_time(params, 'since')
+        if since is not None:
+            condition &= Q(timestamp__gte=since)
+        until = self.parse_time(params, 'until', end_of_day=True)
+        if until is not None:
+            condition &= Q(timestamp__lt=until)
+
+        messages, archive = search_messages(
+            query, Message.objects.filter(condition), ArchivedMessage.objects.filter(condition)
+        )
+        fields = (*COMPACT_MESSAGE_FIELDS, 'room__slug')
+        paginator = self.pagination_class()
+        paginator.page_size = self.get_limit(params, paginator.page_size)
+        rows = paginator.paginate_queryset(
+            messages.values(*fields), request, view=self, archive=archive.values(*fields)
+        )
+
+        users, message_rows = serialize_compact_messages(rows, request)
+        terms = parse_terms(query)
+        for row, message in zip(rows, message_rows):
+            message['room'] = row['room__slug']
+            message['highlight'] = highlight(row['content'], terms)
+
+        return Response({
+            'query': query,
+            'next': paginator.next_cursor,
+            'previous': paginator.previous_cursor,
+            'users': users,
+            'messages': message_rows,
+        })
+
+    def get_scope(self, request, slug):
+        """Condition (Message and ArchivedMessage) for one room or all rooms the request may search"""
+        user = request.user if request.user.is_authenticated else None
+
+        if slug == 'public_chat':
+            return Q(room__isnull=True)
+        if slug:
+            room = Room.objects.filter(slug=slug).values('id', 'is_public').first()
+            # private rooms are searchable by members only (404, not 403: no leak)
+            if room is None or not (room['is_public'] or self.is_member(user, room['id'])):
+                raise Http404
+            return Q(room_id=room['id'])
+
+        visible = Q(room__isnull=True) | Q(room__is_public=True)
+        if user is not None:
+            # subquery, a join on members would repeat rows
+            visible |= Q(room__in=Room.objects.filter(Q(members=user) | Q(creator=user)).values('id'))
+        return visible
+
+    @staticmethod
+    def is_member(user, room_id):
+        if user is None:
+            return False
+        return Room.objects.filter(Q(members=user) | Q(creator=user), pk=room_id).exists()
+
+    @staticmethod
+    def get_limit(params, default):
+        try:
+            limit = int(params.get('limit', default))
+        except ValueError:
+            raise ValidationError({'limit': 'مقدار limit باید عدد باشد'})
+        return max(1, min(limit, default))
+
+    @staticmethod
+    def parse_time(params, name, end_of_day=False):
+        """Aware datetime from an ISO date or datetime; a date until means the next midnight"""
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                day = parse_date(value)
+                if day is None:
+                    raise ValueError
+                if end_of_day:
+                    day += timedelta(days=1)
+                parsed = datetime.combine(day, time.min)
+        except ValueError:
+            raise ValidationError({name: 'تاریخ نامعتبر است (YYYY-MM-DD یا ISO 8601)'})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
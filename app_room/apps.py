@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppRoomConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_room'
+
+    def ready(self):
+        # connect model signals (identity cache invalidation)
+        from app_room import signals  # noqa: F401
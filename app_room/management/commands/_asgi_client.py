@@ -0,0 +1,80 @@
+"""
+Minimal in-process ASGI client used by the smoke test and load test
+
+Talks to the ASGI application directly (no server, no sockets).
+"""
+import json
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+
+
+def default_host():
+    """First concrete ALLOWED_HOSTS entry (requests with other hosts get 400)"""
+    return next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host and host != '*'),
+        'localhost'
+    )
+
+
+async def http_get(application, path, timeout=5, query_string=b''):
+    """GET path and return (status, body)"""
+    host = default_host()
+    communicator = ApplicationCommunicator(application, {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'https',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string,
+        'headers': [(b'host', host.encode())],
+        'server': (host, 443),
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(timeout)
+    body = b''
+    while True:
+        message = await communicator.receive_output(timeout)
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    await communicator.wait(timeout)
+    return start['status'], body
+
+
+class InProcessWebSocket:
+    """WebSocket connection to the ASGI application"""
+
+    def __init__(self, application, path, timeout=5):
+        self.timeout = timeout
+        path, _, query_string = path.partition('?')
+        self.communicator = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': path,
+            'headers': [],
+            'query_string': query_string.encode(),
+            'subprotocols': [],
+        })
+
+    async def connect(self):
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        response = await self.communicator.receive_output(self.timeout)
+        if response['type'] != 'websocket.accept':
+            raise ConnectionError(f'WebSocket connection was not accepted: {response}')
+        return self
+
+    async def send(self, data):
+        await self.communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def recv(self, timeout=None):
+        """Return the next text frame (raises asyncio.TimeoutError)"""
+        frame = await self.communicator.receive_output(timeout or self.timeout)
+        if frame['type'] != 'websocket.send':
+            raise ConnectionError(f'WebSocket closed: {frame}')
+        return frame['text']
+
+    async def close(self):
+        await self.communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.communicator.wait(self.timeout)
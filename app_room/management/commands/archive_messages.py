@@ -0,0 +1,105 @@
+"""
+Move old messages from Message to ArchivedMessage
+
+History, search and admin queries run against the hot Message table; this
+moves messages older than --days (CHAT_ARCHIVE_AFTER_DAYS) to the archive,
+oldest first, in transactions of --batch-size rows, so the locks and the
+write-ahead log of each step stay bounded. --pause sleeps between batches
+to leave I/O to the live traffic.
+
+Rows keep their ids. Archived messages are always older than the hot ones
+(the cutoff only moves forward, and a batch waits for rows another
+transaction holds instead of skipping them), which is what lets
+MessageHistoryView and SearchView continue a page from the archive.
+Moving a row changes nothing a client sees, so the rows are deleted with
+one DELETE and no post_delete signals are sent (no ETag bumps, no recent
+messages invalidation).
+
+Usage:
+    python manage.py archive_messages --dry-run
+    python manage.py archive_messages --days 90 --batch-size 1000 --pause 0.1
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app_room.models.room import ArchivedMessage, Message
+
+# columns copied as they are (ArchivedMessage.archived_at is set on insert)
+ARCHIVED_FIELDS = [
+    field.attname for field in ArchivedMessage._meta.concrete_fields if field.name != 'archived_at'
+]
+
+
+def archive_batch(cutoff, batch_size):
+    """Move up to batch_size messages older than cutoff, return how many moved"""
+    with transaction.atomic():
+        # waits for rows an edit (or another archiver) holds: skipping them
+        # would leave older rows in the hot table; no-op on SQLite
+        rows = list(
+            Message.objects.filter(timestamp__lt=cutoff)
+            .order_by('timestamp', 'id')
+            .select_for_update()
+            .values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedMessage.objects.bulk_create(
+            [ArchivedMessage(**row) for row in rows], ignore_conflicts=True
+        )
+        delete_messages([row['id'] for row in rows])
+    return len(rows)
+
+
+def delete_messages(ids):
+    """
+    DELETE the Message rows by id
+
+    QuerySet.delete() would load the rows and send post_delete for each;
+    nothing references Message, so one statement is enough.
+    """
+    table = connection.ops.quote_name(Message._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+
+
+class Command(BaseCommand):
+    help = 'Move messages older than the hot window to the archive table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+                            help='Archive messages older than N days')
+        parser.add_argument('--batch-size', type=int, default=settings.CHAT_ARCHIVE_BATCH_SIZE,
+                            help='Messages moved per transaction')
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after N batches (0: until done)')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the messages that would move')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = Message.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} message(s) older than {cutoff:%Y-%m-%d %H:%M} would be archived')
+            return
+
+        moved = batches = 0
+        started = time.monotonic()
+        while not options['max_batches'] or batches < options['max_batches']:
+            count = archive_batch(cutoff, options['batch_size'])
+            if not count:
+                break
+            moved += count
+            batches += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'batch {batches}: {count} message(s)')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} message(s) archived in {batches} batch(es), {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,78 @@
+"""
+Smoke test for the ASGI serving profile
+
+Runs the real chat.asgi application in-process with an in-memory channel
+layer stand-in (no Redis, no server):
+- HTTP: GET /api/room/v1/rooms/ is served by the ASGI http path
+- WebSocket: two sockets join public_chat, one sends a frame,
+  both receive the broadcast
+
+Only image notifications are sent, so nothing is written to the database.
+
+Usage:
+    python manage.py asgi_smoke_test
+"""
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from ._asgi_client import InProcessWebSocket, http_get
+
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = 'Smoke test the ASGI application (HTTP + WebSocket) with an in-memory channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=5, help='Seconds to wait per step')
+
+    def handle(self, *args, **options):
+        self.timeout = options['timeout']
+        
+        with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+            from chat.asgi import application
+            
+            status, body = async_to_sync(http_get)(application, '/api/room/v1/rooms/', self.timeout)
+            self.stdout.write(f'HTTP   GET /api/room/v1/rooms/ -> {status}')
+            if status >= 500:
+                raise CommandError('HTTP path returned a server error')
+            
+            async_to_sync(self.check_websocket)(application)
+            self.stdout.write('WS     public_chat broadcast reached both sockets')
+        
+        self.stdout.write(self.style.SUCCESS('ASGI smoke test passed'))
+
+    async def check_websocket(self, application):
+        try:
+            sockets = [
+                await InProcessWebSocket(application, '/ws/chat/public_chat/', self.timeout).connect()
+                for i in range(2)
+            ]
+        except ConnectionError as e:
+            raise CommandError(str(e))
+        
+        await sockets[0].send({
+            'message_type': 'image',
+            'username': 'asgi-smoke-test',
+            'message_id': None,
+            'image_url': '/smoke-test.png',
+        })
+        
+        for socket in sockets:
+            try:
+                frame = await socket.recv()
+            except ConnectionError as e:
+                raise CommandError(f'Expected a broadcast frame: {e}')
+            if json.loads(frame)['username'] != 'asgi-smoke-test':
+                raise CommandError(f'Unexpected broadcast payload: {frame}')
+        
+        for socket in sockets:
+            await socket.close()
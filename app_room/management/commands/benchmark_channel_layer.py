@@ -0,0 +1,168 @@
+"""
+Broadcast throughput benchmark: 1 shard vs N shards
+
+Starts local redis-server processes (or uses --redis-urls), builds a
+RedisChannelLayer / RedisPubSubChannelLayer over 1 shard and over N
+shards, and measures group_send fan-out:
+- every group has --members channels
+- --messages group_send calls are spread over --groups groups
+- throughput = delivered frames / second (all members drained)
+
+Usage:
+    python manage.py benchmark_channel_layer --shards 4
+    python manage.py benchmark_channel_layer --redis-urls redis://127.0.0.1:6379/0,redis://127.0.0.1:6380/0
+    python manage.py benchmark_channel_layer --backend pubsub --output results.json
+"""
+import asyncio
+import json
+import shutil
+import socket
+import subprocess
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Compare channel layer broadcast throughput for 1 shard and N shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, default=4, help='Number of shards in the sharded run')
+        parser.add_argument('--redis-urls', default='', help='Comma-separated Redis URLs (skip spawning redis-server)')
+        parser.add_argument('--redis-server', default='redis-server', help='redis-server binary to spawn')
+        parser.add_argument('--backend', choices=['core', 'pubsub'], default='core')
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--members', type=int, default=20, help='Channels per group')
+        parser.add_argument('--messages', type=int, default=2000, help='group_send calls per run')
+        parser.add_argument('--concurrency', type=int, default=100, help='Concurrent group_send calls')
+        parser.add_argument('--pool-size', type=int, default=None, help='max_connections per shard pool')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        self.options = options
+        processes = []
+        
+        if options['redis_urls']:
+            urls = [url.strip() for url in options['redis_urls'].split(',') if url.strip()]
+        else:
+            if shutil.which(options['redis_server']) is None:
+                raise CommandError(
+                    f'{options["redis_server"]} not found - install Redis or pass --redis-urls'
+                )
+            urls = []
+            for i in range(options['shards']):
+                port = self.free_port()
+                processes.append(subprocess.Popen(
+                    [options['redis_server'], '--port', str(port), '--save', '', '--appendonly', 'no'],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                ))
+                urls.append(f'redis://127.0.0.1:{port}/0')
+            self.wait_for_ports(urls)
+        
+        try:
+            results = []
+            for shard_urls in (urls[:1], urls):
+                result = async_to_sync(self.run)(shard_urls)
+                results.append(result)
+                self.stdout.write(
+                    f'{result["shards"]} shard(s): {result["deliveries_per_second"]:,.0f} deliveries/s, '
+                    f'{result["group_sends_per_second"]:,.0f} group_send/s '
+                    f'({result["deliveries"]} frames in {result["seconds"]:.2f}s)'
+                )
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+        
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'benchmark': 'channel_layer_broadcast', 'options': {
+                    key: options[key] for key in ('backend', 'groups', 'members', 'messages', 'concurrency', 'pool_size')
+                }, 'results': results}, f, indent=2)
+
+    async def run(self, urls):
+        options = self.options
+        hosts = []
+        for url in urls:
+            host = {'address': url}
+            if options['pool_size']:
+                host['max_connections'] = options['pool_size']
+            hosts.append(host)
+        
+        if options['backend'] == 'pubsub':
+            from channels_redis.pubsub import RedisPubSubChannelLayer
+            layer = RedisPubSubChannelLayer(hosts=hosts, prefix='bench')
+        else:
+            from channels_redis.core import RedisChannelLayer
+            # capacity high enough that nothing is dropped while draining
+            layer = RedisChannelLayer(hosts=hosts, prefix='bench', capacity=options['messages'] + 1)
+        
+        groups = [f'bench_{i}' for i in range(options['groups'])]
+        members = {}
+        for group in groups:
+            members[group] = [await layer.new_channel() for i in range(options['members'])]
+            for channel in members[group]:
+                await layer.group_add(group, channel)
+        
+        sends_per_group = [0] * len(groups)
+        for i in range(options['messages']):
+            sends_per_group[i % len(groups)] += 1
+        expected = sum(count * options['members'] for count in sends_per_group)
+        
+        async def drain(channel, count):
+            for i in range(count):
+                await layer.receive(channel)
+        
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        
+        async def send(group):
+            async with semaphore:
+                await layer.group_send(group, {'type': 'chat.message', 'message': 'x' * 100})
+        
+        started = time.perf_counter()
+        drains = [
+            asyncio.ensure_future(drain(channel, sends_per_group[index]))
+            for index, group in enumerate(groups)
+            for channel in members[group]
+        ]
+        await asyncio.gather(*[
+            send(groups[i % len(groups)]) for i in range(options['messages'])
+        ])
+        await asyncio.gather(*drains)
+        seconds = time.perf_counter() - started
+        
+        for group in groups:
+            for channel in members[group]:
+                await layer.group_discard(group, channel)
+        await layer.flush()
+        if hasattr(layer, 'close_pools'):
+            await layer.close_pools()
+        
+        return {
+            'shards': len(urls),
+            'deliveries': expected,
+            'seconds': seconds,
+            'deliveries_per_second': expected / seconds,
+            'group_sends_per_second': options['messages'] / seconds,
+        }
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    @staticmethod
+    def wait_for_ports(urls, timeout=10):
+        deadline = time.monotonic() + timeout
+        for url in urls:
+            port = int(url.rsplit(':', 1)[1].split('/')[0])
+            while True:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f'redis-server on port {port} did not start')
+                    time.sleep(0.05)
@@ -0,0 +1,131 @@
+"""
+Fan-out encoding microbenchmark
+
+Measures the CPU spent turning one chat message into the frames sent to
+a group of --members sockets:
+- per_consumer: every consumer builds the dict and runs json.dumps
+  (the chat_message handler before frames were pre-encoded)
+- encode_once/<codec>: the sender encodes once, consumers forward the text
+and the cost of parsing one incoming frame with each codec.
+
+Usage:
+    python manage.py benchmark_fanout --members 5000
+    python manage.py benchmark_fanout --members 100,1000,5000 --output fanout.json
+"""
+import json
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand
+
+from app_room.services.codec import build_codec
+
+
+CODECS = ['json', 'orjson', 'msgspec']
+
+
+class Command(BaseCommand):
+    help = 'Measure per-fan-out CPU cost of encoding chat frames'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', default='100,1000,5000', help='Comma-separated group sizes')
+        parser.add_argument('--rounds', type=int, default=20, help='Fan-outs measured per group size')
+        parser.add_argument('--message', default='سلام! این یک پیام آزمایشی برای سنجش سرعت است. ' * 3)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        codecs = {}
+        for name in CODECS:
+            try:
+                codecs[name] = build_codec(name)
+            except ImproperlyConfigured:
+                self.stdout.write(f'{name}: not installed, skipped')
+
+        event = {
+            'type': 'chat_message',
+            'message_id': 123456,
+            'provisional_id': None,
+            'username': 'benchmark-user',
+            'message': options['message'],
+            'message_type': 'text',
+            'timestamp': '2025-11-08T12:30:00.123456+00:00',
+        }
+        incoming = json.dumps({
+            'message_type': 'text',
+            'username': event['username'],
+            'message': event['message'],
+        })
+
+        results = {'fanout': [], 'parse': []}
+        for members in [int(value) for value in options['members'].split(',') if value.strip()]:
+            rows = [('per_consumer', self.per_consumer(event, members, options['rounds']))]
+            for name, codec in codecs.items():
+                rows.append((f'encode_once/{name}', self.encode_once(event, codec, members, options['rounds'])))
+
+            baseline = rows[0][1]
+            for label, seconds in rows:
+                results['fanout'].append({
+                    'members': members,
+                    'mode': label,
+                    'us_per_fanout': seconds * 1e6,
+                    'speedup': baseline / seconds if seconds else None,
+                })
+                self.stdout.write(
+                    f'{members:>6} members  {label:<20} {seconds * 1e6:>12,.1f} us/fan-out '
+                    f'({baseline / seconds:,.1f}x)'
+                )
+
+        for name, codec in codecs.items():
+            seconds = self.parse(codec, incoming, options['rounds'] * 1000)
+            results['parse'].append({'codec': name, 'us_per_frame': seconds * 1e6})
+            self.stdout.write(f'parse {name:<8} {seconds * 1e6:,.2f} us/frame')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'benchmark': 'fanout_encoding', 'options': {
+                    key: options[key] for key in ('members', 'rounds')
+                }, 'results': results}, f, indent=2)
+
+    @staticmethod
+    def per_consumer(event, members, rounds):
+        """Old handler: a dict and a json.dumps in every consumer"""
+        started = time.process_time()
+        for i in range(rounds):
+            for j in range(members):
+                response_data = {
+                    'message_id': event.get('message_id'),
+                    'provisional_id': event.get('provisional_id'),
+                    'username': event['username'],
+                    'message_type': event.get('message_type', 'text'),
+                    'timestamp': event.get('timestamp', ''),
+                }
+                response_data['message'] = event['message']
+                json.dumps(response_data)
+        return (time.process_time() - started) / rounds
+
+    @staticmethod
+    def encode_once(event, codec, members, rounds):
+        """New path: one encode by the sender, a lookup per consumer"""
+        dumps = codec.dumps
+        started = time.process_time()
+        for i in range(rounds):
+            data = {
+                'message_id': event['message_id'],
+                'provisional_id': event['provisional_id'],
+                'username': event['username'],
+                'message_type': event['message_type'],
+                'timestamp': event['timestamp'],
+                'message': event['message'],
+            }
+            group_event = {'type': 'chat_message', 'frame': dumps(data)}
+            for j in range(members):
+                group_event.get('frame')
+        return (time.process_time() - started) / rounds
+
+    @staticmethod
+    def parse(codec, incoming, rounds):
+        loads = codec.loads
+        started = time.process_time()
+        for i in range(rounds):
+            loads(incoming)
+        return (time.process_time() - started) / rounds
@@ -0,0 +1,87 @@
+"""
+Delete image files no message references
+
+Files are not deleted with their messages: with CHAT_IMAGE_DEDUPE one file
+is shared by every message carrying the same upload, so deleting messages,
+or a room with its messages (cascade), leaves files behind. This counts the
+references of every file under chat_images/ (image, image_thumb and
+image_medium of Message and ArchivedMessage) and deletes the files that
+have none.
+
+Files younger than --min-age seconds are kept: an upload is stored before
+its Message row is saved.
+
+Usage:
+    python manage.py cleanup_images --dry-run
+    python manage.py cleanup_images --min-age 3600
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from app_room.models.room import ArchivedMessage, Message
+
+IMAGE_FIELDS = ('image', 'image_thumb', 'image_medium')
+
+
+def walk(storage, path):
+    """Every file name under path"""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(storage, f'{path}/{directory}')
+
+
+def is_referenced(name):
+    references = Q(image=name) | Q(image_thumb=name) | Q(image_medium=name)
+    return any(model.objects.filter(references).exists() for model in (Message, ArchivedMessage))
+
+
+class Command(BaseCommand):
+    help = 'Delete files under chat_images/ that no message references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600, help='Keep files modified in the last N seconds')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the files that would be deleted')
+
+    def handle(self, *args, **options):
+        references = Counter()
+        for model in (Message, ArchivedMessage):
+            rows = model.objects.filter(message_type='image').values_list(*IMAGE_FIELDS)
+            for row in rows.iterator(chunk_size=2000):
+                references.update(name for name in row if name)
+
+        if not default_storage.exists('chat_images'):
+            self.stdout.write('No chat_images/ directory')
+            return
+
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        kept = deleted = freed = 0
+        for name in walk(default_storage, 'chat_images'):
+            if references[name] or default_storage.get_modified_time(name) > cutoff:
+                kept += 1
+                continue
+            # referenced since the count was taken (a duplicate upload)
+            if is_referenced(name):
+                kept += 1
+                continue
+
+            size = default_storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f'would delete {name} ({size} bytes)')
+            else:
+                default_storage.delete(name)
+            deleted += 1
+            freed += size
+
+        shared = sum(1 for count in references.values() if count > 1)
+        verb = 'would be deleted' if options['dry_run'] else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} orphaned file(s) {verb} ({freed} bytes), {kept} kept, '
+            f'{shared} file(s) shared by several messages'
+        ))
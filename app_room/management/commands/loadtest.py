@@ -0,0 +1,301 @@
+"""
+Load-testing harness for WebSocket fan-out and the history / room list APIs
+
+WebSocket phase:
+- opens --connections sockets to ws/chat/<room>/
+- --senders of them send text frames at --rate frames/second each for --duration seconds
+- every socket measures end-to-end broadcast latency (send -> receive)
+
+HTTP phase:
+- --http-requests GETs (--http-concurrency at a time) to
+  /api/room/v1/messages/ and /api/room/v1/rooms/
+
+Targets:
+- --url http://127.0.0.1:8000: a running server (uvicorn/daphne, in-memory or
+  local-Redis channel layer)
+- --in-process: the chat.asgi application in this process with an in-memory
+  channel layer (no server needed)
+
+Text frames are saved like real chat messages - run it against a local stack.
+
+Usage:
+    python manage.py loadtest --in-process --connections 500 --output loadtest.json
+    python manage.py loadtest --url http://127.0.0.1:8000 --connections 2000 --senders 20 --rate 5
+"""
+import asyncio
+import json
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from ._asgi_client import InProcessWebSocket, http_get
+
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        # every socket buffers the whole run, nothing may be dropped
+        'CONFIG': {'capacity': 100000},
+    },
+}
+
+
+def percentiles(values):
+    """p50/p90/p99/max in milliseconds"""
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    values = sorted(values)
+    
+    def pick(fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+    
+    return {'p50': pick(0.50), 'p90': pick(0.90), 'p99': pick(0.99), 'max': round(values[-1] * 1000, 3)}
+
+
+class NetworkWebSocket:
+    """WebSocket connection to a running server (websockets package)"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    async def connect(self):
+        import websockets
+        self.connection = await websockets.connect(self.url, open_timeout=self.timeout, max_size=None)
+        return self
+
+    async def send(self, data):
+        await self.connection.send(json.dumps(data))
+
+    async def recv(self, timeout=None):
+        return await asyncio.wait_for(self.connection.recv(), timeout or self.timeout)
+
+    async def close(self):
+        await self.connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Load test WebSocket fan-out latency and the message history / room list APIs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of a running server')
+        parser.add_argument('--in-process', action='store_true', help='Drive chat.asgi in this process (in-memory layer)')
+        parser.add_argument('--room', default='public_chat', help='Room slug')
+        parser.add_argument('--connections', type=int, default=1000, help='Concurrent WebSocket connections')
+        parser.add_argument('--connect-concurrency', type=int, default=200, help='Sockets opened at a time')
+        parser.add_argument('--senders', type=int, default=10, help='Connections that send frames')
+        parser.add_argument('--rate', type=float, default=5, help='Frames per second per sender')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to send for')
+        parser.add_argument('--drain-timeout', type=float, default=10, help='Seconds to wait for late frames')
+        parser.add_argument('--http-requests', type=int, default=500, help='Requests per HTTP endpoint (0 to skip)')
+        parser.add_argument('--http-concurrency', type=int, default=20)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        self.options = options
+        
+        if options['in_process']:
+            # measure the server, not the rate limits
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CHAT_RATE_LIMIT_URL=''):
+                from chat.asgi import application
+                self.application = application
+                results = async_to_sync(self.run)()
+        else:
+            try:
+                import websockets  # noqa: F401
+            except ImportError:
+                raise CommandError('the websockets package is required for --url (pip install websockets)')
+            self.application = None
+            results = async_to_sync(self.run)()
+        
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    async def run(self):
+        options = self.options
+        results = {
+            'target': 'in-process' if options['in_process'] else options['url'],
+            'started_at': time.time(),
+            'options': {
+                key: options[key] for key in (
+                    'room', 'connections', 'senders', 'rate', 'duration',
+                    'http_requests', 'http_concurrency'
+                )
+            },
+        }
+        results['websocket'] = await self.run_websocket()
+        if options['http_requests']:
+            room = options['room']
+            history_path = '/api/room/v1/messages/' if room == 'public_chat' else f'/api/room/v1/messages/{room}/'
+            results['http'] = {
+                'message_history': await self.run_http(history_path),
+                'room_list': await self.run_http('/api/room/v1/rooms/'),
+            }
+        return results
+
+    # WebSocket phase
+
+    def open_socket(self):
+        path = f'/ws/chat/{self.options["room"]}/'
+        if self.application is not None:
+            return InProcessWebSocket(self.application, path).connect()
+        url = self.options['url'].replace('http://', 'ws://').replace('https://', 'wss://').rstrip('/')
+        return NetworkWebSocket(url + path).connect()
+
+    async def run_websocket(self):
+        options = self.options
+        run_id = uuid.uuid4().hex[:8]
+        marker = f'loadtest|{run_id}|'
+        
+        # open sockets
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+        connect_times = []
+        
+        async def connect():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    socket = await self.open_socket()
+                except Exception:
+                    return None
+                connect_times.append(time.perf_counter() - started)
+                return socket
+        
+        opened = await asyncio.gather(*[connect() for i in range(options['connections'])])
+        sockets = [socket for socket in opened if socket is not None]
+        if not sockets:
+            raise CommandError('no WebSocket connection could be opened')
+        
+        # receive on every socket
+        sent_at = {}
+        latencies = []
+        received = [0]
+        sending_done = asyncio.Event()
+        
+        async def receive(socket):
+            while True:
+                timeout = options['drain_timeout'] if sending_done.is_set() else options['duration'] + options['drain_timeout']
+                try:
+                    text = await socket.recv(timeout=timeout)
+                except Exception:
+                    return
+                now = time.perf_counter()
+                message = json.loads(text).get('message') or ''
+                if message.startswith(marker):
+                    received[0] += 1
+                    latencies.append(now - sent_at[message])
+                    if received[0] >= expected[0] and sending_done.is_set():
+                        return
+        
+        expected = [0]
+        receivers = [asyncio.ensure_future(receive(socket)) for socket in sockets]
+        
+        # send at a fixed rate
+        async def send(socket, sender_index):
+            interval = 1 / options['rate']
+            deadline = time.perf_counter() + options['duration']
+            seq = 0
+            while time.perf_counter() < deadline:
+                message = f'{marker}{sender_index}|{seq}'
+                sent_at[message] = time.perf_counter()
+                await socket.send({
+                    'message_type': 'text',
+                    'username': f'loadtest-{sender_index}',
+                    'message': message,
+                })
+                seq += 1
+                await asyncio.sleep(interval)
+            return seq
+        
+        started = time.perf_counter()
+        senders = sockets[:options['senders']]
+        counts = await asyncio.gather(*[send(socket, i) for i, socket in enumerate(senders)])
+        sent = sum(counts)
+        expected[0] = sent * len(sockets)
+        sending_done.set()
+        
+        await asyncio.wait(receivers, timeout=options['drain_timeout'])
+        elapsed = time.perf_counter() - started
+        for receiver in receivers:
+            receiver.cancel()
+        await asyncio.gather(*[socket.close() for socket in sockets], return_exceptions=True)
+        
+        return {
+            'connections_opened': len(sockets),
+            'connections_failed': options['connections'] - len(sockets),
+            'connect_ms': percentiles(connect_times),
+            'frames_sent': sent,
+            'deliveries_expected': expected[0],
+            'deliveries_received': received[0],
+            'delivery_ratio': round(received[0] / expected[0], 4) if expected[0] else None,
+            'sent_per_second': round(sent / options['duration'], 2),
+            'deliveries_per_second': round(received[0] / elapsed, 2),
+            'latency_ms': percentiles(latencies),
+        }
+
+    # HTTP phase
+
+    async def get(self, path):
+        if self.application is not None:
+            status, body = await http_get(self.application, path)
+            return status
+        
+        def fetch():
+            try:
+                with urllib.request.urlopen(self.options['url'].rstrip('/') + path, timeout=10) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        return await asyncio.to_thread(fetch)
+
+    async def run_http(self, path):
+        options = self.options
+        semaphore = asyncio.Semaphore(options['http_concurrency'])
+        latencies = []
+        errors = [0]
+        
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = await self.get(path)
+                except Exception:
+                    status = None
+                if status is None or status >= 400:
+                    errors[0] += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        await asyncio.gather(*[request() for i in range(options['http_requests'])])
+        elapsed = time.perf_counter() - started
+        
+        return {
+            'path': path,
+            'requests': options['http_requests'],
+            'errors': errors[0],
+            'requests_per_second': round(options['http_requests'] / elapsed, 2),
+            'latency_ms': percentiles(latencies),
+        }
+
+    def report(self, results):
+        ws = results['websocket']
+        self.stdout.write(
+            f'WS    {ws["connections_opened"]} sockets ({ws["connections_failed"]} failed), '
+            f'{ws["frames_sent"]} frames sent, {ws["deliveries_received"]}/{ws["deliveries_expected"]} delivered, '
+            f'{ws["deliveries_per_second"]:,.0f} deliveries/s'
+        )
+        self.stdout.write(f'      latency ms {ws["latency_ms"]}')
+        for name, http in results.get('http', {}).items():
+            self.stdout.write(
+                f'HTTP  {http["path"]}: {http["requests_per_second"]:,.0f} req/s, '
+                f'{http["errors"]} errors, latency ms {http["latency_ms"]}'
+            )
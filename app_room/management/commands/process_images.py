@@ -0,0 +1,44 @@
+"""
+Process image messages that have no variants yet
+
+Images uploaded while CHAT_IMAGE_PROCESSING was off, or whose background
+processing was lost (worker restart), have no thumbnail. This stores the
+variants and dimensions for them without notifying the rooms.
+
+Usage:
+    python manage.py process_images
+    python manage.py process_images --all --limit 500
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from app_room.models.room import Message
+from app_room.services import get_image_processor
+
+
+class Command(BaseCommand):
+    help = 'Create thumbnails, medium variants and dimensions for image messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess images that already have variants')
+        parser.add_argument('--limit', type=int, default=0, help='Process at most this many messages (0: all)')
+
+    def handle(self, *args, **options):
+        messages = Message.objects.filter(message_type='image').exclude(image='')
+        if not options['all']:
+            messages = messages.filter(Q(image_thumb='') | Q(image_thumb__isnull=True))
+        ids = messages.order_by('id').values_list('id', flat=True)
+        if options['limit']:
+            ids = ids[:options['limit']]
+
+        processor = get_image_processor()
+        processed = 0
+        for message_id in ids.iterator():
+            # --all renders again, even images another message shares
+            message = processor.process(message_id, notify=False, reuse=not options['all'])
+            if message.image_thumb:
+                processed += 1
+            else:
+                self.stderr.write(f'message {message_id}: failed')
+
+        self.stdout.write(self.style.SUCCESS(f'{processed} image(s) processed'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+from app_room.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY on PostgreSQL: no write lock on app_room_message
+    atomic = False
+
+    dependencies = [
+        ('app_room', '0007_alter_message_options_alter_room_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['room', 'timestamp', 'id'], name='message_room_ts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(condition=models.Q(('room__isnull', True)), fields=['timestamp', 'id'], name='message_public_ts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['message_type', 'timestamp'], name='message_type_ts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='room',
+            index=models.Index(fields=['is_public', '-created_at'], name='room_public_created_idx'),
+        ),
+    ]
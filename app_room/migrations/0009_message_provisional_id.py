@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_room', '0008_message_and_room_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='provisional_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='provisional id'),
+        ),
+    ]
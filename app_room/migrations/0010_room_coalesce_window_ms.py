@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_room', '0009_message_provisional_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='coalesce_window_ms',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(1000)], verbose_name='coalesce window (ms)'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_room', '0010_room_coalesce_window_ms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='image height'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='image_medium',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='chat_images/medium/', verbose_name='medium image'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='image_thumb',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='chat_images/thumbs/', verbose_name='thumbnail'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='image width'),
+        ),
+    ]
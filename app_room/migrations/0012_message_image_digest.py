@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_room', '0011_message_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='image_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='image digest'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('image_digest', ''), _negated=True), fields=['image_digest'], name='message_image_digest_idx'),
+        ),
+    ]
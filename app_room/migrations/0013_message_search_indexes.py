@@ -0,0 +1,104 @@
+from django.db import migrations
+
+# PostgreSQL only (services.search): a tsvector of the content with a GIN
+# index, and a pg_trgm GIN index for substring (ILIKE) and word similarity
+# matches. The column is not a model field, Message queries never select it.
+#
+# Nothing here rewrites or locks the table for long, so it runs on a live
+# database (atomic = False, every statement commits on its own):
+# - the column is added without a default (a catalog change; lock_timeout
+#   keeps the ALTER from queueing behind long transactions and blocking
+#   everyone else) and kept up to date by a trigger, not GENERATED ... STORED,
+#   which rewrites the table under ACCESS EXCLUSIVE
+# - existing rows are filled in batches of BACKFILL_BATCH_SIZE, one short
+#   transaction each; rows written meanwhile get theirs from the trigger
+# - the indexes are built with CREATE INDEX CONCURRENTLY; if a build fails,
+#   drop the INVALID index and migrate again
+BACKFILL_BATCH_SIZE = 5000
+
+SETUP_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "SET lock_timeout = '5s'",
+    'ALTER TABLE app_room_message ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    # a stored generated column from an earlier version of this migration
+    'ALTER TABLE app_room_message ALTER COLUMN search_vector DROP EXPRESSION IF EXISTS',
+    'RESET lock_timeout',
+    """
+    CREATE OR REPLACE FUNCTION app_room_message_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple'::regconfig, coalesce(NEW.content, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER message_search_vector_trg
+    BEFORE INSERT OR UPDATE OF content ON app_room_message
+    FOR EACH ROW EXECUTE FUNCTION app_room_message_search_vector()
+    """,
+]
+
+INDEX_SQL = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS message_search_vector_idx ON app_room_message USING gin (search_vector)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS message_content_trgm_idx ON app_room_message USING gin (content gin_trgm_ops)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS message_content_trgm_idx',
+    'DROP INDEX CONCURRENTLY IF EXISTS message_search_vector_idx',
+    'DROP TRIGGER IF EXISTS message_search_vector_trg ON app_room_message',
+    'DROP FUNCTION IF EXISTS app_room_message_search_vector()',
+    'ALTER TABLE app_room_message DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def backfill(schema_editor):
+    """search_vector of the rows written before the trigger, in id ranges"""
+    last_id = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                'SELECT max(id) FROM (SELECT id FROM app_room_message WHERE id > %s ORDER BY id LIMIT %s) batch',
+                [last_id, BACKFILL_BATCH_SIZE]
+            )
+            upper_id = cursor.fetchone()[0]
+            if upper_id is None:
+                return
+            cursor.execute(
+                """
+                UPDATE app_room_message
+                SET search_vector = to_tsvector('simple'::regconfig, coalesce(content, ''))
+                WHERE id > %s AND id <= %s AND search_vector IS NULL
+                """,
+                [last_id, upper_id]
+            )
+            last_id = upper_id
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in SETUP_SQL:
+        schema_editor.execute(statement)
+    backfill(schema_editor)
+    for statement in INDEX_SQL:
+        schema_editor.execute(statement)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app_room', '0012_message_image_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
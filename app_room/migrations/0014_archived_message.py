@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_room', '0013_message_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField(blank=True, null=True, verbose_name='content')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='', verbose_name='image')),
+                ('image_thumb', models.ImageField(blank=True, null=True, upload_to='', verbose_name='thumbnail')),
+                ('image_medium', models.ImageField(blank=True, null=True, upload_to='', verbose_name='medium image')),
+                ('image_width', models.PositiveIntegerField(blank=True, null=True, verbose_name='image width')),
+                ('image_height', models.PositiveIntegerField(blank=True, null=True, verbose_name='image height')),
+                ('image_digest', models.CharField(blank=True, default='', max_length=64, verbose_name='image digest')),
+                ('message_type', models.CharField(choices=[('text', 'Text'), ('image', 'Image')], default='text', max_length=10, verbose_name='message type')),
+                ('timestamp', models.DateTimeField(verbose_name='timestamp')),
+                ('provisional_id', models.UUIDField(blank=True, null=True, verbose_name='provisional id')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived at')),
+                ('room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='app_room.room', verbose_name='room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'Archived message',
+                'verbose_name_plural': 'Archived messages',
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['room', 'timestamp', 'id'], name='archived_room_ts_idx'), models.Index(condition=models.Q(('room__isnull', True)), fields=['timestamp', 'id'], name='archived_public_ts_idx')],
+            },
+        ),
+    ]
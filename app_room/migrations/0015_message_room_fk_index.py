@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_room', '0014_archived_message'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='room',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='app_room.room', verbose_name='room'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+from django.db import migrations
+
+# PostgreSQL only (services.search): the search column, trigger and GIN
+# indexes of 0013 on the archive table, so search continues past the hot
+# window. The trigger function is the one 0013 created; rows moved by
+# archive_messages get their tsvector on insert.
+#
+# Like 0013 this runs on a live database (atomic = False): the column is
+# added without a default, existing rows are filled in batches and the
+# indexes are built CONCURRENTLY.
+BACKFILL_BATCH_SIZE = 5000
+
+SETUP_SQL = [
+    "SET lock_timeout = '5s'",
+    'ALTER TABLE app_room_archivedmessage ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'RESET lock_timeout',
+    """
+    CREATE OR REPLACE TRIGGER archived_search_vector_trg
+    BEFORE INSERT OR UPDATE OF content ON app_room_archivedmessage
+    FOR EACH ROW EXECUTE FUNCTION app_room_message_search_vector()
+    """,
+]
+
+INDEX_SQL = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS archived_search_vector_idx ON app_room_archivedmessage USING gin (search_vector)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS archived_content_trgm_idx ON app_room_archivedmessage USING gin (content gin_trgm_ops)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS archived_content_trgm_idx',
+    'DROP INDEX CONCURRENTLY IF EXISTS archived_search_vector_idx',
+    'DROP TRIGGER IF EXISTS archived_search_vector_trg ON app_room_archivedmessage',
+    'ALTER TABLE app_room_archivedmessage DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def backfill(schema_editor):
+    """search_vector of the rows archived before the trigger, in id ranges"""
+    last_id = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                'SELECT max(id) FROM (SELECT id FROM app_room_archivedmessage WHERE id > %s ORDER BY id LIMIT %s) batch',
+                [last_id, BACKFILL_BATCH_SIZE]
+            )
+            upper_id = cursor.fetchone()[0]
+            if upper_id is None:
+                return
+            cursor.execute(
+                """
+                UPDATE app_room_archivedmessage
+                SET search_vector = to_tsvector('simple'::regconfig, coalesce(content, ''))
+                WHERE id > %s AND id <= %s AND search_vector IS NULL
+                """,
+                [last_id, upper_id]
+            )
+            last_id = upper_id
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in SETUP_SQL:
+        schema_editor.execute(statement)
+    backfill(schema_editor)
+    for statement in INDEX_SQL:
+        schema_editor.execute(statement)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app_room', '0017_archived_message_room_fk_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -1,8 +1,18 @@
+from django.core.validators import MaxValueValidator
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 
 
+class RoomQuerySet(models.QuerySet):
+    """Room queryset"""
+
+    def with_member_count(self):
+        """Count members in the same query (read by Room.member_count)"""
+        return self.annotate(annotated_member_count=models.Count('members', distinct=True))
+
+
 class Room(models.Model):
     """Room model"""
     name = models.CharField(max_length=100, unique=True, verbose_name='name')
@@ -17,13 +27,24 @@ class Room(models.Model):
         blank=True, verbose_name='members'
     )
     is_public = models.BooleanField(default=True, verbose_name='public')
+    # WebSocket batching window for busy rooms (0 = send every message at once)
+    coalesce_window_ms = models.PositiveSmallIntegerField(
+        default=0, validators=[MaxValueValidator(1000)],
+        verbose_name='coalesce window (ms)'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='created at')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='updated at')
 
+    objects = RoomQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Room'
         verbose_name_plural = 'Rooms'
+        indexes = [
+            # room list: is_public=True ordered by -created_at (also admin filters)
+            models.Index(fields=['is_public', '-created_at'], name='room_public_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -35,6 +56,9 @@ class Room(models.Model):
 
     @property
     def member_count(self):
+        # annotated by Room.objects.with_member_count() - no extra query
+        if hasattr(self, 'annotated_member_count'):
+            return self.annotated_member_count
         return self.members.count()
 
 
@@ -45,9 +69,10 @@ class Message(models.Model):
         ('image', 'Image'),
     ]
     
+    # no single-column index: message_room_ts_idx starts with room
     room = models.ForeignKey(
         Room, on_delete=models.CASCADE, related_name='messages', 
-        null=True, blank=True, verbose_name='room'
+        null=True, blank=True, db_index=False, verbose_name='room'
     )
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='user'
@@ -59,21 +84,113 @@ class Message(models.Model):
         upload_to='chat_images/', blank=True, null=True, 
         verbose_name='image'
     )
+    # WebP variants and oriented size, set by services.images after upload
+    image_thumb = models.ImageField(
+        upload_to='chat_images/thumbs/', blank=True, null=True,
+        editable=False, verbose_name='thumbnail'
+    )
+    image_medium = models.ImageField(
+        upload_to='chat_images/medium/', blank=True, null=True,
+        editable=False, verbose_name='medium image'
+    )
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name='image width'
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name='image height'
+    )
+    # SHA-256 of the upload, set with CHAT_IMAGE_DEDUPE (services.blobs)
+    image_digest = models.CharField(
+        max_length=64, blank=True, default='', editable=False,
+        verbose_name='image digest'
+    )
     message_type = models.CharField(
         max_length=10, choices=MESSAGE_TYPE_CHOICES, 
         default='text', verbose_name='message type'
     )
+    # not auto_now_add: write-behind saves the time that was broadcast
     timestamp = models.DateTimeField(
-        auto_now_add=True, verbose_name='timestamp'
+        default=timezone.now, editable=False, verbose_name='timestamp'
+    )
+    provisional_id = models.UUIDField(
+        unique=True, null=True, blank=True, editable=False,
+        verbose_name='provisional id'
     )
 
     class Meta:
         ordering = ['timestamp']
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
+        indexes = [
+            # room history: keyset on (timestamp, id) inside one room
+            models.Index(fields=['room', 'timestamp', 'id'], name='message_room_ts_idx'),
+            # public chat history: room IS NULL only
+            models.Index(
+                fields=['timestamp', 'id'], name='message_public_ts_idx',
+                condition=models.Q(room__isnull=True)
+            ),
+            # admin list filter by type and date
+            models.Index(fields=['message_type', 'timestamp'], name='message_type_ts_idx'),
+            # deduplicated uploads: other messages with the same image
+            models.Index(
+                fields=['image_digest'], name='message_image_digest_idx',
+                condition=~models.Q(image_digest='')
+            ),
+        ]
 
     def __str__(self):
         room_name = self.room.name if self.room else 'Public'
         if self.message_type == 'image':
             return f'{self.user.username} in {room_name}: [image]'
         return f'{self.user.username} in {room_name}: {self.content[:50]}'
+
+
+class ArchivedMessage(models.Model):
+    """
+    Message moved out of the hot table (manage.py archive_messages)
+    
+    Same columns and ids as Message; history pages continue here when a
+    user scrolls back past the oldest hot message.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    room = models.ForeignKey(
+        Room, on_delete=models.CASCADE, related_name='archived_messages',
+        null=True, blank=True, db_index=False, verbose_name='room'
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='archived_messages',
+        verbose_name='user'
+    )
+    content = models.TextField(blank=True, null=True, verbose_name='content')
+    image = models.ImageField(blank=True, null=True, verbose_name='image')
+    image_thumb = models.ImageField(blank=True, null=True, verbose_name='thumbnail')
+    image_medium = models.ImageField(blank=True, null=True, verbose_name='medium image')
+    image_width = models.PositiveIntegerField(null=True, blank=True, verbose_name='image width')
+    image_height = models.PositiveIntegerField(null=True, blank=True, verbose_name='image height')
+    image_digest = models.CharField(max_length=64, blank=True, default='', verbose_name='image digest')
+    message_type = models.CharField(
+        max_length=10, choices=Message.MESSAGE_TYPE_CHOICES,
+        default='text', verbose_name='message type'
+    )
+    timestamp = models.DateTimeField(verbose_name='timestamp')
+    provisional_id = models.UUIDField(null=True, blank=True, verbose_name='provisional id')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='archived at')
+
+    class Meta:
+        ordering = ['timestamp']
+        verbose_name = 'Archived message'
+        verbose_name_plural = 'Archived messages'
+        indexes = [
+            # same keyset indexes as Message (history past the hot window)
+            models.Index(fields=['room', 'timestamp', 'id'], name='archived_room_ts_idx'),
+            models.Index(
+                fields=['timestamp', 'id'], name='archived_public_ts_idx',
+                condition=models.Q(room__isnull=True)
+            ),
+        ]
+
+    def __str__(self):
+        room_name = self.room.name if self.room else 'Public'
+        if self.message_type == 'image':
+            return f'{self.user.username} in {room_name}: [image]'
+        return f'{self.user.username} in {room_name}: {(self.content or "")[:50]}'
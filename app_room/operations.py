@@ -0,0 +1,44 @@
+"""
+Migration operations for indexes on large tables
+
+AddIndexConcurrently from django.contrib.postgres only runs on PostgreSQL
+(and importing it needs psycopg); these build the index with
+CREATE INDEX CONCURRENTLY there, so writes to the table go on during the
+build, and fall back to a plain AddIndex / RemoveIndex on other databases.
+Migrations using them must set atomic = False.
+"""
+from django.db import NotSupportedError, migrations
+
+
+def _concurrently(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return False
+    if schema_editor.connection.in_atomic_block:
+        raise NotSupportedError(
+            'Concurrent index operations can not run in a transaction, set atomic = False on the migration'
+        )
+    return True
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex that does not lock writes on PostgreSQL"""
+    atomic = False
+
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on model {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _concurrently(schema_editor):
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _concurrently(schema_editor):
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
@@ -1,5 +1,10 @@
 from app_room.api.v1.routing import websocket_urlpatterns as v1_websockets
+from app_room.api.v1.routing import http_urlpatterns as v1_http
 
 websocket_urlpatterns = [
     *v1_websockets,
 ]
+
+http_urlpatterns = [
+    *v1_http,
+]
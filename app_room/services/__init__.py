@@ -0,0 +1,116 @@
+"""
+Services package
+
+Structure:
+- write_behind: batched write-behind persistence for text messages
+- identity_cache: cached room slug / username lookups
+- metrics: in-process counters and gauges
+- codec: JSON codec for WebSocket frames (json / orjson / msgspec)
+- frames: chat message frames encoded once per broadcast
+- coalescing: per-room batching window for busy rooms
+- send_queue: bounded per-connection send queues (slow clients)
+- recent_messages: newest messages per room for the first history page
+- versions: version counters behind the API ETags
+- presence: connected users per room, debounced join/leave deltas
+- ephemeral: typing / read cursor events, never persisted
+- rate_limit: token buckets per user, IP and room
+- images: background thumbnails / WebP variants of uploaded images
+- blobs: content-addressed (deduplicated) image storage
+- search: full-text message search (PostgreSQL tsvector / trigram, basic fallback)
+"""
+from .metrics import metrics
+from .codec import (
+    build_codec,
+    get_codec
+)
+from .frames import (
+    chat_message_event,
+    chat_message_frame,
+    media_url,
+    message_row_frame
+)
+from .coalescing import (
+    RoomCoalescer,
+    batch_frame,
+    coalescer
+)
+from .send_queue import SendQueue
+from .recent_messages import (
+    MESSAGE_ROW_FIELDS,
+    get_recent_messages,
+    message_row
+)
+from .versions import versions
+from .presence import (
+    get_presence,
+    presence_frame
+)
+from .ephemeral import (
+    EphemeralGate,
+    ephemeral_gate,
+    ephemeral_relay
+)
+from .rate_limit import (
+    get_rate_limiter,
+    rate_limited_frame
+)
+from .blobs import (
+    content_digest,
+    store_image
+)
+from .images import (
+    get_image_processor,
+    image_message_event,
+    notify_image_message
+)
+from .search import (
+    get_search,
+    highlight,
+    search_messages
+)
+from .identity_cache import (
+    IdentityCache,
+    identity_cache
+)
+from .write_behind import (
+    WriteBehindWriter,
+    get_message_writer
+)
+
+
+__all__ = [
+    'metrics',
+    'build_codec',
+    'get_codec',
+    'chat_message_event',
+    'chat_message_frame',
+    'media_url',
+    'message_row_frame',
+    'RoomCoalescer',
+    'batch_frame',
+    'coalescer',
+    'SendQueue',
+    'MESSAGE_ROW_FIELDS',
+    'get_recent_messages',
+    'message_row',
+    'versions',
+    'get_presence',
+    'presence_frame',
+    'EphemeralGate',
+    'ephemeral_gate',
+    'ephemeral_relay',
+    'get_rate_limiter',
+    'rate_limited_frame',
+    'content_digest',
+    'store_image',
+    'get_image_processor',
+    'image_message_event',
+    'notify_image_message',
+    'get_search',
+    'highlight',
+    'search_messages',
+    'IdentityCache',
+    'identity_cache',
+    'WriteBehindWriter',
+    'get_message_writer',
+]
@@ -0,0 +1,131 @@
+"""
+Content-addressed image storage (CHAT_IMAGE_DEDUPE)
+
+Uploads are hashed (SHA-256) while the request body is parsed, by the
+upload handlers in FILE_UPLOAD_HANDLERS, so no second pass over the file is
+needed. Each distinct upload is stored once, at
+chat_images/<first 2 hex digits>/<digest>.<ext>, and Message.image_digest
+records which upload a message carries:
+- an upload whose digest is already stored is not written again, the new
+  Message points at the stored file
+- if that file was processed, its variants and size are copied too and
+  the image is not processed again (services.images also looks for a
+  processed copy before rendering)
+- processing never rewrites a stored file: the original without metadata
+  is a new file (stripped_name) and every message of the old one is moved
+  to it; the old file stays until cleanup_images
+
+A file may be shared by many messages, so deleting a message (or a room,
+cascading) can't delete its files; `manage.py cleanup_images` deletes the
+files no Message references.
+
+Counters: images.deduplicated.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db.models import F, Q
+
+from app_room.models.room import Message
+
+from .metrics import metrics
+
+# Message fields set by image processing, shared by messages of one digest
+VARIANT_FIELDS = ('image_thumb', 'image_medium', 'image_width', 'image_height')
+
+
+class ContentHashMixin:
+    """Hashes the chunks the handler keeps, sets file.content_digest"""
+
+    def new_file(self, *args, **kwargs):
+        # before super(): the memory handler raises StopFutureHandlers
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            self.hasher.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_digest = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_digest(file):
+    """SHA-256 of an uploaded file (from the upload handler if it hashed it)"""
+    digest = getattr(file, 'content_digest', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        file.seek(0)
+        digest = hasher.hexdigest()
+    return digest
+
+
+def blob_name(digest, filename):
+    """Storage name of an upload: chat_images/ab/abcd....jpg"""
+    extension = os.path.splitext(filename)[1].lower()
+    return f'chat_images/{digest[:2]}/{digest}{extension}'
+
+
+def stripped_name(name):
+    """Storage name for the metadata-free copy of an original: ....clean.jpg"""
+    root, extension = os.path.splitext(name)
+    return f'{root}.clean{extension}'
+
+
+def processed_copy(digest, exclude_id=None):
+    """Image (stripped) and variant fields of a processed message with this digest, or None"""
+    messages = Message.objects.filter(image_digest=digest, image_width__isnull=False).exclude(
+        Q(image_thumb='') | Q(image_thumb__isnull=True)
+    )
+    if exclude_id is not None:
+        messages = messages.exclude(pk=exclude_id)
+    return messages.values('image', *VARIANT_FIELDS).first()
+
+
+def store_image(file):
+    """
+    Store an upload once per digest, return the Message fields for it
+
+    {'image': name, 'image_digest': digest} plus the variant fields when a
+    processed message with the same digest exists.
+    """
+    digest = content_digest(file)
+    existing = (
+        Message.objects.filter(image_digest=digest)
+        .exclude(image='')
+        .order_by(F('image_width').desc(nulls_last=True))
+        .values('image', *VARIANT_FIELDS)
+        .first()
+    )
+    if existing is not None:
+        metrics.incr('images.deduplicated')
+        fields = {'image': existing['image'], 'image_digest': digest}
+        if existing['image_thumb']:
+            fields.update({field: existing[field] for field in VARIANT_FIELDS})
+        return fields
+
+    name = blob_name(digest, file.name)
+    # left by deleted messages (until cleanup_images) or a concurrent upload
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, file)
+        if saved != name:
+            # lost a race with the same content
+            default_storage.delete(saved)
+    return {'image': name, 'image_digest': digest}
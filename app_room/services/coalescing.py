@@ -0,0 +1,91 @@
+"""
+Per-room message coalescing
+
+With a window (Room.coalesce_window_ms, CHAT_PUBLIC_COALESCE_WINDOW_MS for
+public chat) a busy room costs one group_send per window instead of one
+per message:
+- the first message after a quiet period is sent at once and opens the window
+- messages that arrive while the window is open are buffered
+- when the window closes the buffer goes out as one chat_batch event and
+  the window stays open while messages keep coming
+
+Quiet rooms therefore keep their latency; a window of 0 disables it.
+Buffers are per process (messages received by other workers are batched
+there), frames are the pre-encoded texts from services.frames.
+"""
+import asyncio
+import logging
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    __slots__ = ('loop', 'frames')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.frames = []
+
+
+class RoomCoalescer:
+    """Buffers frames per group while its window is open"""
+
+    def __init__(self):
+        self._windows = {}
+        # flush tasks in flight (the loop only keeps a weak reference)
+        self._tasks = set()
+
+    async def send(self, channel_layer, group, frame, window_ms):
+        """group_send frame now, or buffer it if the group's window is open"""
+        if window_ms <= 0:
+            await channel_layer.group_send(group, {'type': 'chat_message', 'frame': frame})
+            return
+
+        loop = asyncio.get_running_loop()
+        window = self._windows.get(group)
+        if window is not None and window.loop is loop:
+            window.frames.append(frame)
+            metrics.incr('coalescing.buffered')
+            return
+
+        self._windows[group] = _Window(loop)
+        await channel_layer.group_send(group, {'type': 'chat_message', 'frame': frame})
+        self._schedule(loop, channel_layer, group, window_ms)
+
+    def _schedule(self, loop, channel_layer, group, window_ms):
+        loop.call_later(window_ms / 1000, self._start_flush, loop, channel_layer, group, window_ms)
+
+    def _start_flush(self, loop, channel_layer, group, window_ms):
+        task = loop.create_task(self._flush(channel_layer, group, window_ms))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, channel_layer, group, window_ms):
+        window = self._windows.get(group)
+        if window is None:
+            return
+        if not window.frames:
+            # quiet for a whole window - next message goes out at once
+            del self._windows[group]
+            return
+
+        frames, window.frames = window.frames, []
+        try:
+            if len(frames) == 1:
+                await channel_layer.group_send(group, {'type': 'chat_message', 'frame': frames[0]})
+            else:
+                await channel_layer.group_send(group, {'type': 'chat_batch', 'frames': frames})
+                metrics.incr('coalescing.batches')
+        except Exception:
+            logger.exception('Coalesced send to %s failed (%d frames dropped)', group, len(frames))
+        self._schedule(window.loop, channel_layer, group, window_ms)
+
+
+def batch_frame(frames):
+    """Join encoded message frames into one batch frame (no re-encoding)"""
+    return '{"type":"batch","messages":[' + ','.join(frames) + ']}'
+
+
+coalescer = RoomCoalescer()
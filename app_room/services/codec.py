@@ -0,0 +1,91 @@
+"""
+JSON codec for WebSocket frames
+
+CHAT_JSON_CODEC picks the implementation used to parse incoming frames
+and encode outgoing ones:
+- json: standard library
+- orjson / msgspec: optional C codecs (ImproperlyConfigured if missing)
+- auto: orjson, then msgspec, then json - whichever is installed
+
+All codecs produce the same compact UTF-8 JSON text, so clients can't
+tell them apart.
+"""
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class JSONCodec:
+    """dumps(obj) -> str and loads(str | bytes) -> obj"""
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return f'<JSONCodec {self.name}>'
+
+
+def _stdlib_codec():
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return JSONCodec('json', encoder.encode, json.loads)
+
+
+def _orjson_codec():
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+    return JSONCodec('orjson', dumps, orjson.loads)
+
+
+def _msgspec_codec():
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def dumps(obj):
+        return encoder.encode(obj).decode()
+    return JSONCodec('msgspec', dumps, decoder.decode)
+
+
+def build_codec(name='auto'):
+    """Build the codec called name (see module docstring)"""
+    name = (name or 'auto').lower()
+    if name == 'auto':
+        if orjson is not None:
+            return _orjson_codec()
+        if msgspec is not None:
+            return _msgspec_codec()
+        return _stdlib_codec()
+    if name == 'json':
+        return _stdlib_codec()
+    if name == 'orjson':
+        if orjson is None:
+            raise ImproperlyConfigured('CHAT_JSON_CODEC=orjson but orjson is not installed')
+        return _orjson_codec()
+    if name == 'msgspec':
+        if msgspec is None:
+            raise ImproperlyConfigured('CHAT_JSON_CODEC=msgspec but msgspec is not installed')
+        return _msgspec_codec()
+    raise ImproperlyConfigured(f'Unknown CHAT_JSON_CODEC: {name!r}')
+
+
+_codec = None
+
+
+def get_codec():
+    """Process-wide codec built from settings.CHAT_JSON_CODEC"""
+    global _codec
+    if _codec is None:
+        from django.conf import settings
+        _codec = build_codec(getattr(settings, 'CHAT_JSON_CODEC', 'auto'))
+    return _codec
@@ -0,0 +1,141 @@
+"""
+Ephemeral events: typing indicators and read cursors
+
+These are never saved and never reach the ORM. Per user they only matter
+as "the latest state", so they are cut down before they are sent:
+- EphemeralGate (per process, keyed by room and username, so a user's
+  tabs share it) drops repeats of the current state and limits each kind
+  to one change per CHAT_EPHEMERAL_MIN_INTERVAL_MS; "stopped typing"
+  always passes so indicators don't stick. Like the relay it is per
+  process: a user with sockets on two workers gets a budget on each
+- EphemeralRelay (per process) collects a room's events for
+  CHAT_EPHEMERAL_WINDOW_MS, keeping the latest state per (kind, user),
+  and sends them as one group_send:
+  {"type": "ephemeral", "events": [{"kind": "typing", "username": "ali", "typing": true}, ...]}
+- consumers queue them behind chat messages (SendQueue.put_ephemeral),
+  a backed-up socket loses ephemeral frames first
+
+Counters: ephemeral.accepted, ephemeral.deduped, ephemeral.rate_limited,
+ephemeral.flushes.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .codec import get_codec
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TYPING = 'typing'
+READ = 'read'
+KINDS = (TYPING, READ)
+
+
+def ephemeral_frame(events):
+    return get_codec().dumps({'type': 'ephemeral', 'events': events})
+
+
+def ephemeral_event(kind, username, value):
+    if kind == TYPING:
+        return {'kind': TYPING, 'username': username, 'typing': value}
+    return {'kind': READ, 'username': username, 'message_id': value}
+
+
+class EphemeralGate:
+    """Per-user dedupe and rate limit of ephemeral events"""
+
+    def __init__(self, min_interval_ms=None, max_size=10000):
+        # None: CHAT_EPHEMERAL_MIN_INTERVAL_MS, read on use
+        self.min_interval_ms = min_interval_ms
+        self.max_size = max_size
+        # (group, username, kind) -> (time, value), least recently used first
+        self._last = OrderedDict()
+
+    def current(self, group, username, kind):
+        last = self._last.get((group, username, kind))
+        return last[1] if last is not None else None
+
+    def allow(self, group, username, kind, value):
+        """True if the event should be relayed (and remember it)"""
+        key = (group, username, kind)
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None:
+            last_time, last_value = last
+            if value == last_value or (kind == READ and value < last_value):
+                metrics.incr('ephemeral.deduped')
+                return False
+            if now - last_time < self._min_interval() and not (kind == TYPING and value is False):
+                metrics.incr('ephemeral.rate_limited')
+                return False
+        self._last[key] = (now, value)
+        self._last.move_to_end(key)
+        # forgetting a user only lets one repeat through
+        while len(self._last) > self.max_size:
+            self._last.popitem(last=False)
+        metrics.incr('ephemeral.accepted')
+        return True
+
+    def _min_interval(self):
+        if self.min_interval_ms is None:
+            return settings.CHAT_EPHEMERAL_MIN_INTERVAL_MS / 1000
+        return self.min_interval_ms / 1000
+
+
+class _Pending:
+    __slots__ = ('loop', 'events')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.events = {}
+
+
+class EphemeralRelay:
+    """Buffers a room's ephemeral events for one window, latest state per user"""
+
+    def __init__(self):
+        self._pending = {}
+        # flush tasks in flight (the loop only keeps a weak reference)
+        self._tasks = set()
+
+    async def send(self, channel_layer, group, kind, username, value, window_ms):
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(group)
+        if pending is None or pending.loop is not loop:
+            pending = self._pending[group] = _Pending(loop)
+            loop.call_later(window_ms / 1000, self._start_flush, loop, channel_layer, group)
+
+        key = (kind, username)
+        if key in pending.events:
+            metrics.incr('ephemeral.deduped')
+        pending.events[key] = value
+
+    def _start_flush(self, loop, channel_layer, group):
+        task = loop.create_task(self._flush(channel_layer, group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, channel_layer, group):
+        pending = self._pending.pop(group, None)
+        if pending is None or not pending.events:
+            return
+        events = [
+            ephemeral_event(kind, username, value)
+            for (kind, username), value in pending.events.items()
+        ]
+        try:
+            await channel_layer.group_send(group, {
+                'type': 'ephemeral_events',
+                'frame': ephemeral_frame(events),
+            })
+            metrics.incr('ephemeral.flushes')
+        except Exception:
+            logger.exception('Ephemeral events for %s dropped', group)
+
+
+ephemeral_gate = EphemeralGate()
+ephemeral_relay = EphemeralRelay()
@@ -0,0 +1,71 @@
+"""
+Pre-serialized broadcast frames
+
+The sender encodes the client frame once and group_sends it as
+event['frame']; every consumer in the group forwards the text as is
+instead of rebuilding and re-encoding the same payload.
+"""
+import uuid
+
+from django.core.files.storage import default_storage
+
+from .codec import get_codec
+
+
+def chat_message_frame(username, message_type='text', message='', message_id=None,
+                       provisional_id=None, image_url=None, timestamp='', thumbnail_url=None,
+                       medium_url=None, image_width=None, image_height=None):
+    """Encode a chat message as the JSON text sent to clients"""
+    data = {
+        'message_id': message_id,
+        'provisional_id': provisional_id,
+        'username': username,
+        'message_type': message_type,
+        'timestamp': timestamp or '',
+    }
+    if message_type == 'image':
+        data['image_url'] = image_url
+        data['thumbnail_url'] = thumbnail_url
+        data['medium_url'] = medium_url
+        data['image_width'] = image_width
+        data['image_height'] = image_height
+        data['message'] = ''
+    else:
+        data['message'] = message
+    return get_codec().dumps(data)
+
+
+def chat_message_event(**fields):
+    """group_send event carrying an encoded chat message frame"""
+    return {'type': 'chat_message', 'frame': chat_message_frame(**fields)}
+
+
+def media_url(name, origin=''):
+    """Storage URL of a file name, absolute (origin) for local media"""
+    if not name:
+        return None
+    url = default_storage.url(name)
+    if url.startswith('/'):
+        url = origin + url
+    return url
+
+
+def message_row_frame(row, origin=''):
+    """Frame for a stored message (recent messages / Message.values() row)"""
+    provisional_id = row.get('provisional_id')
+    if isinstance(provisional_id, uuid.UUID):
+        provisional_id = provisional_id.hex
+    
+    return chat_message_frame(
+        username=row['user__username'],
+        message_type=row['message_type'],
+        message=row['content'] or '',
+        message_id=row['id'],
+        provisional_id=provisional_id,
+        image_url=media_url(row['image'], origin),
+        timestamp=row['timestamp'].isoformat(),
+        thumbnail_url=media_url(row.get('image_thumb'), origin),
+        medium_url=media_url(row.get('image_medium'), origin),
+        image_width=row.get('image_width'),
+        image_height=row.get('image_height')
+    )
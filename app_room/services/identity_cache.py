@@ -0,0 +1,175 @@
+"""
+Identity-resolution cache for the hot path
+
+Caches room slug -> Room and username -> User so a chat message does not
+pay two extra queries.
+
+- L1: bounded LRU + TTL dict in this process
+- L2 (optional): the shared CACHES['default'] backend (Redis)
+- model signals invalidate both levels on save/delete (see app_room.signals)
+
+Cross-process invalidation: every key has a generation token in
+CACHES['default'] (identity:<kind>:<key>:gen), replaced on invalidation.
+Entries remember the token they were loaded under, and a hit counts only
+if it is still current, so a room renamed or deleted in one worker is
+reloaded by every worker on its next lookup. A hit costs one cache GET
+(with L2, one GET for token and entry); if the cache can't be reached the
+lookup goes to the database.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache as shared_cache
+
+from app_room.models.room import Room
+from app_room.services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# the token could not be read: load from the database, cache nothing
+UNKNOWN = object()
+
+class LRUTTLCache:
+    """Bounded LRU dict whose entries expire after ttl seconds"""
+
+    def __init__(self, max_size=1024, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class IdentityCache:
+    """Resolve rooms and users with an L1 (process) and optional L2 (shared) cache"""
+
+    def __init__(self, max_size=1024, ttl=30, use_shared=False):
+        self.ttl = ttl
+        self.use_shared = use_shared
+        self._local = LRUTTLCache(max_size=max_size, ttl=ttl)
+
+    def get_room(self, slug):
+        """Return the Room for a slug, or None if it does not exist"""
+        return self._resolve('room', slug, lambda: Room.objects.filter(slug=slug).first())
+
+    def get_user(self, username, create=True):
+        """Return the User for a username (created on first use unless create=False)"""
+        if create:
+            loader = lambda: User.objects.get_or_create(username=username)[0]
+        else:
+            loader = lambda: User.objects.filter(username=username).first()
+        return self._resolve('user', username, loader)
+
+    def invalidate_room(self, slug):
+        self._invalidate('room', slug)
+
+    def invalidate_user(self, username):
+        self._invalidate('user', username)
+
+    def clear(self):
+        self._local.clear()
+
+    def stats(self):
+        counters = metrics.snapshot()['counters']
+        return {
+            kind: {
+                'hits': counters.get(f'identity_cache.{kind}.hits', 0),
+                'misses': counters.get(f'identity_cache.{kind}.misses', 0),
+            }
+            for kind in ('room', 'user')
+        }
+
+    def _resolve(self, kind, key, loader):
+        cache_key = self._key(kind, key)
+        generation, shared = self._shared_state(cache_key)
+        
+        if generation is not UNKNOWN:
+            item = self._local.get(cache_key)
+            if item is None or item[1] != generation:
+                item = shared
+                if item is not None and item[1] == generation:
+                    self._local.set(cache_key, item)
+            if item is not None and item[1] == generation:
+                metrics.incr(f'identity_cache.{kind}.hits')
+                return item[0]
+        
+        metrics.incr(f'identity_cache.{kind}.misses')
+        value = loader()
+        if value is not None and generation is not UNKNOWN:
+            # the token read before loading: an invalidation since then wins
+            item = (value, generation)
+            self._local.set(cache_key, item)
+            if self.use_shared:
+                shared_cache.set(cache_key, item, self.ttl)
+        return value
+
+    def _shared_state(self, cache_key):
+        """(current generation token, L2 entry or None)"""
+        generation_key = f'{cache_key}:gen'
+        try:
+            if self.use_shared:
+                found = shared_cache.get_many([generation_key, cache_key])
+                return found.get(generation_key), found.get(cache_key)
+            return shared_cache.get(generation_key), None
+        except Exception:
+            logger.exception('identity cache generation lookup failed')
+            metrics.incr('identity_cache.errors')
+            return UNKNOWN, None
+
+    def _invalidate(self, kind, key):
+        cache_key = self._key(kind, key)
+        self._local.delete(cache_key)
+        try:
+            # outlives every entry loaded under the old token
+            shared_cache.set(f'{cache_key}:gen', uuid.uuid4().hex, self.ttl + 60)
+            if self.use_shared:
+                shared_cache.delete(cache_key)
+        except Exception:
+            logger.exception('identity cache invalidation failed for %s', cache_key)
+            metrics.incr('identity_cache.errors')
+
+    @staticmethod
+    def _key(kind, key):
+        return f'identity:{kind}:{key}'
+
+
+identity_cache = IdentityCache(
+    max_size=settings.CHAT_IDENTITY_CACHE_SIZE,
+    ttl=settings.CHAT_IDENTITY_CACHE_TTL,
+    use_shared=settings.CHAT_IDENTITY_CACHE_SHARED,
+)
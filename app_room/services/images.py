@@ -0,0 +1,254 @@
+"""
+Background processing of uploaded chat images
+
+ImageUploadView saves the original and returns at once; the image is then
+processed off the request path:
+- the Pillow work (decode, orient, resize, encode) runs in a process pool
+  of CHAT_IMAGE_WORKERS processes (0: in the background thread itself)
+- metadata (EXIF with GPS, XMP, comments) is stripped from the original:
+  the copy without it is stored under a new name (the original file may
+  be shared and already linked, it is left to cleanup_images)
+- WebP variants are stored: a thumbnail (CHAT_IMAGE_THUMBNAIL_SIZE px on
+  the long side) and a medium image (CHAT_IMAGE_MEDIUM_SIZE px)
+- width / height of the oriented original are recorded on the Message
+- then the room is notified, with the variant URLs and the size, so
+  clients download the thumbnail and reserve its box before it loads
+
+If processing fails the room is notified with the original only. With
+CHAT_IMAGE_DEDUPE an upload that was already processed (same digest) copies
+the stored variants instead of rendering them again.
+`manage.py process_images` processes images that were never processed.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from app_room.models.room import ArchivedMessage, Message
+
+from .blobs import VARIANT_FIELDS, processed_copy, stripped_name
+from .frames import chat_message_event, media_url
+from .metrics import metrics
+from .recent_messages import get_recent_messages
+from .versions import room_scope, versions
+
+logger = logging.getLogger(__name__)
+
+# info keys that carry metadata (not needed to show the image)
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+def _flatten(image):
+    """Mode WebP can encode (RGB, or RGBA when there is transparency)"""
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode in ('LA', 'PA') or 'transparency' in image.info:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def _webp(image, size, quality):
+    variant = image.copy()
+    variant.thumbnail((size, size), resample=Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def render_variants(data, thumbnail_size=320, medium_size=1280, quality=80):
+    """
+    Encoded variants of one image (runs in a pool process, Pillow only)
+
+    Returns {'original': bytes or None (unchanged), 'thumbnail': bytes,
+    'medium': bytes or None (small image), 'width': int, 'height': int}.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = image.format
+        animated = getattr(image, 'is_animated', False)
+        has_metadata = any(key in image.info for key in METADATA_KEYS) or bool(getattr(image, 'text', None))
+        orientation = image.getexif().get(0x0112, 1)
+
+        original = None
+        if has_metadata and not animated and image_format in ('JPEG', 'PNG', 'WEBP'):
+            oriented = ImageOps.exif_transpose(image)
+            buffer = io.BytesIO()
+            options = {'icc_profile': image.info.get('icc_profile')}
+            if image_format == 'JPEG':
+                # same quantization tables when the pixels didn't move
+                options['quality'] = 'keep' if orientation == 1 else 90
+                source = image if orientation == 1 else oriented
+            else:
+                options['quality'] = 90
+                source = oriented
+            source.save(buffer, image_format, **options)
+            original = buffer.getvalue()
+
+        # first frame of an animation
+        image.seek(0)
+        base = _flatten(ImageOps.exif_transpose(image))
+        width, height = base.size
+
+        return {
+            'original': original,
+            'thumbnail': _webp(base, thumbnail_size, quality),
+            'medium': _webp(base, medium_size, quality) if max(width, height) > thumbnail_size else None,
+            'width': width,
+            'height': height,
+        }
+
+
+class ImageProcessor:
+    """Processes image messages in the background, then notifies the room"""
+
+    def __init__(self, workers=2, thumbnail_size=320, medium_size=1280, quality=80):
+        self.workers = workers
+        self.options = (thumbnail_size, medium_size, quality)
+        self._threads = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='images')
+        self._processes = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._processes is None:
+                # spawned, not forked from the server; django.setup() runs
+                # before this module is imported there
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup
+                )
+            return self._processes
+
+    def submit(self, message_id, origin='', notify=True):
+        """Process in the background (origin: http(s)://host for absolute URLs)"""
+        metrics.incr('images.queued')
+        return self._threads.submit(self._run, message_id, origin, notify)
+
+    def _run(self, message_id, origin, notify):
+        try:
+            return self.process(message_id, origin, notify)
+        except Exception:
+            logger.exception('Image processing failed for message %s', message_id)
+        finally:
+            close_old_connections()
+
+    def render(self, data):
+        pool = self._pool()
+        if pool is None:
+            return render_variants(data, *self.options)
+        return pool.submit(render_variants, data, *self.options).result()
+
+    def process(self, message_id, origin='', notify=True, reuse=True):
+        """Store the variants of one image message, then notify its room"""
+        message = Message.objects.select_related('user', 'room').get(pk=message_id)
+        done = processed_copy(message.image_digest, message.pk) if reuse and message.image_digest else None
+        if done is not None:
+            # same upload already processed (services.blobs)
+            for field, value in done.items():
+                setattr(message, field, value)
+            message.save(update_fields=['image', *VARIANT_FIELDS])
+            metrics.incr('images.deduplicated')
+            if notify:
+                notify_image_message(message, origin)
+            return message
+
+        try:
+            with message.image.open('rb') as f:
+                variants = self.render(f.read())
+        except Exception:
+            metrics.incr('images.failed')
+            logger.exception('Image variants failed for message %s', message_id)
+            if notify:
+                notify_image_message(message, origin)
+            return message
+
+        stem = os.path.splitext(os.path.basename(message.image.name))[0]
+        if variants['original'] is not None:
+            # a new file: other messages (CHAT_IMAGE_DEDUPE) and clients may use
+            # the old one, which keeps working until cleanup_images
+            original = message.image.name
+            name = default_storage.save(stripped_name(original), ContentFile(variants['original']))
+            move_image(original, name)
+            message.image.name = name
+
+        message.image_thumb.save(f'{stem}.webp', ContentFile(variants['thumbnail']), save=False)
+        if variants['medium'] is not None:
+            message.image_medium.save(f'{stem}.webp', ContentFile(variants['medium']), save=False)
+        message.image_width = variants['width']
+        message.image_height = variants['height']
+        message.save(update_fields=['image', 'image_thumb', 'image_medium', 'image_width', 'image_height'])
+        metrics.incr('images.processed')
+
+        if notify:
+            notify_image_message(message, origin)
+        return message
+
+
+def move_image(original, name):
+    """Point every message carrying the file original at name"""
+    messages = Message.objects.filter(image=original)
+    room_ids = set(messages.values_list('room_id', flat=True))
+    messages.update(image=name)
+    ArchivedMessage.objects.filter(image=original).update(image=name)
+
+    # update() sends no post_save: refresh what the signals would
+    transaction.on_commit(lambda: versions.bump(*[room_scope(room_id) for room_id in room_ids]))
+    store = get_recent_messages()
+    if store is not None:
+        def invalidate():
+            for room_id in room_ids:
+                store.invalidate(room_id)
+        transaction.on_commit(invalidate)
+
+
+def image_message_event(message, origin=''):
+    """(group, group_send event) announcing an image message"""
+    room_name = message.room.slug if message.room else 'public_chat'
+    return f'chat_{room_name}', chat_message_event(
+        username=message.user.username,
+        message_type='image',
+        message_id=message.id,
+        image_url=media_url(message.image.name, origin),
+        thumbnail_url=media_url(message.image_thumb.name, origin),
+        medium_url=media_url(message.image_medium.name, origin),
+        image_width=message.image_width,
+        image_height=message.image_height,
+        timestamp=message.timestamp.isoformat()
+    )
+
+
+def notify_image_message(message, origin=''):
+    """group_send an image message to its room"""
+    async_to_sync(get_channel_layer().group_send)(*image_message_event(message, origin))
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_image_processor():
+    """Process-wide processor from settings"""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = ImageProcessor(
+                    settings.CHAT_IMAGE_WORKERS,
+                    settings.CHAT_IMAGE_THUMBNAIL_SIZE,
+                    settings.CHAT_IMAGE_MEDIUM_SIZE,
+                    settings.CHAT_IMAGE_QUALITY,
+                )
+    return _processor
@@ -0,0 +1,40 @@
+"""
+In-process metrics registry
+
+Counters and gauges are kept per process (like one Prometheus target per
+worker) and read through MetricsView or metrics.snapshot().
+"""
+import threading
+from collections import defaultdict
+
+
+class MetricsRegistry:
+    """Thread-safe named counters and gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+
+metrics = MetricsRegistry()
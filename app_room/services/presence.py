@@ -0,0 +1,384 @@
+"""
+Presence: who is connected to each room
+
+CHAT_PRESENCE_URL selects the backend:
+- '' : disabled
+- 'local://' : in-process (single-process deployments, development)
+- 'redis://...' : shared by all workers
+
+Rooms are keyed by their channel-layer group. Connections are tracked,
+counted per username, so a user with two tabs stays online until the
+last one closes:
+- connections with an expiry (Redis sorted set, score = expiry time)
+- username -> open connections (Redis hash), the online count is one HLEN
+Connects and disconnects never touch the database. Each process refreshes
+its own connections with one write per room every CHAT_PRESENCE_HEARTBEAT
+seconds; connections of a worker that died expire after
+CHAT_PRESENCE_TTL and are swept by one process per heartbeat.
+
+Joins and leaves go out as debounced deltas, at most one per room every
+CHAT_PRESENCE_DEBOUNCE_MS:
+{"type": "presence", "joined": [...], "left": [...], "online": n}
+A user who leaves and comes back inside the window (a page reload)
+sends nothing.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .codec import get_codec
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# KEYS: conns, owners, users, rooms  ARGV: expiry, group, conn, user, [conn, user...]
+JOIN_SCRIPT = """
+local joined = {}
+redis.call('SADD', KEYS[4], ARGV[2])
+for i = 3, #ARGV, 2 do
+    if redis.call('ZADD', KEYS[1], ARGV[1], ARGV[i]) == 1 then
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+        if redis.call('HINCRBY', KEYS[3], ARGV[i + 1], 1) == 1 then
+            table.insert(joined, ARGV[i + 1])
+        end
+    end
+end
+return {joined, redis.call('HLEN', KEYS[3])}
+"""
+
+# KEYS: conns, owners, users, rooms  ARGV: 'sweep', group, now | 'leave', group, conn...
+LEAVE_SCRIPT = """
+local conns
+if ARGV[1] == 'sweep' then
+    conns = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[3], 'LIMIT', 0, 1000)
+else
+    conns = {unpack(ARGV, 3)}
+end
+local left = {}
+for _, conn in ipairs(conns) do
+    if redis.call('ZREM', KEYS[1], conn) == 1 then
+        local user = redis.call('HGET', KEYS[2], conn)
+        redis.call('HDEL', KEYS[2], conn)
+        if user and redis.call('HINCRBY', KEYS[3], user, -1) <= 0 then
+            redis.call('HDEL', KEYS[3], user)
+            table.insert(left, user)
+        end
+    end
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[4], ARGV[2])
+end
+return {left, redis.call('HLEN', KEYS[3])}
+"""
+
+
+def presence_frame(joined=(), left=(), online=0, users=None):
+    data = {'type': 'presence', 'joined': list(joined), 'left': list(left), 'online': online}
+    if users is not None:
+        data['users'] = list(users)
+    return get_codec().dumps(data)
+
+
+class LocalPresence:
+    """In-process backend - only correct when one process serves the site"""
+
+    # in-process: called directly, no heartbeat
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conns = {}
+        self._users = {}
+
+    def join(self, group, conns, expiry):
+        """Add {conn: username}, return (usernames now online, online count)"""
+        joined = []
+        with self._lock:
+            room_conns = self._conns.setdefault(group, {})
+            users = self._users.setdefault(group, Counter())
+            for conn, username in conns.items():
+                if conn in room_conns:
+                    continue
+                room_conns[conn] = username
+                users[username] += 1
+                if users[username] == 1:
+                    joined.append(username)
+            return joined, len(users)
+
+    def leave(self, group, conns):
+        """Remove conns, return (usernames gone offline, online count)"""
+        left = []
+        with self._lock:
+            room_conns = self._conns.get(group, {})
+            users = self._users.get(group, Counter())
+            for conn in conns:
+                username = room_conns.pop(conn, None)
+                if username is None:
+                    continue
+                users[username] -= 1
+                if users[username] <= 0:
+                    del users[username]
+                    left.append(username)
+            if not room_conns:
+                self._conns.pop(group, None)
+                self._users.pop(group, None)
+            return left, len(users)
+
+    def count(self, group):
+        with self._lock:
+            return len(self._users.get(group, ()))
+
+    def users(self, group, limit):
+        with self._lock:
+            return list(self._users.get(group, ()))[:limit]
+
+    def sweep(self, now, lock_seconds):
+        # connections go away with their process
+        return {}
+
+
+class RedisPresence:
+    """Sorted sets and hashes in Redis, shared by all workers"""
+
+    shared = True
+
+    def __init__(self, url, prefix='chat:presence'):
+        import redis
+
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._join_script = self.client.register_script(JOIN_SCRIPT)
+        self._leave_script = self.client.register_script(LEAVE_SCRIPT)
+
+    def _keys(self, group):
+        base = f'{self.prefix}:{group}'
+        return [f'{base}:conns', f'{base}:owners', f'{base}:users', f'{self.prefix}:rooms']
+
+    def join(self, group, conns, expiry):
+        args = [expiry, group]
+        for conn, username in conns.items():
+            args += [conn, username]
+        joined, online = self._join_script(keys=self._keys(group), args=args)
+        return joined, online
+
+    def leave(self, group, conns):
+        left, online = self._leave_script(keys=self._keys(group), args=['leave', group, *conns])
+        return left, online
+
+    def count(self, group):
+        return self.client.hlen(self._keys(group)[2])
+
+    def users(self, group, limit):
+        users = []
+        for username, _ in self.client.hscan_iter(self._keys(group)[2], count=limit):
+            users.append(username)
+            if len(users) >= limit:
+                break
+        return users
+
+    def sweep(self, now, lock_seconds):
+        """Drop expired connections of every room, {group: (left, online)}"""
+        # one sweeping process per heartbeat
+        if not self.client.set(f'{self.prefix}:sweep', 1, nx=True, ex=max(1, int(lock_seconds))):
+            return {}
+        swept = {}
+        for group in self.client.sscan_iter(f'{self.prefix}:rooms', count=500):
+            left, online = self._leave_script(keys=self._keys(group), args=['sweep', group, now])
+            if left:
+                swept[group] = (left, online)
+        return swept
+
+
+class _Delta:
+    __slots__ = ('joined', 'left', 'scheduled')
+
+    def __init__(self):
+        self.joined = set()
+        self.left = set()
+        self.scheduled = False
+
+
+class Presence:
+    """
+    Tracks this process's connections and broadcasts debounced deltas
+
+    Calls to a shared backend run in a worker thread (blocking Redis
+    client), the local backend is called directly.
+    """
+
+    def __init__(self, backend, heartbeat=30, ttl=90, debounce_ms=1000):
+        self.backend = backend
+        self.heartbeat = heartbeat
+        self.ttl = ttl
+        self.debounce_ms = debounce_ms
+        self.channel_layer = None
+        self._local = {}
+        self._deltas = {}
+        # flush tasks in flight (the loop only keeps a weak reference)
+        self._tasks = set()
+        self._heartbeat_task = None
+
+    async def join(self, channel_layer, group, conn, username):
+        """Register a connection, return the online count"""
+        self.channel_layer = channel_layer
+        self._local.setdefault(group, {})[conn] = username
+        self._ensure_heartbeat()
+        try:
+            joined, online = await self._call(
+                self.backend.join, group, {conn: username}, time.time() + self.ttl
+            )
+        except Exception:
+            logger.exception('Presence join failed for %s', group)
+            return None
+        metrics.incr('presence.joins')
+        self._note(group, joined=joined)
+        return online
+
+    async def leave(self, group, conn):
+        conns = self._local.get(group)
+        if conns is None or conns.pop(conn, None) is None:
+            return
+        if not conns:
+            del self._local[group]
+        try:
+            left, online = await self._call(self.backend.leave, group, [conn])
+        except Exception:
+            logger.exception('Presence leave failed for %s', group)
+            return
+        metrics.incr('presence.leaves')
+        self._note(group, left=left)
+
+    async def _call(self, func, *args):
+        if self.backend.shared:
+            return await sync_to_async(func, thread_sensitive=False)(*args)
+        return func(*args)
+
+    def online(self, group):
+        """Users online in the room (one HLEN)"""
+        return self.backend.count(group)
+
+    def online_users(self, group, limit):
+        """Up to limit usernames online in the room"""
+        return self.backend.users(group, limit)
+
+    async def snapshot(self, group, limit):
+        """Presence frame for a new connection (users only if at most limit)"""
+        online = await self._call(self.online, group)
+        users = None
+        if online <= limit:
+            users = await self._call(self.online_users, group, limit)
+        return presence_frame(online=online, users=users)
+
+    def _note(self, group, joined=(), left=()):
+        """Add to the room's pending delta, schedule its flush"""
+        if not joined and not left:
+            return
+        delta = self._deltas.setdefault(group, _Delta())
+        for username in joined:
+            if username in delta.left:
+                # back within the window
+                delta.left.discard(username)
+            else:
+                delta.joined.add(username)
+        for username in left:
+            if username in delta.joined:
+                delta.joined.discard(username)
+            else:
+                delta.left.add(username)
+        if not delta.scheduled:
+            delta.scheduled = True
+            loop = asyncio.get_running_loop()
+            loop.call_later(self.debounce_ms / 1000, self._start_flush, loop, group)
+
+    def _start_flush(self, loop, group):
+        task = loop.create_task(self._flush(group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, group):
+        delta = self._deltas.pop(group, None)
+        if delta is None or (not delta.joined and not delta.left):
+            return
+        try:
+            online = await self._call(self.online, group)
+            await self.channel_layer.group_send(group, {
+                'type': 'presence_update',
+                'frame': presence_frame(sorted(delta.joined), sorted(delta.left), online),
+            })
+            metrics.incr('presence.deltas')
+        except Exception:
+            logger.exception('Presence delta for %s failed', group)
+
+    def _ensure_heartbeat(self):
+        if not self.backend.shared:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._heartbeat_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._heartbeat_task = loop.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self):
+        while self._local:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                changes = await sync_to_async(self._beat, thread_sensitive=False)()
+            except Exception:
+                logger.exception('Presence heartbeat failed')
+                continue
+            for group, joined, left in changes:
+                self._note(group, joined=joined, left=left)
+
+    def _beat(self):
+        """
+        Refresh this process's connections and sweep expired ones
+
+        Runs in a worker thread, returns [(group, joined, left)].
+        """
+        now = time.time()
+        changes = []
+        for group, conns in list(self._local.items()):
+            if conns:
+                # a connection swept meanwhile (long stall) joins again
+                joined, _ = self.backend.join(group, dict(conns), now + self.ttl)
+                changes.append((group, joined, ()))
+        for group, (left, _) in self.backend.sweep(now, self.heartbeat).items():
+            metrics.incr('presence.expired', len(left))
+            changes.append((group, (), left))
+        return changes
+
+
+def build_presence(url, heartbeat=30, ttl=90, debounce_ms=1000):
+    """Presence for CHAT_PRESENCE_URL, None when disabled"""
+    if not url:
+        return None
+    if url.startswith('local://'):
+        backend = LocalPresence()
+    else:
+        backend = RedisPresence(url)
+    return Presence(backend, heartbeat, ttl, debounce_ms)
+
+
+_presence = None
+_configured = False
+_lock = threading.Lock()
+
+
+def get_presence():
+    """Process-wide presence from settings (None when disabled)"""
+    global _presence, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                _presence = build_presence(
+                    settings.CHAT_PRESENCE_URL,
+                    settings.CHAT_PRESENCE_HEARTBEAT,
+                    settings.CHAT_PRESENCE_TTL,
+                    settings.CHAT_PRESENCE_DEBOUNCE_MS,
+                )
+                _configured = True
+    return _presence
@@ -0,0 +1,225 @@
+"""
+Token-bucket rate limiting
+
+CHAT_RATE_LIMIT_URL selects the backend:
+- '' : disabled
+- 'local://' : in-process buckets (limits apply per worker process)
+- 'redis://...' : buckets shared by all workers
+
+Each scope has a setting CHAT_RATE_LIMIT_<SCOPE> listing its buckets by
+key kind, e.g. 'user=10/minute,ip=20/minute,room=60/minute' (rates as in
+DRF: second, minute, hour, day). A bucket holds up to N tokens and refills
+at N per period; a request takes one token from every bucket of its scope
+or, if any of them is empty, takes none and is rejected.
+
+Scopes:
+- ws_frame: every WebSocket frame
+- message: text and image messages over WebSocket
+- upload: image uploads
+- room_create / room_join: the room endpoints
+
+Counters: rate_limit.rejected, rate_limit.rejected.<scope>. Backend
+errors let the request through (rate_limit.errors).
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .codec import get_codec
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS: buckets  ARGV: now, cost, rate, burst, [rate, burst...]
+# returns {allowed, retry_after, index of the first empty bucket}
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local levels = {}
+local wait = 0
+local empty = 0
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local burst = tonumber(ARGV[2 + i * 2])
+    local data = redis.call('HMGET', KEYS[i], 't', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        local need = (cost - tokens) / rate
+        if need > wait then
+            wait = need
+            empty = i
+        end
+    end
+end
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local burst = tonumber(ARGV[2 + i * 2])
+    local tokens = levels[i]
+    if empty == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', KEYS[i], 't', tostring(tokens), 'ts', ARGV[1])
+    redis.call('PEXPIRE', KEYS[i], math.ceil(burst / rate * 1000))
+end
+return {empty == 0 and 1 or 0, tostring(wait), empty}
+"""
+
+
+def parse_rate(rate):
+    """'30/minute' -> (tokens per second, burst)"""
+    count, period = rate.strip().split('/')
+    count = int(count)
+    return count / PERIODS[period.strip()[0]], count
+
+
+def parse_limits(value):
+    """'user=30/minute,ip=120/minute' -> {'user': (rate, burst), ...}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        kind, rate = item.split('=')
+        limits[kind.strip()] = parse_rate(rate)
+    return limits
+
+
+class LocalRateLimiter:
+    """In-process buckets - limits are per worker process"""
+
+    # in-process: called directly from async code
+    shared = False
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, buckets, cost=1):
+        """buckets: [(key, rate, burst)] -> (allowed, retry_after, limiting key)"""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait, empty = 0, None
+            for key, rate, burst in buckets:
+                tokens, updated = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                if tokens < cost and (cost - tokens) / rate > wait:
+                    wait, empty = (cost - tokens) / rate, key
+            for (key, rate, burst), tokens in zip(buckets, levels):
+                if empty is None:
+                    tokens -= cost
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return empty is None, wait, empty
+
+
+class RedisRateLimiter:
+    """Buckets in Redis hashes, checked and taken in one Lua call"""
+
+    shared = True
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self._take_script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, buckets, cost=1):
+        args = [repr(time.time()), cost]
+        for _, rate, burst in buckets:
+            args += [repr(rate), burst]
+        allowed, wait, empty = self._take_script(keys=[key for key, _, _ in buckets], args=args)
+        return bool(allowed), float(wait), buckets[empty - 1][0] if empty else None
+
+
+class RateLimiter:
+    """Scope-level checks on top of a backend"""
+
+    def __init__(self, backend, prefix='chat:ratelimit'):
+        self.backend = backend
+        self.prefix = prefix
+        self._limits = {}
+
+    def limits(self, scope):
+        if scope not in self._limits:
+            self._limits[scope] = parse_limits(getattr(settings, f'CHAT_RATE_LIMIT_{scope.upper()}', ''))
+        return self._limits[scope]
+
+    def check(self, scope, **keys):
+        """
+        Take a token for scope, keys by kind (user=..., ip=..., room=...)
+
+        Kinds without a configured limit, and empty keys, are skipped.
+        Returns (allowed, retry_after seconds).
+        """
+        buckets = []
+        for kind, (rate, burst) in self.limits(scope).items():
+            value = keys.get(kind)
+            if value in (None, ''):
+                continue
+            buckets.append((f'{self.prefix}:{scope}:{kind}:{value}', rate, burst))
+        if not buckets:
+            return True, 0
+
+        try:
+            allowed, wait, _ = self.backend.take(buckets)
+        except Exception:
+            logger.exception('Rate limit check failed for %s', scope)
+            metrics.incr('rate_limit.errors')
+            return True, 0
+        if not allowed:
+            metrics.incr('rate_limit.rejected')
+            metrics.incr(f'rate_limit.rejected.{scope}')
+        return allowed, math.ceil(wait * 10) / 10
+
+    async def acheck(self, scope, **keys):
+        """check() for async code (a shared backend runs in a worker thread)"""
+        if self.backend.shared:
+            return await sync_to_async(self.check, thread_sensitive=False)(scope, **keys)
+        return self.check(scope, **keys)
+
+
+def rate_limited_frame(scope, retry_after):
+    """Error frame for a WebSocket frame that was over the limit (and dropped)"""
+    return get_codec().dumps({
+        'type': 'error',
+        'code': 'rate_limited',
+        'scope': scope,
+        'retry_after': retry_after,
+    })
+
+
+def build_rate_limiter(url):
+    """Limiter for CHAT_RATE_LIMIT_URL, None when disabled"""
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return RateLimiter(LocalRateLimiter())
+    return RateLimiter(RedisRateLimiter(url))
+
+
+_limiter = None
+_configured = False
+_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Process-wide limiter from settings (None when disabled)"""
+    global _limiter, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                _limiter = build_rate_limiter(settings.CHAT_RATE_LIMIT_URL)
+                _configured = True
+    return _limiter
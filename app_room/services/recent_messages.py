@@ -0,0 +1,308 @@
+"""
+Recent messages per room (first history page without the database)
+
+CHAT_RECENT_MESSAGES_URL selects the store:
+- '' : disabled, every history page reads the database
+- 'local://' : in-process stand-in (single-process deployments, development)
+- 'redis://...' : capped Redis lists shared by all workers
+
+Each room keeps its newest CHAT_RECENT_MESSAGES_SIZE messages as
+Message.values(*MESSAGE_ROW_FIELDS) rows, plus the serialized room:
+- new messages are pushed as they are saved (post_save, write-behind flush)
+- pushes only extend a room that is already loaded, a room is loaded by
+  the first history request that misses (seed)
+- every push bumps a per-room version; a seed built from a database read
+  is dropped if the version moved meanwhile, so a message saved during
+  that read can't be lost
+- edits, deletes, room and membership changes invalidate the room
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from .codec import get_codec
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Message.values() columns kept per message (the compact history rows)
+MESSAGE_ROW_FIELDS = [
+    'id', 'user_id', 'user__username', 'content', 'image', 'message_type', 'timestamp', 'provisional_id',
+    'image_thumb', 'image_medium', 'image_width', 'image_height'
+]
+
+# KEYS: meta, list, version  ARGV: size, ttl, rows...
+PUSH_SCRIPT = """
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 3, #ARGV do
+    redis.call('LPUSH', KEYS[2], ARGV[i])
+end
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[1]) - 1)
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+# KEYS: meta, list, version  ARGV: version, ttl, meta, rows...
+SEED_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[3]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[2])
+for i = 4, #ARGV do
+    redis.call('RPUSH', KEYS[2], ARGV[i])
+end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[2])
+if #ARGV >= 4 then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+
+def message_row(message):
+    """values() row for a saved Message instance"""
+    return {
+        'id': message.pk,
+        'user_id': message.user_id,
+        'user__username': message.user.username,
+        'content': message.content,
+        'image': message.image.name or None,
+        'message_type': message.message_type,
+        'timestamp': message.timestamp,
+        'provisional_id': message.provisional_id,
+        'image_thumb': message.image_thumb.name or None,
+        'image_medium': message.image_medium.name or None,
+        'image_width': message.image_width,
+        'image_height': message.image_height,
+    }
+
+
+def encode_row(row):
+    """values() row -> JSON text (timestamp as ISO 8601)"""
+    row = dict(row)
+    row['timestamp'] = row['timestamp'].isoformat()
+    if row.get('provisional_id') is not None:
+        row['provisional_id'] = row['provisional_id'].hex
+    return get_codec().dumps(row)
+
+
+def decode_row(text):
+    row = get_codec().loads(text)
+    row['timestamp'] = parse_datetime(row['timestamp'])
+    return row
+
+
+class RecentMessages:
+    """
+    Base store (see module docstring)
+
+    room_id None is public chat. Rows are kept newest first.
+    """
+
+    def __init__(self, size=100):
+        self.size = size
+
+    def get(self, room_id):
+        """Return (room_data, rows newest first), or None if the room isn't loaded"""
+        try:
+            cached = self._get(room_id)
+        except Exception:
+            logger.exception('Recent messages read failed')
+            cached = None
+        metrics.incr('recent_messages.hits' if cached is not None else 'recent_messages.misses')
+        if cached is None:
+            return None
+        room_data, texts = cached
+        rows = {}
+        for text in texts:
+            row = decode_row(text)
+            # a replayed write-behind batch can push a message twice
+            rows[row['id']] = row
+        # pushes from several workers can interleave, keep history order
+        rows = sorted(rows.values(), key=lambda row: (row['timestamp'], row['id']), reverse=True)
+        return room_data, rows
+
+    def version(self, room_id):
+        """Current version, read before the database query of a seed"""
+        try:
+            return self._version(room_id)
+        except Exception:
+            logger.exception('Recent messages read failed')
+            return None
+
+    def seed(self, room_id, version, room_data, rows):
+        """Load a room from a database read made at version"""
+        if version is None:
+            return False
+        try:
+            return self._seed(room_id, version, room_data, [encode_row(row) for row in rows[:self.size]])
+        except Exception:
+            logger.exception('Recent messages seed failed')
+            return False
+
+    def push(self, room_id, rows):
+        """Add new messages (oldest first) to a loaded room"""
+        try:
+            self._push(room_id, [encode_row(row) for row in rows])
+        except Exception:
+            # the room can no longer be trusted
+            logger.exception('Recent messages push failed')
+            self.invalidate(room_id)
+
+    def invalidate(self, room_id):
+        try:
+            self._invalidate(room_id)
+        except Exception:
+            logger.exception('Recent messages invalidation failed')
+
+    def clear(self):
+        """Invalidate every room (e.g. after a username change)"""
+        try:
+            self._clear()
+        except Exception:
+            logger.exception('Recent messages clear failed')
+
+
+class LocalRecentMessages(RecentMessages):
+    """In-process store - only correct when one process serves the site"""
+
+    def __init__(self, size=100, max_rooms=1024):
+        super().__init__(size)
+        self.max_rooms = max_rooms
+        self._lock = threading.Lock()
+        self._rooms = OrderedDict()
+        self._versions = {}
+
+    def _get(self, room_id):
+        with self._lock:
+            entry = self._rooms.get(room_id)
+            if entry is None:
+                return None
+            self._rooms.move_to_end(room_id)
+            return entry[0], list(entry[1])
+
+    def _version(self, room_id):
+        with self._lock:
+            return self._versions.get(room_id, 0)
+
+    def _seed(self, room_id, version, room_data, rows):
+        with self._lock:
+            if self._versions.get(room_id, 0) != version:
+                return False
+            self._rooms[room_id] = (room_data, rows)
+            self._rooms.move_to_end(room_id)
+            while len(self._rooms) > self.max_rooms:
+                evicted, _ = self._rooms.popitem(last=False)
+                self._versions.pop(evicted, None)
+            return True
+
+    def _push(self, room_id, rows):
+        with self._lock:
+            self._versions[room_id] = self._versions.get(room_id, 0) + 1
+            entry = self._rooms.get(room_id)
+            if entry is None:
+                return
+            room_data, current = entry
+            self._rooms[room_id] = (room_data, (rows[::-1] + current)[:self.size])
+
+    def _invalidate(self, room_id):
+        with self._lock:
+            self._versions[room_id] = self._versions.get(room_id, 0) + 1
+            self._rooms.pop(room_id, None)
+
+    def _clear(self):
+        with self._lock:
+            for room_id in self._rooms:
+                self._versions[room_id] = self._versions.get(room_id, 0) + 1
+            self._rooms.clear()
+
+
+class RedisRecentMessages(RecentMessages):
+    """Capped Redis lists, shared by all workers"""
+
+    def __init__(self, url, size=100, ttl=86400, prefix='chat:recent'):
+        import redis
+
+        super().__init__(size)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self._push_script = self.client.register_script(PUSH_SCRIPT)
+        self._seed_script = self.client.register_script(SEED_SCRIPT)
+
+    def _keys(self, room_id):
+        base = f'{self.prefix}:{room_id if room_id is not None else "public"}'
+        return [f'{base}:meta', f'{base}:list', f'{base}:version']
+
+    def _get(self, room_id):
+        meta_key, list_key, version_key = self._keys(room_id)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.get(meta_key)
+            pipe.lrange(list_key, 0, self.size - 1)
+            meta, rows = pipe.execute()
+        if meta is None:
+            return None
+        return get_codec().loads(meta), [row.decode() for row in rows]
+
+    def _version(self, room_id):
+        return int(self.client.get(self._keys(room_id)[2]) or 0)
+
+    def _seed(self, room_id, version, room_data, rows):
+        meta = get_codec().dumps(room_data)
+        return bool(self._seed_script(
+            keys=self._keys(room_id), args=[version, self.ttl, meta, *rows]
+        ))
+
+    def _push(self, room_id, rows):
+        self._push_script(keys=self._keys(room_id), args=[self.size, self.ttl, *rows])
+
+    def _invalidate(self, room_id):
+        meta_key, list_key, version_key = self._keys(room_id)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(version_key)
+            pipe.expire(version_key, self.ttl)
+            pipe.delete(meta_key, list_key)
+            pipe.execute()
+
+    def _clear(self):
+        for key in self.client.scan_iter(match=f'{self.prefix}:*:meta', count=500):
+            # bump the version too, so an in-flight seed is dropped
+            base = key[:-len(b'meta')]
+            self.client.incr(base + b'version')
+            self.client.delete(key, base + b'list')
+
+
+def build_recent_messages(url, size=100, ttl=86400):
+    """Store for CHAT_RECENT_MESSAGES_URL, None when disabled"""
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return LocalRecentMessages(size)
+    return RedisRecentMessages(url, size, ttl)
+
+
+_store = None
+_configured = False
+_lock = threading.Lock()
+
+
+def get_recent_messages():
+    """Process-wide store from settings (None when disabled)"""
+    global _store, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                _store = build_recent_messages(
+                    settings.CHAT_RECENT_MESSAGES_URL,
+                    settings.CHAT_RECENT_MESSAGES_SIZE,
+                    settings.CHAT_RECENT_MESSAGES_TTL,
+                )
+                _configured = True
+    return _store
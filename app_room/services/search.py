@@ -0,0 +1,167 @@
+"""
+Full-text message search
+
+Backends (CHAT_SEARCH_BACKEND):
+- postgres: a search_vector column (not a model field), a tsvector of
+  content kept by a trigger ('simple' configuration: no stemming, works for
+  Persian and English alike) with a GIN index, OR'ed with a substring
+  match (ILIKE) and, with CHAT_SEARCH_SIMILARITY_THRESHOLD, a word
+  similarity match (<%, finds misspelled words) that the pg_trgm GIN index
+  on content answers; all added by migration 0013 (0018 for the
+  ArchivedMessage table)
+- basic: every term must be in content (icontains), for SQLite and other
+  databases; scans the messages of the scope, fine for development
+- auto: postgres on PostgreSQL, basic otherwise
+
+Results are ordered by (timestamp, id) like the history, not by rank, so
+keyset pagination works unchanged and a page costs the same at any depth;
+like the history, a page that runs out of hot messages continues in the
+archive.
+Highlighting runs in Python on the page rows only: an HTML-escaped snippet
+around the first match with the terms in <mark>.
+
+Counters: search.queries.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .metrics import metrics
+
+# websearch_to_tsquery syntax: "quoted phrase", -excluded, or
+TERM_PATTERN = re.compile(r'(-?)"([^"]+)"|(-?)(\S+)')
+
+# shorter text has no trigram to compare
+FUZZY_MIN_LENGTH = 3
+
+
+def parse_terms(query):
+    """Terms to match and highlight (quotes removed, excluded terms and 'or' left out)"""
+    terms = []
+    for negated_phrase, phrase, negated, word in TERM_PATTERN.findall(query):
+        if negated_phrase or negated:
+            continue
+        term = (phrase or word).strip()
+        if term and term.lower() != 'or':
+            terms.append(term)
+    return terms
+
+
+class BasicSearch:
+    """Every term in content, case-insensitive"""
+    name = 'basic'
+
+    def filter(self, messages, query):
+        terms = parse_terms(query)
+        for term in terms:
+            messages = messages.filter(content__icontains=term)
+        return messages
+
+
+class PostgresSearch:
+    """tsvector match (GIN), substring or word similarity match (pg_trgm GIN)"""
+    name = 'postgres'
+
+    def __init__(self, similarity_threshold=0):
+        # 0: no word similarity match
+        self.similarity_threshold = similarity_threshold
+
+    def filter(self, messages, query):
+        # parameters are passed separately, never formatted into the SQL
+        sql = "search_vector @@ websearch_to_tsquery('simple', %s) OR content ILIKE %s"
+        params = [query, f'%{escape_like(query)}%']
+        words = ' '.join(parse_terms(query))
+        if self.similarity_threshold and len(words) >= FUZZY_MIN_LENGTH:
+            # a run of words in content close to the terms (typos); <% is
+            # the indexable form of word_similarity(words, content) >= threshold
+            self.set_threshold()
+            sql += ' OR %s <%% content'
+            params.append(words)
+        return messages.filter(RawSQL(sql, params, output_field=BooleanField()))
+
+    def set_threshold(self):
+        """pg_trgm.word_similarity_threshold of this connection, used by <%"""
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                [str(self.similarity_threshold)]
+            )
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_search(name):
+    if name == 'auto':
+        name = 'postgres' if connection.vendor == 'postgresql' else 'basic'
+    if name == 'postgres':
+        return PostgresSearch(getattr(settings, 'CHAT_SEARCH_SIMILARITY_THRESHOLD', 0))
+    if name == 'basic':
+        return BasicSearch()
+    raise ValueError(f'Unknown CHAT_SEARCH_BACKEND: {name}')
+
+
+_search = None
+
+
+def get_search():
+    """Backend from CHAT_SEARCH_BACKEND (built on first use)"""
+    global _search
+    if _search is None:
+        _search = build_search(getattr(settings, 'CHAT_SEARCH_BACKEND', 'auto'))
+    return _search
+
+
+def search_messages(query, *querysets):
+    """Each queryset (Message, ArchivedMessage) narrowed to content matching query"""
+    metrics.incr('search.queries')
+    search = get_search()
+    return [
+        search.filter(messages.exclude(content__isnull=True).exclude(content=''), query)
+        for messages in querysets
+    ]
+
+
+def highlight(content, terms, size=None):
+    """
+    HTML-escaped snippet of content around the first term, terms in <mark>
+
+    Content without a literal match of any term gives its start.
+    """
+    size = size or getattr(settings, 'CHAT_SEARCH_SNIPPET_SIZE', 160)
+    content = content or ''
+    pattern = None
+    if terms:
+        # longest first: 'chat' and 'chatroom' mark the whole word
+        alternatives = sorted(terms, key=len, reverse=True)
+        pattern = re.compile('|'.join(re.escape(term) for term in alternatives), re.IGNORECASE)
+    first = pattern.search(content) if pattern else None
+
+    start = 0
+    if first and len(content) > size:
+        # some context before the match
+        start = max(0, min(first.start() - size // 3, len(content) - size))
+    end = min(len(content), start + size)
+    snippet = content[start:end]
+
+    parts = []
+    position = 0
+    for match in (pattern.finditer(snippet) if pattern else ()):
+        parts.append(escape(snippet[position:match.start()]))
+        parts.append(f'<mark>{escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(escape(snippet[position:]))
+
+    text = ''.join(parts)
+    if start > 0:
+        text = '…' + text
+    if end < len(content):
+        text = text + '…'
+    return text
@@ -0,0 +1,167 @@
+"""
+Per-connection send queues (backpressure for slow WebSocket clients)
+
+Consumer handlers put frames into a bounded queue and return at once, a
+writer task sends them. A slow client therefore backs up its own queue,
+not the channel layer (where messages would be dropped silently at
+capacity). When the queue reaches CHAT_SEND_QUEUE_MAX frames, the
+CHAT_SEND_QUEUE_POLICY applies:
+- drop_oldest: the oldest queued frame is discarded
+- coalesce: the backlog is replaced by one {"type": "gap", "dropped": n}
+  frame, the client reloads the missed messages over HTTP
+- disconnect: a {"type": "resync"} frame is sent and the socket is closed
+  with code 4008, the client reconnects and reloads history
+
+Clients that accept batches get the queued message frames in one batch
+frame; control frames (put with batch=False) are always sent on their own.
+Ephemeral frames (typing, read cursors) wait in a small separate queue
+that is only sent when no messages are queued; it drops its oldest frame
+when full and never triggers the policy.
+Exported metrics: send_queue.depth (frames queued in this process),
+send_queue.depth_peak (deepest queue seen), send_queue.dropped,
+send_queue.gaps, send_queue.disconnects, send_queue.ephemeral_dropped.
+"""
+import asyncio
+import logging
+from collections import deque
+
+from .coalescing import batch_frame
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# close code sent with the resync frame (4000-4999: application codes)
+CLOSE_SLOW_CONSUMER = 4008
+
+# ephemeral frames kept per connection, older ones are dropped
+EPHEMERAL_MAX = 8
+
+_depth = 0
+_peak = 0
+
+
+def _track(delta):
+    global _depth
+    _depth += delta
+    metrics.gauge('send_queue.depth', _depth)
+
+
+def gap_frame(dropped):
+    return f'{{"type":"gap","dropped":{dropped}}}'
+
+
+RESYNC_FRAME = '{"type":"resync","reason":"slow_consumer"}'
+
+
+class SendQueue:
+    """Bounded queue of outgoing text frames for one connection"""
+
+    def __init__(self, send, close, max_frames=256, policy=DROP_OLDEST, batch_frames=False):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown send queue policy: {policy!r}')
+        self._send = send
+        self._close = close
+        self.max_frames = max(1, max_frames)
+        self.policy = policy
+        self.batch_frames = batch_frames
+        self.frames = deque()
+        self.ephemeral = deque()
+        self.gap = 0
+        self.closing = False
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """Cancel the writer and discard queued frames (socket is gone)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        _track(-len(self.frames))
+        self.frames.clear()
+        self.ephemeral.clear()
+
+    def put(self, frame, batch=True):
+        """Queue a frame, never blocks (batch=False: never inside a batch frame)"""
+        global _peak
+        if self.closing:
+            return
+        if len(self.frames) >= self.max_frames:
+            self._overflow()
+            if self.closing:
+                return
+
+        self.frames.append((frame, batch))
+        _track(1)
+        if len(self.frames) > _peak:
+            _peak = len(self.frames)
+            metrics.gauge('send_queue.depth_peak', _peak)
+        self._wakeup.set()
+
+    def put_ephemeral(self, frame):
+        """Queue a low-priority frame, sent once the messages are out"""
+        if self.closing:
+            return
+        if len(self.ephemeral) >= EPHEMERAL_MAX:
+            self.ephemeral.popleft()
+            metrics.incr('send_queue.ephemeral_dropped')
+        self.ephemeral.append(frame)
+        self._wakeup.set()
+
+    def _overflow(self):
+        if self.policy == DROP_OLDEST:
+            self.frames.popleft()
+            _track(-1)
+            metrics.incr('send_queue.dropped')
+        elif self.policy == COALESCE:
+            dropped = len(self.frames)
+            self.frames.clear()
+            _track(-dropped)
+            self.gap += dropped
+            metrics.incr('send_queue.dropped', dropped)
+            metrics.incr('send_queue.gaps')
+        else:
+            dropped = len(self.frames)
+            self.frames.clear()
+            _track(-dropped)
+            self.closing = True
+            metrics.incr('send_queue.dropped', dropped)
+            metrics.incr('send_queue.disconnects')
+            self._wakeup.set()
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if self.closing:
+                    await self._send(RESYNC_FRAME)
+                    await self._close(CLOSE_SLOW_CONSUMER)
+                    return
+                while self.frames or self.gap or self.ephemeral:
+                    if self.gap:
+                        dropped, self.gap = self.gap, 0
+                        await self._send(gap_frame(dropped))
+                    elif self.batch_frames and len(self.frames) > 1 and self.frames[0][1]:
+                        frames = []
+                        while self.frames and self.frames[0][1]:
+                            frames.append(self.frames.popleft()[0])
+                        _track(-len(frames))
+                        await self._send(batch_frame(frames) if len(frames) > 1 else frames[0])
+                    elif self.frames:
+                        frame, _ = self.frames.popleft()
+                        _track(-1)
+                        await self._send(frame)
+                    else:
+                        await self._send(self.ephemeral.popleft())
+                    if self.closing:
+                        break
+        except Exception:
+            logger.exception('WebSocket writer failed')
@@ -0,0 +1,90 @@
+"""
+Version counters for conditional GET (ETag / Last-Modified)
+
+Scopes:
+- rooms: the public room list (room and membership writes)
+- room:<id> / room:public: one room, its details and message history
+- all: every response (username changes, shown in rooms and messages)
+
+Counters live in CACHES['default'] so all workers agree. Writers bump
+after commit, readers read before building the response - a response is
+never tagged with a version newer than its data. A counter that was
+evicted restarts from the clock (microseconds), above any value it had.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ROOMS = 'rooms'
+ALL = 'all'
+
+
+def room_scope(room_id):
+    return f'room:{room_id}' if room_id is not None else 'room:public'
+
+
+class VersionCounters:
+    """Named version counters with the time of their last bump"""
+
+    def __init__(self, cache, prefix='chat:version'):
+        self.cache = cache
+        self.prefix = prefix
+
+    def _keys(self, scope):
+        return f'{self.prefix}:{scope}', f'{self.prefix}:{scope}:modified'
+
+    def bump(self, *scopes):
+        now = time.time()
+        try:
+            for scope in scopes:
+                version_key, modified_key = self._keys(scope)
+                try:
+                    self.cache.incr(version_key)
+                except ValueError:
+                    # missing (never set or evicted)
+                    self.cache.set(version_key, int(now * 1_000_000), timeout=None)
+                self.cache.set(modified_key, now, timeout=None)
+        except Exception:
+            logger.exception('Version bump failed for %s', scopes)
+
+    def get(self, *scopes):
+        """
+        Return ([version per scope], last modified timestamp) in one cache read
+
+        Returns None if the cache is unavailable.
+        """
+        keys = [key for scope in scopes for key in self._keys(scope)]
+        try:
+            values = self.cache.get_many(keys)
+        except Exception:
+            logger.exception('Version read failed for %s', scopes)
+            return None
+
+        now = time.time()
+        versions, modified = [], []
+        missing = {}
+        for scope in scopes:
+            version_key, modified_key = self._keys(scope)
+            version = values.get(version_key)
+            if version is None:
+                version = int(now * 1_000_000)
+                missing[version_key] = version
+            if values.get(modified_key) is None:
+                missing[modified_key] = now
+            versions.append(version)
+            modified.append(values.get(modified_key, now))
+
+        if missing:
+            try:
+                for key, value in missing.items():
+                    # add: a concurrent bump or read may have set it already
+                    self.cache.add(key, value, timeout=None)
+            except Exception:
+                logger.exception('Version init failed for %s', scopes)
+        return versions, max(modified)
+
+
+versions = VersionCounters(cache)
@@ -0,0 +1,296 @@
+"""
+Write-behind persistence for WebSocket text messages
+
+How does it work?
+- enqueue() appends the message to a local journal file and returns a
+  provisional id right away, so the consumer can broadcast without
+  waiting for the database
+- a per-process flusher thread persists pending messages with bulk_create,
+  when the batch is full or the max flush lag has passed
+- a journal segment is deleted only after its messages are committed
+- segments left behind by a crashed process are replayed on startup
+- rows keep the timestamp that was broadcast (journaled), not the time
+  of the flush or of the replay
+
+Delivery is at-least-once: a replayed message carries the same
+provisional_id and the unique constraint drops the duplicate.
+
+If a batch fails, its rows are retried one by one: a row that still fails
+with a data error (bad entry, constraint) is written to a dead-letter file
+(<pid>.deadletter in the journal directory, never replayed) so it
+can't hold back the rest. Connection errors keep the rows for the next
+cycle. Counters: write_behind.dead_lettered.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app_room.models.room import Message, Room
+
+from .metrics import metrics
+from .recent_messages import MESSAGE_ROW_FIELDS, get_recent_messages
+from .versions import room_scope, versions
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = '.journal'
+DEAD_LETTER_SUFFIX = '.deadletter'
+
+# the database is unavailable, not the rows: retry them later
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class WriteBehindWriter:
+    """Journal + batched flusher for text messages (one per process)"""
+
+    def __init__(self, journal_dir, batch_size=100, max_lag=0.05, fsync=False):
+        self.journal_dir = str(journal_dir)
+        self.batch_size = batch_size
+        self.max_lag = max_lag
+        self.fsync = fsync
+        
+        self._cond = threading.Condition()
+        # one rotate + commit at a time: close() (also from atexit) flushes
+        # while the flusher thread may be committing
+        self._commit_lock = threading.Lock()
+        self._pending = []     # entries not yet committed
+        self._segments = []    # closed segments covered by _pending
+        self._segment = None   # active segment (append only)
+        self._thread = None
+        self._stopping = False
+
+    def enqueue(self, username, content, room_id):
+        """Journal a text message and return (provisional_id, timestamp)"""
+        entry = {
+            'id': uuid.uuid4().hex,
+            'username': username,
+            'content': content,
+            'room_id': room_id,
+            'timestamp': timezone.now().isoformat(),
+        }
+        line = json.dumps(entry) + '\n'
+        
+        with self._cond:
+            self._start()
+            if self._segment is None:
+                self._segment = self._open_segment()
+            self._segment.write(line)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        
+        return entry['id'], entry['timestamp']
+
+    def flush(self):
+        """Persist everything pending now (blocks until done or failed)"""
+        with self._commit_lock:
+            with self._cond:
+                batch, segments = self._rotate()
+            if batch:
+                self._commit(batch, segments)
+
+    def close(self):
+        """Stop the flusher thread and persist what is left"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.max_lag * 10, 5))
+        self.flush()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._recover()
+        self._thread = threading.Thread(
+            target=self._run, name='chat-write-behind', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._cond.wait(timeout=self.max_lag)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def _rotate(self):
+        """Close the active segment; return everything pending (caller holds both locks)"""
+        if self._segment is not None:
+            self._segments.append(self._segment)
+            self._segment = None
+        return list(self._pending), list(self._segments)
+
+    def _commit(self, batch, segments):
+        try:
+            close_old_connections()
+            self._persist(batch)
+            done = batch
+        except TRANSIENT_ERRORS:
+            # keep entries and segments, the next cycle retries them
+            logger.exception('write-behind flush failed for %d messages', len(batch))
+            return
+        except Exception:
+            logger.exception('write-behind batch of %d messages failed, saving row by row', len(batch))
+            done = self._commit_rows(batch)
+        
+        with self._cond:
+            done_ids = {entry['id'] for entry in done}
+            self._pending = [entry for entry in self._pending if entry['id'] not in done_ids]
+            if len(done_ids) < len(batch):
+                # rows journaled in these segments are still pending
+                return
+            for segment in segments:
+                self._segments.remove(segment)
+        for segment in segments:
+            self._discard_segment(segment)
+
+    def _commit_rows(self, batch):
+        """Persist entries one by one, dead-letter the bad ones; return the entries done"""
+        done = []
+        for entry in batch:
+            try:
+                self._persist([entry])
+            except TRANSIENT_ERRORS:
+                logger.exception('write-behind flush failed, %d messages kept', len(batch) - len(done))
+                break
+            except Exception as error:
+                logger.exception('write-behind message %s moved to the dead-letter file', entry.get('id'))
+                self._dead_letter(entry, error)
+            done.append(entry)
+        return done
+
+    def _dead_letter(self, entry, error):
+        name = f'{os.getpid()}{DEAD_LETTER_SUFFIX}'
+        record = json.dumps({'entry': entry, 'error': repr(error)}, default=str) + '\n'
+        with open(os.path.join(self.journal_dir, name), 'a', encoding='utf-8') as f:
+            f.write(record)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        metrics.incr('write_behind.dead_lettered')
+
+    def _persist(self, batch):
+        """Resolve users in bulk and insert the batch"""
+        usernames = {entry['username'] for entry in batch}
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        for username in usernames - users.keys():
+            users[username], created = User.objects.get_or_create(username=username)
+        
+        # rooms deleted since the message was journaled lose it (like CASCADE)
+        room_ids = {entry['room_id'] for entry in batch if entry['room_id']}
+        live_room_ids = set(Room.objects.filter(pk__in=room_ids).values_list('pk', flat=True))
+        batch = [
+            entry for entry in batch
+            if not entry['room_id'] or entry['room_id'] in live_room_ids
+        ]
+        
+        with transaction.atomic():
+            Message.objects.bulk_create(
+                [
+                    Message(
+                        provisional_id=uuid.UUID(entry['id']),
+                        user=users[entry['username']],
+                        room_id=entry['room_id'],
+                        content=entry['content'],
+                        message_type='text',
+                        # the time that was broadcast, also for replayed entries
+                        timestamp=parse_datetime(entry['timestamp'])
+                    )
+                    for entry in batch
+                ],
+                ignore_conflicts=True
+            )
+        
+        versions.bump(*{room_scope(entry['room_id']) for entry in batch})
+        self._push_recent(batch)
+
+    def _push_recent(self, batch):
+        """Add the saved rows to the recent messages store (ids are known now)"""
+        store = get_recent_messages()
+        if store is None or not batch:
+            return
+        rows = (
+            Message.objects
+            .filter(provisional_id__in=[uuid.UUID(entry['id']) for entry in batch])
+            .order_by('timestamp', 'id')
+            .values('room_id', *MESSAGE_ROW_FIELDS)
+        )
+        by_room = {}
+        for row in rows:
+            by_room.setdefault(row.pop('room_id'), []).append(row)
+        for room_id, room_rows in by_room.items():
+            store.push(room_id, room_rows)
+
+    def _open_segment(self):
+        name = f'{os.getpid()}-{uuid.uuid4().hex}{JOURNAL_SUFFIX}'
+        segment = open(os.path.join(self.journal_dir, name), 'a', encoding='utf-8')
+        fcntl.flock(segment.fileno(), fcntl.LOCK_EX)
+        return segment
+
+    def _discard_segment(self, segment):
+        try:
+            os.remove(segment.name)
+        except FileNotFoundError:
+            pass
+        segment.close()
+
+    def _recover(self):
+        """Adopt segments that no live process holds a lock on"""
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not name.endswith(JOURNAL_SUFFIX):
+                continue
+            segment = open(os.path.join(self.journal_dir, name), 'r+', encoding='utf-8')
+            try:
+                fcntl.flock(segment.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                segment.close()
+                continue
+            
+            for line in segment:
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    # torn last line from a crash mid-write
+                    continue
+            self._segments.append(segment)
+        
+        if self._pending:
+            logger.warning('write-behind recovered %d journaled messages', len(self._pending))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_message_writer():
+    """Return the process-wide writer configured from settings"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindWriter(
+                    journal_dir=settings.CHAT_WRITE_BEHIND_JOURNAL_DIR,
+                    batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+                    max_lag=settings.CHAT_WRITE_BEHIND_MAX_LAG,
+                    fsync=settings.CHAT_WRITE_BEHIND_FSYNC,
+                )
+    return _writer
@@ -0,0 +1,148 @@
+"""
+Model signals
+
+Keep the identity cache in sync with Room and User writes, so room
+renames and deletes take effect at once, and tell connected
+ChatConsumers to refresh the room they resolved at connect time.
+
+New messages are pushed to the recent messages store as they are saved
+(ChatConsumer, ImageUploadView, admin); edits, deletes and room or
+membership changes invalidate the room there.
+
+The same writes bump the version counters behind the API ETags
+(services.versions), after commit.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from app_room.models.room import Message, Room
+from app_room.services.identity_cache import identity_cache
+from app_room.services.recent_messages import get_recent_messages, message_row
+from app_room.services.versions import ALL, ROOMS, room_scope, versions
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_init, sender=Room)
+def remember_room_slug(sender, instance, **kwargs):
+    # slug as loaded, so a rename can drop the old cache key
+    instance._loaded_slug = instance.slug
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def invalidate_room(sender, instance, created=False, **kwargs):
+    old_slug = instance._loaded_slug
+    identity_cache.invalidate_room(instance.slug)
+    if old_slug and old_slug != instance.slug:
+        identity_cache.invalidate_room(old_slug)
+    instance._loaded_slug = instance.slug
+    
+    room_id = instance.pk
+    transaction.on_commit(lambda: versions.bump(ROOMS, room_scope(room_id)))
+    
+    store = get_recent_messages()
+    if store is not None:
+        # the serialized room is stored with its messages
+        transaction.on_commit(lambda: store.invalidate(room_id))
+    
+    if not created:
+        # sockets joined the group of the slug they connected with
+        deleted = kwargs['signal'] is post_delete
+        group_slug, slug = old_slug or instance.slug, instance.slug
+        transaction.on_commit(lambda: notify_room_changed(group_slug, slug, deleted))
+
+
+def notify_room_changed(group_slug, slug, deleted=False):
+    """Send room_changed to the consumers of a room group"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f'chat_{group_slug}',
+            {'type': 'room_changed', 'slug': slug, 'deleted': deleted}
+        )
+    except Exception:
+        # a channel layer outage must not break room writes
+        logger.exception('room_changed notification failed for %s', group_slug)
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.username
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    identity_cache.invalidate_user(instance.username)
+    if instance._loaded_username and instance._loaded_username != instance.username:
+        identity_cache.invalidate_user(instance._loaded_username)
+        transaction.on_commit(lambda: versions.bump(ALL))
+        
+        store = get_recent_messages()
+        if store is not None:
+            # the old username is stored in message rows of any room
+            transaction.on_commit(store.clear)
+    instance._loaded_username = instance.username
+
+
+@receiver(m2m_changed, sender=Room.members.through)
+def invalidate_room_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # member_count is shown in room lists, details and stored rooms
+    if not reverse:
+        room_ids = [instance.pk]
+    elif pk_set:
+        room_ids = list(pk_set)
+    else:
+        # user.joined_rooms.clear() - rooms are unknown after the fact
+        room_ids = None
+    
+    store = get_recent_messages()
+    
+    def invalidate():
+        if room_ids is None:
+            versions.bump(ALL)
+            if store is not None:
+                store.clear()
+            return
+        versions.bump(ROOMS, *[room_scope(room_id) for room_id in room_ids])
+        if store is not None:
+            for room_id in room_ids:
+                store.invalidate(room_id)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Message)
+def push_recent_message(sender, instance, created, **kwargs):
+    room_id = instance.room_id
+    transaction.on_commit(lambda: versions.bump(room_scope(room_id)))
+    
+    store = get_recent_messages()
+    if store is None:
+        return
+    if created:
+        row = message_row(instance)
+        transaction.on_commit(lambda: store.push(room_id, [row]))
+    else:
+        transaction.on_commit(lambda: store.invalidate(room_id))
+
+
+@receiver(post_delete, sender=Message)
+def invalidate_recent_messages(sender, instance, **kwargs):
+    room_id = instance.room_id
+    transaction.on_commit(lambda: versions.bump(room_scope(room_id)))
+    
+    store = get_recent_messages()
+    if store is not None:
+        transaction.on_commit(lambda: store.invalidate(room_id))
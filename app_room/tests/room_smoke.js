@@ -0,0 +1,99 @@
+// Loads static/chat/js/room.js against a minimal DOM / WebSocket stub and
+// drives it like a browser would. Run by test_room_js.py:
+//     node room_smoke.js path/to/room.js
+const assert = require('assert');
+const fs = require('fs');
+const vm = require('vm');
+
+function element() {
+    const listeners = {};
+    return {
+        listeners,
+        dataset: {roomSlug: 'general', roomName: 'General'},
+        classList: {add() {}, remove() {}, contains() { return false; }},
+        style: {},
+        value: '',
+        textContent: '',
+        title: '',
+        scrollTop: 0,
+        scrollHeight: 0,
+        appendChild() {},
+        insertBefore() {},
+        querySelector() { return null; },
+        querySelectorAll() { return []; },
+        click() {},
+        addEventListener(type, listener) {
+            (listeners[type] = listeners[type] || []).push(listener);
+        },
+        dispatch(type, event) {
+            (listeners[type] || []).forEach(listener => listener.call(this, event || {}));
+        },
+    };
+}
+
+const elements = {};
+const intervals = [];
+const sockets = [];
+
+class WebSocket {
+    constructor(url) {
+        this.url = url;
+        this.readyState = WebSocket.OPEN;
+        this.sent = [];
+        sockets.push(this);
+    }
+    send(data) {
+        this.sent.push(JSON.parse(data));
+    }
+    close(code) {
+        this.readyState = WebSocket.CLOSED;
+        this.onclose({code: code});
+    }
+}
+WebSocket.OPEN = 1;
+WebSocket.CLOSED = 3;
+
+const context = vm.createContext({
+    document: {
+        body: element(),
+        getElementById(id) { return elements[id] = elements[id] || element(); },
+        createElement() { return element(); },
+    },
+    window: {location: {protocol: 'http:', host: 'localhost'}, open() {}},
+    localStorage: {getItem() { return 'ali'; }, setItem() {}},
+    console: {log() {}, warn() {}, error() {}},
+    WebSocket,
+    fetch() { return new Promise(() => {}); },
+    setTimeout() { return 0; },
+    clearTimeout() {},
+    setInterval(callback, delay) { intervals.push(delay); return intervals.length; },
+    alert() {},
+});
+
+vm.runInContext(fs.readFileSync(process.argv[2], 'utf8'), context, {filename: 'room.js'});
+
+// handlers the socket callbacks and listeners call are top level
+['updatePresence', 'handleEphemeral', 'renderTyping', 'setTyping'].forEach(name => {
+    assert.strictEqual(typeof context[name], 'function', `${name} is not defined at top level`);
+});
+assert.deepStrictEqual(intervals, [25000], 'one keepalive on load');
+
+const socket = sockets[0];
+socket.onmessage({data: JSON.stringify({
+    type: 'ephemeral', events: [{kind: 'typing', username: 'sara', typing: true}],
+})});
+assert.ok(elements['typing-indicator'].textContent.includes('sara'));
+
+socket.onmessage({data: JSON.stringify({type: 'presence', online: 2, users: ['ali', 'sara'], joined: [], left: []})});
+assert.ok(elements['online-count'].textContent.includes('2'));
+
+const input = elements['message-input'];
+input.value = 'سلام';
+input.dispatch('input');
+assert.deepStrictEqual(socket.sent, [{message_type: 'typing', typing: true}]);
+
+// reconnects don't add keepalives
+socket.close(4000);
+sockets[1].onclose({code: 1006});
+assert.strictEqual(sockets.length, 2);
+assert.deepStrictEqual(intervals, [25000]);
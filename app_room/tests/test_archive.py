@@ -0,0 +1,68 @@
+"""
+Hot / archive split (manage.py archive_messages)
+
+Archived messages keep their ids and stay reachable: history and search
+pages continue from the hot table into the archive.
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from app_room.management.commands.archive_messages import archive_batch
+from app_room.models.room import ArchivedMessage, Message, Room
+
+
+@override_settings(CHAT_RATE_LIMIT_URL='')
+class ArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='alice')
+        cls.room = Room.objects.create(name='General', creator=cls.user)
+        now = timezone.now()
+        for i in range(6):
+            # three old messages, three recent ones
+            age = timedelta(days=200 - i) if i < 3 else timedelta(minutes=10 - i)
+            Message.objects.create(room=cls.room, user=cls.user, content=f'note {i}', timestamp=now - age)
+
+    def archive(self):
+        call_command('archive_messages', days=90, batch_size=2, stdout=StringIO())
+
+    def test_old_messages_move_with_their_ids(self):
+        old_ids = set(Message.objects.filter(content__in=['note 0', 'note 1', 'note 2']).values_list('id', flat=True))
+        self.archive()
+
+        self.assertEqual(set(ArchivedMessage.objects.values_list('id', flat=True)), old_ids)
+        self.assertEqual(sorted(Message.objects.values_list('content', flat=True)), ['note 3', 'note 4', 'note 5'])
+
+    def test_batch_deletes_without_signals(self):
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=Message)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Message)
+
+        moved = archive_batch(timezone.now() - timedelta(days=90), batch_size=10)
+
+        self.assertEqual(moved, 3)
+        receiver.assert_not_called()
+
+    def test_history_continues_in_the_archive(self):
+        self.archive()
+        url = f'/api/room/v1/messages/{self.room.slug}/'
+        page = self.client.get(url).json()
+        contents = [message['content'] for message in page['results']]
+        self.assertEqual(contents, [f'note {i}' for i in range(5, -1, -1)])
+
+    def test_search_continues_in_the_archive(self):
+        self.archive()
+        first = self.client.get('/api/room/v1/search/', {'q': 'note', 'limit': 4}).json()
+        second = self.client.get('/api/room/v1/search/', {'q': 'note', 'limit': 4, 'before': first['next']}).json()
+
+        contents = [message['content'] for message in first['messages'] + second['messages']]
+        self.assertEqual(contents, [f'note {i}' for i in range(5, -1, -1)])
+        self.assertIsNone(second['next'])
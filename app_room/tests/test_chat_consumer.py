@@ -0,0 +1,77 @@
+"""
+ChatConsumer frame handling (in-memory channel layer)
+"""
+import json
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TransactionTestCase, override_settings
+
+from app_room.api.v1.routing import websocket_urlpatterns
+from app_room.models.room import Message, Room
+from app_room.services import ephemeral_gate
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CHAT_WRITE_BEHIND=False, CHAT_RATE_LIMIT_URL='')
+class ChatConsumerTests(TransactionTestCase):
+
+    async def connect(self, room_name='public_chat'):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{room_name}/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_text_message_is_saved_and_broadcast(self):
+        communicator = await self.connect()
+        await communicator.send_to(text_data=json.dumps({'username': 'alice', 'message': 'hello'}))
+        frame = json.loads(await communicator.receive_from())
+        await communicator.disconnect()
+
+        self.assertEqual(frame['message'], 'hello')
+        self.assertEqual(frame['message_id'], await Message.objects.values_list('id', flat=True).aget())
+
+    async def test_invalid_text_frames_are_rejected(self):
+        communicator = await self.connect()
+        for frame in (
+            {'message': 'no username'},
+            {'username': '   ', 'message': 'blank username'},
+            {'username': 'a' * 151, 'message': 'long username'},
+            {'username': 'alice', 'message': ['not', 'a', 'string']},
+        ):
+            await communicator.send_to(text_data=json.dumps(frame))
+            self.assertEqual(json.loads(await communicator.receive_from()), {'type': 'error', 'code': 'invalid_message'})
+        await communicator.disconnect()
+
+        self.assertFalse(await Message.objects.aexists())
+
+    @override_settings(CHAT_PRIVATE_ROOMS_MEMBERS_ONLY=True)
+    async def test_room_changed_reads_the_room_from_the_database(self):
+        room = await Room.objects.acreate(name='general')
+        communicator = await self.connect(room.slug)
+        # changed by another worker: this worker's identity cache still has the public room
+        await Room.objects.filter(pk=room.pk).aupdate(is_public=False)
+        await get_channel_layer().group_send(
+            f'chat_{room.slug}', {'type': 'room_changed', 'slug': room.slug, 'deleted': False}
+        )
+
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+    async def test_message_from_another_tab_ends_the_typing_indicator(self):
+        self.addCleanup(ephemeral_gate._last.clear)
+        typing_tab = await self.connect()
+        other_tab = await self.connect()
+        await typing_tab.send_to(text_data=json.dumps({'message_type': 'typing', 'username': 'alice', 'typing': True}))
+        await typing_tab.send_to(text_data=json.dumps({'message_type': 'ping'}))
+        self.assertEqual(json.loads(await typing_tab.receive_from())['type'], 'pong')
+
+        await other_tab.send_to(text_data=json.dumps({'username': 'alice', 'message': 'hello'}))
+        self.assertEqual(json.loads(await typing_tab.receive_from())['message'], 'hello')
+        frame = json.loads(await typing_tab.receive_from())
+        await typing_tab.disconnect()
+        await other_tab.disconnect()
+
+        # the gate is per user: the other tab knew alice was typing
+        self.assertEqual(frame['events'], [{'kind': 'typing', 'username': 'alice', 'typing': False}])
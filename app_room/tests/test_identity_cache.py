@@ -0,0 +1,49 @@
+"""
+Identity cache invalidation across processes
+
+Two IdentityCache instances stand for two workers; they share
+CACHES['default'] like workers share Redis.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from app_room.models.room import Room
+from app_room.services.identity_cache import IdentityCache
+
+
+class IdentityCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.room = Room.objects.create(name='General')
+        self.writer = IdentityCache()
+        self.reader = IdentityCache()
+
+    def test_hit_needs_no_query(self):
+        self.reader.get_room(self.room.slug)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.reader.get_room(self.room.slug).pk, self.room.pk)
+
+    def test_delete_in_another_process_is_seen_at_once(self):
+        self.reader.get_room(self.room.slug)
+        self.room.delete()
+        self.writer.invalidate_room(self.room.slug)
+
+        self.assertIsNone(self.reader.get_room(self.room.slug))
+
+    def test_update_in_another_process_is_seen_at_once(self):
+        self.reader.get_room(self.room.slug)
+        Room.objects.filter(pk=self.room.pk).update(is_public=False)
+        self.writer.invalidate_room(self.room.slug)
+
+        self.assertFalse(self.reader.get_room(self.room.slug).is_public)
+
+    def test_shared_level_entry_is_checked_too(self):
+        shared_writer, shared_reader = IdentityCache(use_shared=True), IdentityCache(use_shared=True)
+        user = User.objects.create(username='alice')
+        shared_writer.get_user('alice')
+        user.delete()
+        shared_writer.invalidate_user('alice')
+
+        self.assertIsNone(shared_reader.get_user('alice', create=False))
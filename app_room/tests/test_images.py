@@ -0,0 +1,67 @@
+"""
+Image processing of deduplicated uploads (services.images)
+"""
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from app_room.models.room import Message
+from app_room.services.blobs import store_image
+from app_room.services.images import ImageProcessor
+
+
+def jpeg_with_gps():
+    image = Image.new('RGB', (64, 48), 'blue')
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera maker'
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class ImageProcessorTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create(username='alice')
+        self.processor = ImageProcessor(workers=0)
+
+    def upload(self, data):
+        fields = store_image(SimpleUploadedFile('photo.jpg', data, 'image/jpeg'))
+        return Message.objects.create(user=self.user, message_type='image', **fields)
+
+    def test_shared_original_is_not_rewritten(self):
+        data = jpeg_with_gps()
+        first, second = self.upload(data), self.upload(data)
+        original = first.image.name
+        self.assertEqual(second.image.name, original)
+
+        processed = self.processor.process(first.id, notify=False)
+
+        # the old file still serves the links already sent, unchanged
+        with default_storage.open(original) as f:
+            self.assertEqual(f.read(), data)
+        self.assertNotEqual(processed.image.name, original)
+        second.refresh_from_db()
+        self.assertEqual(second.image.name, processed.image.name)
+        with default_storage.open(processed.image.name) as f, Image.open(f) as image:
+            self.assertNotIn(0x010F, image.getexif())
+
+    def test_later_upload_gets_the_stripped_copy(self):
+        data = jpeg_with_gps()
+        first = self.upload(data)
+        processed = self.processor.process(first.id, notify=False)
+
+        later = self.upload(data)
+        self.assertEqual(later.image.name, processed.image.name)
+        self.assertEqual(later.image_thumb.name, processed.image_thumb.name)
@@ -0,0 +1,49 @@
+"""
+Keyset pagination of the message history
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from app_room.models.room import Message, Room
+
+
+class MessageKeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='alice')
+        cls.room = Room.objects.create(name='General', creator=cls.user)
+        for i in range(60):
+            Message.objects.create(room=cls.room, user=cls.user, content=f'message {i}')
+
+    def url(self):
+        return f'/api/room/v1/messages/{self.room.slug}/'
+
+    def test_pages_follow_the_next_cursor(self):
+        first = self.client.get(self.url()).json()
+        second = self.client.get(self.url(), {'before': first['next']}).json()
+
+        contents = [message['content'] for message in first['results'] + second['results']]
+        self.assertEqual(contents, [f'message {i}' for i in range(59, -1, -1)])
+        self.assertIsNone(second['next'])
+
+    def test_malformed_cursor_is_bad_request(self):
+        response = self.client.get(self.url(), {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('before', response.json())
+
+    def test_unknown_message_id_is_bad_request(self):
+        response = self.client.get(self.url(), {'after': '999999'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('after', response.json())
+
+    def test_legacy_offset_returns_a_plain_list(self):
+        response = self.client.get(self.url(), {'offset': '55'})
+        self.assertEqual([message['content'] for message in response.json()], [f'message {i}' for i in range(4, -1, -1)])
+
+    def test_invalid_offset_is_bad_request(self):
+        for offset in ('abc', '-1', ''):
+            with self.subTest(offset=offset):
+                response = self.client.get(self.url(), {'offset': offset})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('offset', response.json())
@@ -0,0 +1,72 @@
+"""
+Query counts of the room and history endpoints and the admin changelists
+
+The counts do not depend on the number of rows, so an N+1 (a query per
+room, member or message) fails these tests.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from app_room.models.room import Message, Room
+from app_room.services.identity_cache import identity_cache
+
+# admin templates without a collectstatic manifest
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(CHAT_RATE_LIMIT_URL='', STORAGES=PLAIN_STORAGES)
+class QueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        users = [User.objects.create(username=f'user{i}') for i in range(5)]
+        for i in range(5):
+            room = Room.objects.create(name=f'Room {i}', creator=users[i])
+            room.members.add(*users)
+        cls.room = room
+        Message.objects.bulk_create(
+            Message(room=room, user=users[i % 5], content=f'message {i}') for i in range(60)
+        )
+
+    def setUp(self):
+        cache.clear()
+        identity_cache.clear()
+
+    def test_room_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/room/v1/rooms/')
+        self.assertEqual(len(response.json()), 5)
+
+    def test_room_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/room/v1/rooms/{self.room.slug}/')
+        self.assertEqual(response.json()['member_count'], 5)
+
+    def test_join(self):
+        url = f'/api/room/v1/rooms/{self.room.slug}/join/'
+        # room, user lookup and create (savepoint), members add, fresh room
+        with self.assertNumQueries(8):
+            response = self.client.post(url, {'username': 'newcomer'})
+        self.assertEqual(response.json()['member_count'], 6)
+
+    def test_history_page_of_50_messages(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/room/v1/messages/{self.room.slug}/')
+        self.assertEqual(len(response.json()['results']), 50)
+
+    def test_admin_room_changelist(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(5):
+            response = self.client.get('/admin/app_room/room/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_message_changelist(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(6):
+            response = self.client.get('/admin/app_room/message/')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,83 @@
+"""
+Rate limit buckets of the message scope, upload throttle order
+"""
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.parsers import MultiPartParser
+
+from app_room.services.rate_limit import LocalRateLimiter, RateLimiter
+
+UPLOAD_URL = '/api/room/v1/upload-image/'
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile('red.png', buffer.getvalue(), 'image/png')
+
+
+class MessageRateLimitTests(SimpleTestCase):
+
+    def limiter(self):
+        return RateLimiter(LocalRateLimiter())
+
+    def test_busy_room_is_not_limited_by_default(self):
+        limiter = self.limiter()
+        for i in range(1000):
+            allowed, _ = limiter.check('message', user=f'user{i}', ip=f'10.0.{i // 250}.{i % 250}', room='general')
+            self.assertTrue(allowed)
+
+    def test_sender_is_limited(self):
+        limiter = self.limiter()
+        results = [limiter.check('message', user='alice', ip='10.0.0.1', room='general')[0] for _ in range(31)]
+        self.assertEqual(results.count(True), 30)
+        self.assertFalse(results[-1])
+
+    @override_settings(CHAT_RATE_LIMIT_MESSAGE='user=30/minute,room=100/minute')
+    def test_configured_room_bucket_applies(self):
+        limiter = self.limiter()
+        results = [limiter.check('message', user=f'user{i}', room='general')[0] for i in range(101)]
+        self.assertFalse(results[-1])
+
+
+@override_settings(CHAT_IMAGE_PROCESSING=False)
+class UploadThrottleTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        patcher = mock.patch(
+            'app_room.api.v1.throttling.rate_limit_throttles.get_rate_limiter',
+            return_value=RateLimiter(LocalRateLimiter())
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, username='alice'):
+        with mock.patch.object(MultiPartParser, 'parse', autospec=True, side_effect=MultiPartParser.parse) as parse:
+            response = self.client.post(UPLOAD_URL, {'username': username, 'image': png()})
+        return response, parse.call_count
+
+    @override_settings(CHAT_RATE_LIMIT_UPLOAD='ip=1/minute')
+    def test_ip_limit_is_checked_before_the_body_is_parsed(self):
+        self.assertEqual(self.upload()[0].status_code, 201)
+
+        response, parsed = self.upload()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(parsed, 0)
+
+    @override_settings(CHAT_RATE_LIMIT_UPLOAD='user=1/minute')
+    def test_guest_user_limit_is_taken_from_the_parsed_body(self):
+        self.assertEqual(self.upload('alice')[0].status_code, 201)
+        self.assertEqual(self.upload('alice')[0].status_code, 429)
+        self.assertEqual(self.upload('bob')[0].status_code, 201)
@@ -0,0 +1,24 @@
+"""
+Smoke test of the room page script (static/chat/js/room.js) under node
+"""
+import shutil
+import subprocess
+import unittest
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+HARNESS = Path(__file__).with_name('room_smoke.js')
+ROOM_JS = Path(settings.BASE_DIR) / 'static' / 'chat' / 'js' / 'room.js'
+
+
+@unittest.skipUnless(shutil.which('node'), 'node is not installed')
+class RoomScriptTests(SimpleTestCase):
+    def test_socket_handlers_and_keepalive(self):
+        """handlers are top level, typing / presence frames render, one keepalive across reconnects"""
+        result = subprocess.run(
+            ['node', str(HARNESS), str(ROOM_JS)],
+            capture_output=True, text=True, timeout=30
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
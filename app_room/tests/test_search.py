@@ -0,0 +1,82 @@
+"""
+Message search (services.search, SearchView)
+
+The basic backend runs everywhere; the PostgreSQL backend's matches need
+the column, trigger and indexes of migration 0013, so those tests run on
+PostgreSQL only.
+"""
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from app_room.models.room import Message, Room
+from app_room.services.search import BasicSearch, PostgresSearch
+
+
+@override_settings(CHAT_RATE_LIMIT_URL='')
+class SearchViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(username='alice')
+        cls.public = Room.objects.create(name='General', creator=cls.alice)
+        cls.private = Room.objects.create(name='Secret', creator=cls.alice, is_public=False)
+        Message.objects.create(user=cls.alice, content='hello public chat')
+        Message.objects.create(room=cls.public, user=cls.alice, content='hello general')
+        Message.objects.create(room=cls.private, user=cls.alice, content='hello secret')
+        Message.objects.create(room=cls.public, user=cls.alice, content='something else')
+
+    def search(self, **params):
+        return self.client.get('/api/room/v1/search/', params)
+
+    def test_anonymous_search_skips_private_rooms(self):
+        response = self.search(q='hello')
+
+        contents = [message['content'] for message in response.json()['messages']]
+        self.assertEqual(sorted(contents), ['hello general', 'hello public chat'])
+        self.assertIn('<mark>hello</mark>', response.json()['messages'][0]['highlight'])
+
+    def test_private_room_is_not_found_for_non_members(self):
+        self.assertEqual(self.search(q='hello', room=self.private.slug).status_code, 404)
+
+    def test_short_query_is_bad_request(self):
+        self.assertEqual(self.search(q='h').status_code, 400)
+
+
+class PostgresSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='alice')
+        Message.objects.create(user=user, content='the meeting is tomorrow')
+        Message.objects.create(user=user, content='lunch at noon')
+
+    def sql(self, search, query):
+        return str(search.filter(Message.objects.all(), query).query)
+
+    def test_similarity_match_only_with_a_threshold(self):
+        self.assertIn('<%', self.sql(PostgresSearch(0.6), 'meting'))
+        self.assertNotIn('<%', self.sql(PostgresSearch(0), 'meting'))
+        # no trigram in two characters
+        self.assertNotIn('<%', self.sql(PostgresSearch(0.6), 'me'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'migration 0013 objects exist on PostgreSQL only')
+    def test_misspelled_word_matches(self):
+        messages = PostgresSearch(0.6).filter(Message.objects.all(), 'meting')
+        self.assertEqual(list(messages.values_list('content', flat=True)), ['the meeting is tomorrow'])
+        self.assertFalse(PostgresSearch(0).filter(Message.objects.all(), 'meting').exists())
+
+    @skipUnless(connection.vendor == 'postgresql', 'migration 0013 objects exist on PostgreSQL only')
+    def test_trigger_keeps_the_search_vector(self):
+        message = Message.objects.get(content='lunch at noon')
+        message.content = 'dinner at eight'
+        message.save()
+
+        self.assertTrue(PostgresSearch().filter(Message.objects.all(), 'dinner').filter(pk=message.pk).exists())
+
+    def test_basic_search_needs_every_term(self):
+        messages = BasicSearch().filter(Message.objects.all(), 'meeting tomorrow')
+        self.assertEqual(messages.count(), 1)
+        self.assertFalse(BasicSearch().filter(Message.objects.all(), 'meeting noon').exists())
@@ -0,0 +1,110 @@
+"""
+Streaming image upload (ImageUploadConsumer) under ASGI
+"""
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+from app_room.api.v1.consumers.upload_consumers import ImageUploadConsumer
+from app_room.models.room import Message
+from app_room.services.rate_limit import LocalRateLimiter, RateLimiter
+
+URL = '/api/room/v1/upload-image/'
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile('red.png', buffer.getvalue(), 'image/png')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CHAT_IMAGE_PROCESSING=False, ALLOWED_HOSTS=['testserver'])
+class ImageUploadConsumerTests(TransactionTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def communicator(self, body, headers=()):
+        scope = {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': 'POST',
+            'path': URL,
+            'raw_path': URL.encode(),
+            'query_string': b'',
+            'scheme': 'http',
+            'server': ('testserver', 80),
+            'client': ('10.0.0.1', 5000),
+            'headers': [
+                (b'host', b'testserver'),
+                (b'content-type', MULTIPART_CONTENT.encode()),
+                (b'content-length', str(len(body)).encode()),
+                *headers,
+            ],
+        }
+        return ApplicationCommunicator(ImageUploadConsumer.as_asgi(), scope)
+
+    async def upload(self, body, headers=(), chunk_size=1024):
+        communicator = self.communicator(body, headers)
+        for start in range(0, len(body), chunk_size):
+            await communicator.send_input({
+                'type': 'http.request',
+                'body': body[start:start + chunk_size],
+                'more_body': start + chunk_size < len(body),
+            })
+        return await self.response(communicator)
+
+    async def response(self, communicator):
+        start = await communicator.receive_output()
+        body = await communicator.receive_output()
+        return start['status'], dict(start['headers']), body['body']
+
+    async def test_upload_spooled_to_disk_is_saved(self):
+        body = encode_multipart(BOUNDARY, {'username': 'alice', 'image': png()})
+        with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100):
+            status, headers, _ = await self.upload(body, chunk_size=64)
+
+        self.assertEqual(status, 201)
+        self.assertEqual(await Message.objects.filter(message_type='image').acount(), 1)
+        # SecurityMiddleware / XFrameOptionsMiddleware headers
+        self.assertEqual(headers[b'x-content-type-options'], b'nosniff')
+        self.assertEqual(headers[b'x-frame-options'], b'DENY')
+
+    @override_settings(CHAT_RATE_LIMIT_UPLOAD='ip=1/minute')
+    async def test_ip_limit_is_checked_before_the_body_is_read(self):
+        body = encode_multipart(BOUNDARY, {'username': 'alice', 'image': png()})
+        limiter = RateLimiter(LocalRateLimiter())
+        with mock.patch('app_room.api.v1.consumers.upload_consumers.get_rate_limiter', return_value=limiter):
+            self.assertEqual((await self.upload(body))[0], 201)
+
+            communicator = self.communicator(body)
+            await communicator.send_input({'type': 'http.request', 'body': body[:100], 'more_body': True})
+            status, headers, _ = await self.response(communicator)
+
+        self.assertEqual(status, 429)
+        self.assertIn(b'retry-after', headers)
+
+    async def test_logged_in_session_needs_a_csrf_token(self):
+        user = await User.objects.acreate(username='alice')
+        await sync_to_async(self.client.force_login)(user)
+        cookie = f'sessionid={self.client.cookies["sessionid"].value}'.encode()
+        body = encode_multipart(BOUNDARY, {'username': 'alice', 'image': png()})
+
+        status, _, _ = await self.upload(body, [(b'cookie', cookie)])
+
+        self.assertEqual(status, 403)
+        self.assertFalse(await Message.objects.aexists())
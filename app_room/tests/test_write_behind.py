@@ -0,0 +1,161 @@
+"""
+Write-behind persistence (services.write_behind)
+
+TransactionTestCase: the writer commits its own transactions. Batch size
+and max lag are large, so the flusher thread never runs during a test and
+flush() persists in the test thread.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils.dateparse import parse_datetime
+
+from app_room.models.room import Message, Room
+from app_room.services.write_behind import DEAD_LETTER_SUFFIX, JOURNAL_SUFFIX, WriteBehindWriter
+
+
+class WriteBehindWriterTests(TransactionTestCase):
+
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir, ignore_errors=True)
+        self.room = Room.objects.create(name='General')
+
+    def writer(self):
+        writer = WriteBehindWriter(self.journal_dir, batch_size=1000, max_lag=60)
+        self.addCleanup(writer.close)
+        return writer
+
+    def crash(self, writer):
+        """Stop the flusher and release the journal like a dead process would"""
+        with writer._cond:
+            writer._stopping = True
+            writer._cond.notify()
+        writer._thread.join()
+        for segment in writer._segments + [writer._segment]:
+            if segment is not None:
+                segment.close()
+        writer._pending, writer._segments, writer._segment = [], [], None
+
+    def files(self, suffix):
+        return [name for name in os.listdir(self.journal_dir) if name.endswith(suffix)]
+
+    def test_enqueue_journals_before_saving(self):
+        writer = self.writer()
+        provisional_id, timestamp = writer.enqueue('alice', 'hello', self.room.id)
+
+        self.assertFalse(Message.objects.exists())
+        [segment] = self.files(JOURNAL_SUFFIX)
+        with open(os.path.join(self.journal_dir, segment), encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(entry['id'], provisional_id)
+        self.assertEqual(entry['timestamp'], timestamp)
+
+    def test_flush_saves_the_broadcast_timestamp_and_removes_the_journal(self):
+        writer = self.writer()
+        provisional_id, timestamp = writer.enqueue('alice', 'hello', self.room.id)
+        writer.enqueue('bob', 'hi', None)
+        writer.flush()
+
+        message = Message.objects.get(provisional_id=provisional_id)
+        self.assertEqual(message.content, 'hello')
+        self.assertEqual(message.room_id, self.room.id)
+        self.assertEqual(message.timestamp, parse_datetime(timestamp))
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(self.files(JOURNAL_SUFFIX), [])
+
+    def test_bad_entry_is_dead_lettered_and_does_not_block_others(self):
+        writer = self.writer()
+        writer.enqueue(None, 'no username', self.room.id)
+        writer.enqueue('bob', 'hi', self.room.id)
+        writer.flush()
+
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['hi'])
+        self.assertEqual(writer._pending, [])
+        self.assertEqual(self.files(JOURNAL_SUFFIX), [])
+        [dead_letter] = self.files(DEAD_LETTER_SUFFIX)
+        with open(os.path.join(self.journal_dir, dead_letter), encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.readline())['entry']['content'], 'no username')
+
+        writer.enqueue('carol', 'later', self.room.id)
+        writer.flush()
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_crashed_journal_is_replayed_with_its_timestamps(self):
+        crashed = self.writer()
+        provisional_id, timestamp = crashed.enqueue('alice', 'before the crash', self.room.id)
+        self.crash(crashed)
+
+        writer = self.writer()
+        writer.enqueue('bob', 'after the restart', self.room.id)
+        writer.flush()
+
+        message = Message.objects.get(provisional_id=provisional_id)
+        self.assertEqual(message.timestamp, parse_datetime(timestamp))
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(self.files(JOURNAL_SUFFIX), [])
+
+    def test_replay_of_saved_messages_does_not_duplicate(self):
+        crashed = self.writer()
+        crashed.enqueue('alice', 'saved once', self.room.id)
+        [segment] = self.files(JOURNAL_SUFFIX)
+        with open(os.path.join(self.journal_dir, segment), encoding='utf-8') as f:
+            journal = f.read()
+        crashed.flush()
+        self.crash(crashed)
+        # crashed after the commit, before the segment was deleted
+        with open(os.path.join(self.journal_dir, 'old' + JOURNAL_SUFFIX), 'w', encoding='utf-8') as f:
+            f.write(journal)
+
+        writer = self.writer()
+        writer.enqueue('bob', 'new', self.room.id)
+        writer.flush()
+
+        self.assertEqual(Message.objects.filter(content='saved once').count(), 1)
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(User.objects.filter(username='alice').count(), 1)
+
+    def test_concurrent_flushes_commit_a_batch_once(self):
+        writer = self.writer()
+        writer.enqueue('alice', 'hello', self.room.id)
+        persist = writer._persist
+        persisting, release = threading.Event(), threading.Event()
+        errors = []
+
+        def slow_persist(batch):
+            persisting.set()
+            release.wait(5)
+            persist(batch)
+
+        def flush():
+            try:
+                writer.flush()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        with mock.patch.object(writer, '_persist', side_effect=slow_persist) as patched:
+            # the flusher thread mid-commit, close() (atexit) flushing meanwhile
+            committing = threading.Thread(target=flush)
+            committing.start()
+            persisting.wait(5)
+            closing = threading.Thread(target=flush)
+            closing.start()
+            closing.join(0.2)
+            release.set()
+            committing.join(5)
+            closing.join(5)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(writer._segments, [])
+        self.assertEqual(self.files(JOURNAL_SUFFIX), [])
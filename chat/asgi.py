@@ -1,5 +1,7 @@
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.urls import re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 
@@ -10,10 +12,19 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat.settings')
 django_asgi_app = get_asgi_application()
 
 # Import routing after Django is initialized
-from chat.routing import websocket_urlpatterns
+from chat.routing import http_urlpatterns, websocket_urlpatterns
+
+# streaming consumers (image upload) first, everything else to Django
+if settings.CHAT_ASYNC_UPLOADS:
+    http_app = URLRouter([
+        *http_urlpatterns,
+        re_path(r'', django_asgi_app),
+    ])
+else:
+    http_app = django_asgi_app
 
 application = ProtocolTypeRouter({
-    "http": django_asgi_app,
+    "http": http_app,
     "websocket": AuthMiddlewareStack( # AuthMiddlewareStack is used to authenticate the user
         URLRouter(
             websocket_urlpatterns
@@ -1,6 +1,11 @@
 from app_room.routing import websocket_urlpatterns as room_ws
+from app_room.routing import http_urlpatterns as room_http
 
 
 websocket_urlpatterns = [
     *room_ws,
 ]
+
+http_urlpatterns = [
+    *room_http,
+]
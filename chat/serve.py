@@ -0,0 +1,188 @@
+"""
+Static and media file serving (CHAT_SERVE_FILES)
+
+For deployments where Django itself answers /static/ and /media/ (no nginx
+in front):
+- static files come from STATIC_ROOT (collectstatic, see chat.storage);
+  the precompressed .br / .gz variant is sent when the client accepts it
+- content-hashed static names get `Cache-Control: public, max-age=31536000,
+  immutable`, other files `no-cache` with ETag / Last-Modified (304s)
+- media files (chat_images/...) support Range requests (206), the
+  thumbnail / medium variants are immutable
+- whole files go out as FileResponse, which WSGI servers send with
+  sendfile (wsgi.file_wrapper)
+
+With DEBUG, static files missing from STATIC_ROOT are looked up with the
+staticfiles finders, so development works without collectstatic.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# room.3f2a9c1b7e4d.css (ManifestStaticFilesStorage names)
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+# media written once and never replaced (services.images variants)
+IMMUTABLE_MEDIA = ('chat_images/thumbs/', 'chat_images/medium/')
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        if re.fullmatch(r'\s*q=0(\.0*)?\s*', params):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _resolve(root, path):
+    try:
+        full_path = safe_join(root, path)
+    except ValueError:
+        raise Http404('Not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Not found')
+    return full_path
+
+
+def _etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _byte_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to send all, False if unsatisfiable"""
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, cache_control, content_type=None, encoding=None, ranges=False):
+    """Response for a local file: conditional, optionally Range-aware"""
+    stat = os.stat(path)
+    etag = _etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+    }
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+        headers['Vary'] = 'Accept-Encoding'
+    if ranges:
+        headers['Accept-Ranges'] = 'bytes'
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response.headers[name] = value
+        return response
+
+    byte_range = None
+    if ranges and request.method == 'GET':
+        # If-Range: only a range of the version the client has
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None or if_range.strip() == etag:
+            byte_range = _byte_range(request.META.get('HTTP_RANGE'), stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response.headers['Content-Length'] = str(end - start + 1)
+    for name, value in headers.items():
+        response.headers[name] = value
+    return response
+
+
+@require_safe
+def serve_static(request, path):
+    """GET /static/<path> from STATIC_ROOT, precompressed when accepted"""
+    try:
+        full_path = _resolve(settings.STATIC_ROOT, path)
+    except Http404:
+        found = finders.find(path) if settings.DEBUG else None
+        if not found:
+            raise
+        full_path = found
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    cache_control = IMMUTABLE if HASHED_NAME.search(path) else REVALIDATE
+
+    accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return file_response(request, full_path + suffix, cache_control, content_type, encoding)
+    response = file_response(request, full_path, cache_control, content_type)
+    if any(os.path.isfile(full_path + suffix) for _, suffix in ENCODINGS):
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """GET /media/<path> from MEDIA_ROOT with Range support"""
+    full_path = _resolve(settings.MEDIA_ROOT, path)
+    content_type, _ = mimetypes.guess_type(full_path)
+    cache_control = IMMUTABLE if path.startswith(IMMUTABLE_MEDIA) else REVALIDATE
+    return file_response(
+        request, full_path, cache_control, content_type or 'application/octet-stream', ranges=True
+    )
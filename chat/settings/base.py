@@ -92,10 +92,129 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# collectstatic writes content-hashed names (staticfiles.json) plus .gz / .br
+# variants (chat.storage); templates then link the hashed, immutable URLs
+CHAT_STATIC_MANIFEST = os.environ.get('CHAT_STATIC_MANIFEST', 'True').lower() in ('true', '1', 'yes')
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'chat.storage.CompressedManifestStaticFilesStorage' if CHAT_STATIC_MANIFEST
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+# Django serves /static/ and /media/ itself (chat.serve): precompressed
+# variants, immutable cache headers, Range requests. Off behind nginx.
+CHAT_SERVE_FILES = os.environ.get('CHAT_SERVE_FILES', 'True').lower() in ('true', '1', 'yes')
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Write-behind persistence for WebSocket text messages
+# (broadcast first, persist in batches within CHAT_WRITE_BEHIND_MAX_LAG seconds)
+CHAT_WRITE_BEHIND = os.environ.get('CHAT_WRITE_BEHIND', 'False').lower() in ('true', '1', 'yes')
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('CHAT_WRITE_BEHIND_BATCH_SIZE', '100'))
+CHAT_WRITE_BEHIND_MAX_LAG = float(os.environ.get('CHAT_WRITE_BEHIND_MAX_LAG', '0.05'))
+CHAT_WRITE_BEHIND_FSYNC = os.environ.get('CHAT_WRITE_BEHIND_FSYNC', 'False').lower() in ('true', '1', 'yes')
+CHAT_WRITE_BEHIND_JOURNAL_DIR = os.environ.get('CHAT_WRITE_BEHIND_JOURNAL_DIR', str(BASE_DIR / 'journal'))
+
+# Identity cache (room slug -> Room, username -> User) on the hot path
+# SHARED=True also stores entries in CACHES['default'] (Redis)
+CHAT_IDENTITY_CACHE_SIZE = int(os.environ.get('CHAT_IDENTITY_CACHE_SIZE', '1024'))
+CHAT_IDENTITY_CACHE_TTL = int(os.environ.get('CHAT_IDENTITY_CACHE_TTL', '30'))
+CHAT_IDENTITY_CACHE_SHARED = os.environ.get('CHAT_IDENTITY_CACHE_SHARED', 'False').lower() in ('true', '1', 'yes')
+
+# Private rooms accept WebSocket connections from members only
+CHAT_PRIVATE_ROOMS_MEMBERS_ONLY = os.environ.get('CHAT_PRIVATE_ROOMS_MEMBERS_ONLY', 'False').lower() in ('true', '1', 'yes')
+
+# Coalesce window for public chat (rooms use Room.coalesce_window_ms), 0 = off
+CHAT_PUBLIC_COALESCE_WINDOW_MS = int(os.environ.get('CHAT_PUBLIC_COALESCE_WINDOW_MS', '0'))
+
+# Per-connection send queue: frames queued for a slow client before
+# CHAT_SEND_QUEUE_POLICY applies (drop_oldest | coalesce | disconnect)
+CHAT_SEND_QUEUE_MAX = int(os.environ.get('CHAT_SEND_QUEUE_MAX', '256'))
+CHAT_SEND_QUEUE_POLICY = os.environ.get('CHAT_SEND_QUEUE_POLICY', 'drop_oldest')
+
+# Messages replayed to a reconnecting socket (?last_message_id=), more = reload history
+CHAT_RESUME_MAX_MESSAGES = int(os.environ.get('CHAT_RESUME_MAX_MESSAGES', '200'))
+
+# Recent messages per room, serves the first history page without the database
+# '' = off, 'local://' = in-process (single process only), 'redis://...' = shared
+# SIZE must be larger than the history page size (50)
+CHAT_RECENT_MESSAGES_URL = os.environ.get('CHAT_RECENT_MESSAGES_URL', '')
+CHAT_RECENT_MESSAGES_SIZE = int(os.environ.get('CHAT_RECENT_MESSAGES_SIZE', '100'))
+CHAT_RECENT_MESSAGES_TTL = int(os.environ.get('CHAT_RECENT_MESSAGES_TTL', '86400'))
+
+# Presence (connected users per room)
+# '' = off, 'local://' = in-process (single process only), 'redis://...' = shared
+# connections are refreshed every HEARTBEAT seconds and expire after TTL,
+# join/leave deltas go out at most once per DEBOUNCE_MS per room,
+# new sockets get the usernames online if there are at most LIST_MAX
+CHAT_PRESENCE_URL = os.environ.get('CHAT_PRESENCE_URL', '')
+CHAT_PRESENCE_HEARTBEAT = int(os.environ.get('CHAT_PRESENCE_HEARTBEAT', '30'))
+CHAT_PRESENCE_TTL = int(os.environ.get('CHAT_PRESENCE_TTL', '90'))
+CHAT_PRESENCE_DEBOUNCE_MS = int(os.environ.get('CHAT_PRESENCE_DEBOUNCE_MS', '1000'))
+CHAT_PRESENCE_LIST_MAX = int(os.environ.get('CHAT_PRESENCE_LIST_MAX', '100'))
+
+# Ephemeral events (typing, read cursors): one change per kind per user and room every
+# MIN_INTERVAL_MS, relayed per room once every WINDOW_MS (latest state per user)
+CHAT_EPHEMERAL_MIN_INTERVAL_MS = int(os.environ.get('CHAT_EPHEMERAL_MIN_INTERVAL_MS', '1000'))
+CHAT_EPHEMERAL_WINDOW_MS = int(os.environ.get('CHAT_EPHEMERAL_WINDOW_MS', '250'))
+
+# Rate limiting (token buckets): '' = off, 'local://' = per process, 'redis://...' = shared
+# per scope 'kind=N/period,...' with kinds user, ip, room; empty = no limit.
+# No room bucket on messages: it would drop everyone's messages in a busy room
+CHAT_RATE_LIMIT_URL = os.environ.get('CHAT_RATE_LIMIT_URL', 'local://')
+CHAT_RATE_LIMIT_WS_FRAME = os.environ.get('CHAT_RATE_LIMIT_WS_FRAME', 'ip=1200/minute')
+CHAT_RATE_LIMIT_MESSAGE = os.environ.get('CHAT_RATE_LIMIT_MESSAGE', 'user=30/minute,ip=120/minute')
+CHAT_RATE_LIMIT_UPLOAD = os.environ.get('CHAT_RATE_LIMIT_UPLOAD', 'user=10/minute,ip=20/minute,room=60/minute')
+CHAT_RATE_LIMIT_ROOM_CREATE = os.environ.get('CHAT_RATE_LIMIT_ROOM_CREATE', 'user=5/hour,ip=10/hour')
+CHAT_RATE_LIMIT_ROOM_JOIN = os.environ.get('CHAT_RATE_LIMIT_ROOM_JOIN', 'user=30/minute,ip=60/minute')
+CHAT_RATE_LIMIT_SEARCH = os.environ.get('CHAT_RATE_LIMIT_SEARCH', 'user=30/minute,ip=60/minute')
+
+# Uploaded images: metadata stripped, WebP thumbnail / medium variants made in
+# the background by WORKERS processes (0 = in a thread), then the room is notified
+CHAT_IMAGE_PROCESSING = os.environ.get('CHAT_IMAGE_PROCESSING', 'True').lower() in ('true', '1', 'yes')
+CHAT_IMAGE_WORKERS = int(os.environ.get('CHAT_IMAGE_WORKERS', '2'))
+CHAT_IMAGE_THUMBNAIL_SIZE = int(os.environ.get('CHAT_IMAGE_THUMBNAIL_SIZE', '320'))
+CHAT_IMAGE_MEDIUM_SIZE = int(os.environ.get('CHAT_IMAGE_MEDIUM_SIZE', '1280'))
+CHAT_IMAGE_QUALITY = int(os.environ.get('CHAT_IMAGE_QUALITY', '80'))
+
+# Image uploads: size cap in bytes; under ASGI, POST /api/room/v1/upload-image/
+# is served by a streaming consumer that rejects oversized bodies while reading
+CHAT_UPLOAD_MAX_SIZE = int(os.environ.get('CHAT_UPLOAD_MAX_SIZE', str(5 * 1024 * 1024)))
+CHAT_ASYNC_UPLOADS = os.environ.get('CHAT_ASYNC_UPLOADS', 'True').lower() in ('true', '1', 'yes')
+
+# Uploads are hashed while they are parsed; with CHAT_IMAGE_DEDUPE each distinct
+# image is stored (and processed) once, chat_images/<digest>.<ext>
+FILE_UPLOAD_HANDLERS = [
+    'app_room.services.blobs.HashingMemoryFileUploadHandler',
+    'app_room.services.blobs.HashingTemporaryFileUploadHandler',
+]
+CHAT_IMAGE_DEDUPE = os.environ.get('CHAT_IMAGE_DEDUPE', 'True').lower() in ('true', '1', 'yes')
+
+# Hot / archive split: manage.py archive_messages moves messages older than
+# AFTER_DAYS to ArchivedMessage, BATCH_SIZE rows per transaction
+CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', '90'))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.environ.get('CHAT_ARCHIVE_BATCH_SIZE', '1000'))
+
+# Message search (GET /api/room/v1/search/): auto | postgres | basic
+# postgres: tsvector + pg_trgm GIN indexes (migration 0013), basic: icontains scan.
+# SIMILARITY_THRESHOLD: postgres also matches misspelled words (pg_trgm
+# word_similarity at least this, 0 to 1; 0 = off), higher is stricter
+CHAT_SEARCH_BACKEND = os.environ.get('CHAT_SEARCH_BACKEND', 'auto')
+CHAT_SEARCH_SIMILARITY_THRESHOLD = float(os.environ.get('CHAT_SEARCH_SIMILARITY_THRESHOLD', '0.6'))
+CHAT_SEARCH_MIN_LENGTH = int(os.environ.get('CHAT_SEARCH_MIN_LENGTH', '2'))
+CHAT_SEARCH_SNIPPET_SIZE = int(os.environ.get('CHAT_SEARCH_SNIPPET_SIZE', '160'))
+
+# JSON codec for WebSocket frames: auto | json | orjson | msgspec
+CHAT_JSON_CODEC = os.environ.get('CHAT_JSON_CODEC', 'auto')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,63 @@
+"""
+Channel layer configuration built from environment variables.
+
+- CHANNEL_LAYER_BACKEND: 'core' (RedisChannelLayer, default) or 'pubsub' (RedisPubSubChannelLayer)
+- CHANNEL_REDIS_URLS: comma-separated Redis URLs, one per shard
+  (channels and groups are consistent-hashed over the shards)
+- CHANNEL_REDIS_URL: single Redis URL, used when CHANNEL_REDIS_URLS is not set
+- CHANNEL_REDIS_POOL_SIZE: max connections per shard pool
+- CHANNEL_LAYER_CAPACITY / CHANNEL_LAYER_EXPIRY / CHANNEL_LAYER_GROUP_EXPIRY (core only)
+- CHANNEL_LAYER_CHANNEL_CAPACITY: capacity per channel name pattern (core only),
+  e.g. "http.request=200,specific.*=500"
+"""
+import os
+
+
+def build_channel_layers(default_url):
+    """Return a CHANNEL_LAYERS dict for the configured backend and shards"""
+    urls = os.environ.get('CHANNEL_REDIS_URLS') or os.environ.get('CHANNEL_REDIS_URL', default_url)
+    pool_size = os.environ.get('CHANNEL_REDIS_POOL_SIZE')
+    
+    hosts = []
+    for url in urls.split(','):
+        if not url.strip():
+            continue
+        host = {'address': url.strip()}
+        if pool_size:
+            host['max_connections'] = int(pool_size)
+        hosts.append(host)
+    
+    if os.environ.get('CHANNEL_LAYER_BACKEND', 'core') == 'pubsub':
+        return {
+            'default': {
+                'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+                'CONFIG': {
+                    'hosts': hosts,
+                },
+            },
+        }
+    
+    config = {
+        'hosts': hosts,
+        # messages buffered per channel before new ones are dropped
+        'capacity': int(os.environ.get('CHANNEL_LAYER_CAPACITY', '100')),
+        # seconds an undelivered message lives
+        'expiry': int(os.environ.get('CHANNEL_LAYER_EXPIRY', '60')),
+        # seconds a channel stays in a group without re-joining
+        'group_expiry': int(os.environ.get('CHANNEL_LAYER_GROUP_EXPIRY', '86400')),
+    }
+    
+    channel_capacity = {}
+    for item in os.environ.get('CHANNEL_LAYER_CHANNEL_CAPACITY', '').split(','):
+        if '=' in item:
+            pattern, capacity = item.rsplit('=', 1)
+            channel_capacity[pattern.strip()] = int(capacity)
+    if channel_capacity:
+        config['channel_capacity'] = channel_capacity
+    
+    return {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': config,
+        },
+    }
@@ -2,6 +2,7 @@
 Development settings for ChatPage project.
 """
 from .base import *
+from .channel_layers import build_channel_layers
 
 DEBUG = True
 
@@ -41,14 +42,7 @@ CACHES = {
 }
 
 # Channels configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [('redis', 6379)],
-        },
-    },
-}
+CHANNEL_LAYERS = build_channel_layers('redis://redis:6379/0')
 
 # Logging configuration for development
 LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -3,6 +3,7 @@ Production settings for ChatPage project.
 """
 import os
 from .base import *
+from .channel_layers import build_channel_layers
 
 DEBUG = False
 
@@ -49,6 +50,9 @@ CACHES = {
     }
 }
 
+# Channels configuration (Redis channel layer, sharding/pooling from the environment)
+CHANNEL_LAYERS = build_channel_layers('redis://127.0.0.1:6379/2')
+
 # Session configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
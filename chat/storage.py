@@ -0,0 +1,60 @@
+"""
+Static files storage with hashed names and precompressed variants
+
+collectstatic with CompressedManifestStaticFilesStorage:
+- copies every file under a content-hashed name as well
+  (room.css -> room.3f2a9c1b7e4d.css, mapped in staticfiles.json), so the
+  hashed URLs {% static %} produces can be cached forever
+- writes a .gz (and, with the optional `brotli` package, a .br) next to
+  each text asset that compresses by at least 5%
+
+chat.serve sends the precompressed file the client accepts; nginx can do
+the same with `gzip_static on;` / `brotli_static on;`.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico')
+
+# not worth a second request header's worth of bytes
+MIN_COMPRESS_SIZE = 256
+
+
+def compress(data):
+    """{'.gz': bytes, '.br': bytes} variants smaller than 95% of data"""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data) * 0.95}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz / .br variants"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = self.path(name)
+            if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            for suffix, body in compress(data).items():
+                with open(path + suffix, 'wb') as f:
+                    f.write(body)
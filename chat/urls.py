@@ -1,8 +1,9 @@
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.urls import include
 from django.conf import settings
 from django.conf.urls.static import static
+from chat.serve import serve_media, serve_static
 
 
 urlpatterns = [
@@ -19,7 +20,15 @@ if (
 ):
     # debug toolbar
     urlpatterns += [path("__debug__/", include("debug_toolbar.urls"))]
-    # media files in development
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    # static files in development
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    if not settings.CHAT_SERVE_FILES:
+        # media files in development
+        urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+        # static files in development
+        urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+
+if settings.CHAT_SERVE_FILES:
+    # static / media with cache headers, precompressed variants and Range (chat.serve)
+    urlpatterns += [
+        re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.+)$', serve_static),
+        re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$', serve_media),
+    ]
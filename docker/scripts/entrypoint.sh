@@ -45,11 +45,31 @@ python manage.py collectstatic --noinput --clear
 # Create logs directory if it doesn't exist
 mkdir -p /app/logs
 
+# Server mode: asgi (HTTP + WebSocket, default) or wsgi (HTTP only)
+SERVER_MODE=${SERVER_MODE:-asgi}
+WEB_WORKERS=${WEB_WORKERS:-4}
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+  # Gunicorn process manager + Uvicorn workers (one event loop per worker)
+  # No --max-requests: recycling a worker drops all of its WebSockets
+  echo "🎯 Starting Gunicorn server with Uvicorn workers (ASGI)..."
+  exec gunicorn chat.asgi:application \
+      --bind 0.0.0.0:8000 \
+      --workers "$WEB_WORKERS" \
+      --worker-class uvicorn_worker.UvicornWorker \
+      --timeout ${WEB_TIMEOUT:-30} \
+      --graceful-timeout ${WEB_GRACEFUL_TIMEOUT:-30} \
+      --keep-alive ${WEB_KEEP_ALIVE:-5} \
+      --access-logfile /app/logs/gunicorn_access.log \
+      --error-logfile /app/logs/gunicorn_error.log \
+      --log-level info
+fi
+
 # Start Gunicorn with proper configuration
-echo "🎯 Starting Gunicorn server..."
+echo "🎯 Starting Gunicorn server (WSGI, no WebSocket)..."
 exec gunicorn chat.wsgi:application \
     --bind 0.0.0.0:8000 \
-    --workers 4 \
+    --workers "$WEB_WORKERS" \
     --worker-class gevent \
     --worker-connections 1000 \
     --max-requests 1000 \
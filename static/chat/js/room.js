@@ -0,0 +1,561 @@
+// Room info from the template (data attributes on <body>)
+const roomSlug = document.body.dataset.roomSlug;
+const roomName = document.body.dataset.roomName;
+
+// Elements
+const chatMessages = document.getElementById('chat-messages');
+const messageInput = document.getElementById('message-input');
+const usernameInput = document.getElementById('username-input');
+const usernameSetup = document.getElementById('username-setup');
+const usernameConfirm = document.getElementById('username-confirm');
+const currentUserDisplay = document.getElementById('current-user-display');
+const sendButton = document.getElementById('send-button');
+const attachButton = document.getElementById('attach-button');
+const imageInput = document.getElementById('image-input');
+const imagePreview = document.getElementById('image-preview');
+const previewImg = document.getElementById('preview-img');
+const previewClose = document.getElementById('preview-close');
+const loadingIndicator = document.getElementById('loading-indicator');
+const connectionStatus = document.getElementById('connection-status');
+const onlineCount = document.getElementById('online-count');
+const typingIndicator = document.getElementById('typing-indicator');
+
+// Pagination state (keyset cursor from the history API)
+let nextCursor = null;
+let isLoadingHistory = false;
+let hasMoreMessages = true;
+
+// Resume state: newest message id seen, ids already displayed
+let lastMessageId = null;
+let historyLoaded = false;
+const seenMessages = new Set();
+
+// Presence: usernames online (full list only in small rooms)
+let onlineUsers = new Set();
+
+// Typing: others typing (username -> expiry timer), our own state
+const typingUsers = new Map();
+let isTyping = false;
+let typingTimer = null;
+
+// Username management
+let currentUsername = localStorage.getItem('chatUsername') || '';
+
+if (!currentUsername) {
+    usernameSetup.classList.add('show');
+} else {
+    currentUserDisplay.textContent = currentUsername;
+}
+
+usernameConfirm.onclick = function() {
+    const username = usernameInput.value.trim();
+    if (username) {
+        currentUsername = username;
+        localStorage.setItem('chatUsername', username);
+        currentUserDisplay.textContent = username;
+        usernameSetup.classList.remove('show');
+
+        // reconnect, so presence knows the name (missed messages are resumed)
+        if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+            chatSocket.close(4000);
+        }
+    }
+};
+
+usernameInput.addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        usernameConfirm.click();
+    }
+});
+
+// History is fetched with ?compact=1: usernames come from the
+// page's users table, keyed by user_id
+function compactMessageData(page, message) {
+    return {
+        message_id: message.id,
+        username: page.users[message.user_id],
+        message: message.content,
+        message_type: message.message_type,
+        image_url: message.image_url,
+        thumbnail_url: message.thumbnail_url,
+        medium_url: message.medium_url,
+        image_width: message.image_width,
+        image_height: message.image_height,
+        timestamp: message.timestamp
+    };
+}
+
+async function loadInitialMessages() {
+    const loadingEl = document.getElementById('loadingMessages');
+
+    try {
+        const url = roomSlug === 'public_chat' 
+            ? '/api/room/v1/messages/?compact=1'
+            : `/api/room/v1/messages/${roomSlug}/?compact=1`;
+
+        const response = await fetch(url);
+        const page = await response.json();
+        const messages = page.messages;
+
+        if (loadingEl) {
+            loadingEl.remove();
+        }
+
+        console.log(`✅ بارگذاری ${messages.length} پیام`);
+
+        nextCursor = page.next;
+        hasMoreMessages = nextCursor !== null;
+
+        messages.reverse().forEach(message => {
+            displayMessage(compactMessageData(page, message), false);
+        });
+
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+
+    } catch (error) {
+        console.error('Error loading messages:', error);
+        if (loadingEl) {
+            loadingEl.innerHTML = '<p style="color: #d32f2f;">خطا در بارگذاری پیام‌ها</p>';
+        }
+    }
+}
+
+function reloadMessages() {
+    chatMessages.querySelectorAll('.message').forEach(el => el.remove());
+    seenMessages.clear();
+    lastMessageId = null;
+    nextCursor = null;
+    hasMoreMessages = true;
+    loadInitialMessages();
+}
+
+async function loadMoreMessages() {
+    if (isLoadingHistory || !hasMoreMessages) {
+        return;
+    }
+
+    console.log(`🔄 درخواست before=${nextCursor}`);
+
+    isLoadingHistory = true;
+    const historyLoading = document.getElementById('history-loading');
+    historyLoading.classList.add('show');
+
+    // Save current scroll position
+    const previousScrollHeight = chatMessages.scrollHeight;
+    const previousScrollTop = chatMessages.scrollTop;
+
+    try {
+        const cursor = encodeURIComponent(nextCursor);
+        const url = roomSlug === 'public_chat' 
+            ? `/api/room/v1/messages/?compact=1&before=${cursor}`
+            : `/api/room/v1/messages/${roomSlug}/?compact=1&before=${cursor}`;
+
+        const response = await fetch(url);
+        const page = await response.json();
+        const messages = page.messages;
+        console.log(`✅ ${messages.length} پیام جدید`);
+
+        nextCursor = page.next;
+
+        if (messages.length === 0) {
+            hasMoreMessages = false;
+            historyLoading.innerHTML = '✓ همه پیام‌ها بارگذاری شدند';
+            setTimeout(() => {
+                historyLoading.classList.remove('show');
+            }, 2000);
+        } else {
+            if (nextCursor === null) {
+                hasMoreMessages = false;
+            }
+
+            // Insert messages at the top (after the loading indicator)
+            const messagesReversed = messages.reverse();
+            messagesReversed.forEach(message => {
+                displayMessage(compactMessageData(page, message), true);
+            });
+
+            // Restore scroll position to maintain user's view
+            const newScrollHeight = chatMessages.scrollHeight;
+            chatMessages.scrollTop = previousScrollTop + (newScrollHeight - previousScrollHeight);
+
+            historyLoading.classList.remove('show');
+        }
+    } catch (error) {
+        console.error('Error loading more messages:', error);
+        historyLoading.innerHTML = '❌ خطا در بارگذاری پیام‌ها';
+        setTimeout(() => {
+            historyLoading.classList.remove('show');
+        }, 2000);
+    } finally {
+        isLoadingHistory = false;
+    }
+}
+
+// Scroll event listener for infinite scroll
+chatMessages.addEventListener('scroll', function() {
+    const scrollTop = chatMessages.scrollTop;
+
+    // Trigger loading when user is within 200px of the top
+    if (scrollTop < 200 && !isLoadingHistory && hasMoreMessages) {
+        console.log('📥 بارگذاری خودکار پیام‌های قدیمی‌تر...');
+        loadMoreMessages();
+    }
+});
+
+// WebSocket connection
+const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+// batch=1: coalesced messages arrive as one {type: 'batch'} frame
+// last_message_id: on reconnect the server replays what was missed
+let chatSocket = null;
+let reconnectDelay = 1000;
+
+function socketUrl() {
+    let url = protocol + '//' + window.location.host + '/ws/chat/' + roomSlug + '/?batch=1';
+    if (lastMessageId !== null) {
+        url += '&last_message_id=' + lastMessageId;
+    }
+    if (currentUsername) {
+        url += '&username=' + encodeURIComponent(currentUsername);
+    }
+    return url;
+}
+
+function connectSocket() {
+    chatSocket = new WebSocket(socketUrl());
+
+    chatSocket.onopen = function() {
+        console.log('✓ متصل به سرور');
+        connectionStatus.classList.remove('show');
+        reconnectDelay = 1000;
+
+        if (!historyLoaded) {
+            // بارگذاری پیام‌های اولیه
+            historyLoaded = true;
+            loadInitialMessages();
+        } else if (lastMessageId === null) {
+            // nothing to resume from
+            reloadMessages();
+        }
+    };
+
+    chatSocket.onmessage = function(e) {
+        const data = JSON.parse(e.data);
+        if (data.type === 'batch') {
+            data.messages.forEach(message => displayMessage(message));
+        } else if (data.type === 'gap' || data.type === 'resync') {
+            // the server dropped frames for this (slow) connection
+            // or could not replay everything since lastMessageId
+            console.warn(`⚠️ ${data.dropped || ''} پیام دریافت نشد، بارگذاری دوباره تاریخچه`);
+            reloadMessages();
+        } else if (data.type === 'resumed') {
+            console.log(`✓ ${data.replayed} پیام از دست رفته دریافت شد`);
+        } else if (data.type === 'presence') {
+            updatePresence(data);
+        } else if (data.type === 'ephemeral') {
+            data.events.forEach(event => handleEphemeral(event));
+        } else if (data.type === 'pong') {
+            // keepalive answer
+        } else if (data.type === 'error' && data.code === 'rate_limited') {
+            // the frame was dropped by the server
+            typingIndicator.textContent = `⏳ ارسال بیش از حد مجاز، ${Math.ceil(data.retry_after)} ثانیه صبر کنید`;
+            setTimeout(renderTyping, data.retry_after * 1000);
+        } else {
+            displayMessage(data);
+        }
+    };
+
+    chatSocket.onerror = function(e) {
+        console.error('خطا در اتصال', e);
+        connectionStatus.classList.add('show');
+    };
+
+    chatSocket.onclose = function(e) {
+        if (e.code === 4000) {
+            // closed by us to reconnect with new parameters
+            connectSocket();
+            return;
+        }
+
+        console.error('اتصال بسته شد');
+        connectionStatus.classList.add('show');
+
+        // back off with jitter, so a deploy doesn't bring every client back at once
+        const delay = reconnectDelay * (0.5 + Math.random());
+        reconnectDelay = Math.min(reconnectDelay * 2, 30000);
+        setTimeout(function() {
+            console.log('تلاش برای اتصال مجدد...');
+            connectSocket();
+        }, delay);
+    };
+}
+
+// Presence frames: a snapshot on connect, then joined/left deltas
+function updatePresence(data) {
+    if (data.users) {
+        onlineUsers = new Set(data.users);
+    }
+    data.joined.forEach(username => onlineUsers.add(username));
+    data.left.forEach(username => onlineUsers.delete(username));
+
+    onlineCount.textContent = `🟢 ${data.online} آنلاین`;
+    // names only while the server sends the full list (small rooms)
+    onlineCount.title = data.online === onlineUsers.size ? [...onlineUsers].join('، ') : '';
+}
+
+// keepalive, so idle proxies don't drop the socket
+setInterval(function() {
+    if (chatSocket.readyState === WebSocket.OPEN) {
+        chatSocket.send(JSON.stringify({'message_type': 'ping'}));
+    }
+}, 25000);
+
+// Typing / read cursor events (never saved, latest state per user)
+function handleEphemeral(event) {
+    if (event.kind !== 'typing' || event.username === currentUsername) {
+        return;
+    }
+    clearTimeout(typingUsers.get(event.username));
+    if (event.typing) {
+        // expire on our side too, in case "stopped" never arrives
+        typingUsers.set(event.username, setTimeout(function() {
+            typingUsers.delete(event.username);
+            renderTyping();
+        }, 6000));
+    } else {
+        typingUsers.delete(event.username);
+    }
+    renderTyping();
+}
+
+function renderTyping() {
+    const names = [...typingUsers.keys()];
+    if (names.length === 0) {
+        typingIndicator.textContent = '';
+    } else if (names.length <= 3) {
+        typingIndicator.textContent = `✍️ ${names.join('، ')} در حال نوشتن...`;
+    } else {
+        typingIndicator.textContent = `✍️ ${names.length} نفر در حال نوشتن...`;
+    }
+}
+
+function setTyping(typing) {
+    if (typing === isTyping || !currentUsername || chatSocket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+    isTyping = typing;
+    chatSocket.send(JSON.stringify({'message_type': 'typing', 'typing': typing}));
+}
+
+connectSocket();
+
+// Remember a message, false if it is already displayed
+// (replayed and live frames can overlap)
+function rememberMessage(data) {
+    const keys = [];
+    if (data.message_id) keys.push('id:' + data.message_id);
+    if (data.provisional_id) keys.push('p:' + data.provisional_id);
+    if (keys.some(key => seenMessages.has(key))) {
+        return false;
+    }
+    keys.forEach(key => seenMessages.add(key));
+    if (data.message_id && (lastMessageId === null || data.message_id > lastMessageId)) {
+        lastMessageId = data.message_id;
+    }
+    return true;
+}
+
+// Display message
+function displayMessage(data, insertAtTop = false) {
+    if (!rememberMessage(data)) {
+        return;
+    }
+    const messageDiv = document.createElement('div');
+    const isOwn = data.username === currentUsername;
+    messageDiv.className = isOwn ? 'message own' : 'message other';
+
+    const bubbleDiv = document.createElement('div');
+    bubbleDiv.className = 'message-bubble';
+
+    const usernameDiv = document.createElement('div');
+    usernameDiv.className = 'message-username';
+    usernameDiv.textContent = data.username;
+    bubbleDiv.appendChild(usernameDiv);
+
+    if (data.message_type === 'image' && data.image_url) {
+        const img = document.createElement('img');
+        // the thumbnail is shown, the box is reserved from the
+        // original's size so the list doesn't jump when it loads
+        img.src = data.thumbnail_url || data.image_url;
+        if (data.image_width && data.image_height) {
+            img.width = data.image_width;
+            img.height = data.image_height;
+        }
+        img.loading = 'lazy';
+        img.className = 'message-image';
+        img.alt = 'Image';
+        img.onclick = function() {
+            window.open(data.medium_url || data.image_url, '_blank');
+        };
+        bubbleDiv.appendChild(img);
+    } else {
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'message-content';
+        contentDiv.textContent = data.message || '';
+        bubbleDiv.appendChild(contentDiv);
+    }
+
+    const timeDiv = document.createElement('div');
+    timeDiv.className = 'message-time';
+
+    // Parse timestamp if available, otherwise use current time
+    let timeText;
+    if (data.timestamp) {
+        const msgDate = new Date(data.timestamp);
+        timeText = msgDate.getHours().toString().padStart(2, '0') + ':' + 
+                  msgDate.getMinutes().toString().padStart(2, '0');
+    } else {
+        const now = new Date();
+        timeText = now.getHours().toString().padStart(2, '0') + ':' + 
+                  now.getMinutes().toString().padStart(2, '0');
+    }
+    timeDiv.textContent = timeText;
+    bubbleDiv.appendChild(timeDiv);
+
+    messageDiv.appendChild(bubbleDiv);
+
+    if (insertAtTop) {
+        // Insert after the history loading indicator
+        const historyLoading = document.getElementById('history-loading');
+        if (historyLoading && historyLoading.nextSibling) {
+            chatMessages.insertBefore(messageDiv, historyLoading.nextSibling);
+        } else {
+            chatMessages.appendChild(messageDiv);
+        }
+    } else {
+        chatMessages.appendChild(messageDiv);
+        // Only auto-scroll for new messages (not history)
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+}
+
+// Send text message
+function sendMessage() {
+    const message = messageInput.value.trim();
+
+    if (!currentUsername) {
+        alert('لطفا ابتدا نام کاربری خود را وارد کنید');
+        usernameSetup.classList.add('show');
+        return;
+    }
+
+    if (message) {
+        chatSocket.send(JSON.stringify({
+            'message_type': 'text',
+            'username': currentUsername,
+            'message': message
+        }));
+        messageInput.value = '';
+        messageInput.style.height = 'auto';
+        // the server ends the typing indicator with the message
+        isTyping = false;
+        clearTimeout(typingTimer);
+    }
+}
+
+sendButton.onclick = function() {
+    if (imageInput.files.length > 0) {
+        uploadImage();
+    } else {
+        sendMessage();
+    }
+};
+
+messageInput.addEventListener('keydown', function(e) {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+// Auto-resize textarea
+messageInput.addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = Math.min(this.scrollHeight, 120) + 'px';
+
+    // typing until 3 seconds without input
+    setTyping(this.value.length > 0);
+    clearTimeout(typingTimer);
+    typingTimer = setTimeout(() => setTyping(false), 3000);
+});
+
+// Image upload
+attachButton.onclick = function() {
+    imageInput.click();
+};
+
+imageInput.onchange = function(e) {
+    const file = e.target.files[0];
+    if (file) {
+        // Preview
+        const reader = new FileReader();
+        reader.onload = function(e) {
+            previewImg.src = e.target.result;
+            imagePreview.classList.add('show');
+        };
+        reader.readAsDataURL(file);
+    }
+};
+
+previewClose.onclick = function() {
+    imagePreview.classList.remove('show');
+    imageInput.value = '';
+};
+
+async function uploadImage() {
+    const file = imageInput.files[0];
+
+    if (!currentUsername) {
+        alert('لطفا ابتدا نام کاربری خود را وارد کنید');
+        usernameSetup.classList.add('show');
+        return;
+    }
+
+    if (!file) return;
+
+    const formData = new FormData();
+    formData.append('image', file);
+    formData.append('username', currentUsername);
+    formData.append('room_slug', roomSlug);
+
+    loadingIndicator.classList.add('show');
+
+    try {
+        const response = await fetch('/api/room/v1/upload-image/', {
+            method: 'POST',
+            body: formData
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            console.log('عکس آپلود شد:', data);
+
+            // Clear preview
+            imagePreview.classList.remove('show');
+            imageInput.value = '';
+        } else if (response.status === 429) {
+            const wait = response.headers.get('Retry-After');
+            alert(`تعداد آپلودها بیش از حد مجاز است، ${wait} ثانیه دیگر تلاش کنید`);
+        } else {
+            const error = await response.json();
+            alert('خطا در آپلود عکس: ' + JSON.stringify(error));
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        alert('خطا در آپلود عکس');
+    } finally {
+        loadingIndicator.classList.remove('show');
+    }
+}
+
+// Scroll to bottom on load
+chatMessages.scrollTop = chatMessages.scrollHeight;